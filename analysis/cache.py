@@ -0,0 +1,313 @@
+import os
+import pickle
+import hashlib
+import pygit2 as git
+
+from typing import Set
+
+from .pathfilter import PathFilter, get_attributes_digest
+
+
+def get_mailmap_digest(repository: git.Repository) -> str:
+    """
+    Digest of all mailmap sources `git.Mailmap.from_repository` reads:
+    '.mailmap' in working directory (or in HEAD's tree for bare repos), 'mailmap.file' and 'mailmap.blob' configs
+    """
+    digest = hashlib.sha1()
+    if not repository.is_bare:
+        mailmap_path = os.path.join(repository.workdir, '.mailmap')
+        if os.path.isfile(mailmap_path):
+            with open(mailmap_path, 'rb') as f:
+                digest.update(f.read())
+    elif not repository.head_is_unborn and '.mailmap' in repository.head.peel().tree:
+        digest.update(repository.head.peel().tree['.mailmap'].data)
+
+    config = repository.config
+    if 'mailmap.file' in config:
+        mailmap_path = os.path.expanduser(config['mailmap.file'])
+        digest.update(mailmap_path.encode())
+        if os.path.isfile(mailmap_path):
+            with open(mailmap_path, 'rb') as f:
+                digest.update(f.read())
+    if 'mailmap.blob' in config:
+        digest.update(config['mailmap.blob'].encode())
+        try:
+            digest.update(repository.revparse_single(config['mailmap.blob']).data)
+        except (KeyError, AttributeError):
+            pass
+    return digest.hexdigest()
+
+
+def read_pickle(path: str, description: str):
+    """
+    :param description: what is stored in the file, to report it if the file is broken
+    :return: unpickled content of the file, None if the file does not exist or cannot be read
+    """
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError) as ex:
+        print(f"{description} {path} cannot be read and is ignored: {ex}")
+        return None
+
+
+def write_pickle(path: str, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # write-then-rename prevents a broken cache file if process is interrupted
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(content, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def is_ancestor(repository: git.Repository, commit_sha: str, head_sha: str) -> bool:
+    """
+    :return: whether the commit is an ancestor of the head, False if the commit does not exist anymore
+    """
+    try:
+        return repository.descendant_of(head_sha, commit_sha)
+    except (KeyError, ValueError, git.GitError):
+        return False
+
+
+def get_changed_paths(repository: git.Repository, commit_sha: str, head_sha: str) -> Set[str]:
+    """
+    :return: paths of files changed by any commit reachable from the head but not from the commit (i.e. of
+    `git log <commit>..<head>`), every commit is compared to its first parent
+    """
+    paths = set()
+    walker = repository.walk(head_sha, git.GIT_SORT_NONE)
+    walker.hide(commit_sha)
+    for commit in walker:
+        # trees are compared without reading files' content
+        diff = commit.tree.diff_to_tree(commit.parents[0].tree) if commit.parents else commit.tree.diff_to_tree()
+        for delta in diff.deltas:
+            paths.add(delta.old_file.path)
+            paths.add(delta.new_file.path)
+    return paths
+
+
+class HistoryCache:
+    """
+    Persistent storage of per-commit history records keyed by full commit id.
+
+    Commit id defines commit's content and parents, so a stored record stays valid as long as the mailmap
+    (and the way records are built) does not change. Records of commits which are not visited by current run
+    are dropped when the cache is saved, unless only a part of history is visited. Records of commits which are
+    not in HEAD's history anymore (e.g. after force-push or history rewrite) are dropped when the cache is loaded.
+    """
+    file_name = 'history.pickle'
+    format_version = 3
+
+    def __init__(self, cache_dir: str, repository: git.Repository, path_filter: PathFilter = None,
+                 diff_limits: tuple = None):
+        """
+        :param path_filter: filter of files commits' changes are calculated for, records depend on it as well
+        :param diff_limits: options of cost guard commits are diffed with (see `gitdata.DiffCostGuard`), changes of
+        commits exceeding the limits are estimated, so records depend on them too
+        """
+        self.path = os.path.join(cache_dir, self.file_name)
+        self.head = str(repository.head.target)
+        self.fingerprint = {
+            'format_version': self.format_version,
+            'mailmap': get_mailmap_digest(repository),
+        }
+        if path_filter is not None and path_filter.is_active:
+            self.fingerprint['path_filter'] = path_filter.get_digest()
+        if diff_limits is not None and any(limit is not None for limit in diff_limits):
+            self.fingerprint['diff_limits'] = diff_limits
+        self.hits_count = 0
+        self.misses_count = 0
+        self._stored_records = {}
+        self._visited_records = {}
+        self._load(repository)
+
+    def _load(self, repository: git.Repository):
+        content = read_pickle(self.path, "History cache")
+        if content is None:
+            return
+
+        if content.get('fingerprint') != self.fingerprint:
+            print("History cache is outdated (mailmap, path filter or cache format has changed) and is rebuilt")
+            return
+
+        records = content.get('records', {})
+        previous_head = content.get('head', self.head)
+        if previous_head != self.head and not is_ancestor(repository, previous_head, self.head):
+            print(f"History has been rewritten since previous run (previous HEAD {previous_head[:7]} is not "
+                  f"an ancestor of {self.head[:7]}). Records of commits out of HEAD's history are discarded.")
+            # records of commits out of the analysed part of history are kept by windowed runs, so unreachable ones
+            # would never be dropped otherwise
+            head_commits_ids = {commit.id.raw for commit in repository.walk(self.head, git.GIT_SORT_NONE)}
+            records = {section: {commit_id: record for commit_id, record in section_records.items()
+                                 if commit_id in head_commits_ids}
+                       for section, section_records in records.items()}
+        self._stored_records = records
+
+    def get(self, section: str, commit_id: git.Oid):
+        """
+        :param section: name of records' kind, e.g. history class name
+        :param commit_id: commit id the record corresponds to
+        :return: stored record or None if commit has not been cached yet
+        """
+        record = self._stored_records.get(section, {}).get(commit_id.raw)
+        if record is None:
+            self.misses_count += 1
+        else:
+            self.hits_count += 1
+            self._visited_records.setdefault(section, {})[commit_id.raw] = record
+        return record
+
+    def put(self, section: str, commit_id: git.Oid, record):
+        self._visited_records.setdefault(section, {})[commit_id.raw] = record
+
+    def save(self, prune: bool = True):
+        """
+        :param prune: whether records of commits not visited by current run are dropped, they are kept if only a part
+        of history has been visited (see `HistoryWindow`)
+        """
+        print(f"History cache: {self.hits_count} records reused, {self.misses_count} records computed")
+        records = self._visited_records
+        if not prune:
+            records = {section: {**self._stored_records.get(section, {}), **section_records}
+                       for section, section_records in self._visited_records.items()}
+            for section, section_records in self._stored_records.items():
+                records.setdefault(section, section_records)
+        write_pickle(self.path, {
+            'fingerprint': self.fingerprint,
+            'head': self.head,
+            'records': records,
+        })
+
+
+class BlobsCache:
+    """
+    Persistent storage of per-blob file records (e.g. lines count) keyed by blob id.
+
+    Blob id defines file's content, so a stored record stays valid as long as attributes (which may mark files
+    as binary) do not change. Records of blobs which are not visited by current run are dropped when the cache is saved,
+    i.e. the cache holds blobs of the latest analysed revision.
+    """
+    file_name = 'blobs.pickle'
+    format_version = 1
+
+    def __init__(self, cache_dir: str, repository: git.Repository):
+        self.path = os.path.join(cache_dir, self.file_name)
+        self.fingerprint = {
+            'format_version': self.format_version,
+            'attributes': get_attributes_digest(repository),
+        }
+        self.hits_count = 0
+        self.misses_count = 0
+        self._stored_records = {}
+        self._visited_records = {}
+        self._load()
+
+    def _load(self):
+        content = read_pickle(self.path, "Blobs cache")
+        if content is None:
+            return
+        if content.get('fingerprint') != self.fingerprint:
+            print("Blobs cache is outdated (attributes or cache format has changed) and is rebuilt")
+            return
+        self._stored_records = content.get('records', {})
+
+    def get(self, blob_id: git.Oid):
+        """
+        :return: stored record or None if blob has not been cached yet
+        """
+        # the same content may be stored in several files
+        record = self._visited_records.get(blob_id.raw) or self._stored_records.get(blob_id.raw)
+        if record is None:
+            self.misses_count += 1
+        else:
+            self.hits_count += 1
+            self._visited_records[blob_id.raw] = record
+        return record
+
+    def put(self, blob_id: git.Oid, record):
+        self._visited_records[blob_id.raw] = record
+
+    def save(self):
+        print(f"Blobs cache: {self.hits_count} records reused, {self.misses_count} records computed")
+        write_pickle(self.path, {
+            'fingerprint': self.fingerprint,
+            'records': self._visited_records,
+        })
+
+
+class BlameCache:
+    """
+    Persistent storage of per-file blame records keyed by file path and blob id.
+
+    Blame of a file depends on the history of the file: it stays the same while HEAD moves forward without changing
+    the file. The same blob at the path does not mean the same history (e.g. a change may have been reverted since),
+    so records of files changed by any commit since previous run are dropped. Records refer to commits (not to their
+    authors), so they do not depend on the mailmap. The cache is dropped if history has been rewritten since previous run or the oldest
+    blamed commit has changed.
+    Records of files which are not blamed by current run are dropped when the cache is saved.
+    """
+    file_name = 'blame.pickle'
+    format_version = 2
+
+    def __init__(self, cache_dir: str, repository: git.Repository, oldest_commit_id: git.Oid = None):
+        """
+        :param oldest_commit_id: the commit blame stops at, the whole history is blamed if None
+        """
+        self.path = os.path.join(cache_dir, self.file_name)
+        self.head = str(repository.head.target)
+        self.fingerprint = {
+            'format_version': self.format_version,
+        }
+        if oldest_commit_id is not None:
+            self.fingerprint['oldest_commit'] = str(oldest_commit_id)
+        self.hits_count = 0
+        self.misses_count = 0
+        self._stored_records = {}
+        self._visited_records = {}
+        self._load(repository)
+
+    def _load(self, repository: git.Repository):
+        content = read_pickle(self.path, "Blame cache")
+        if content is None:
+            return
+        if content.get('fingerprint') != self.fingerprint:
+            print("Blame cache is outdated (blame window or cache format has changed) and is rebuilt")
+            return
+        previous_head = content.get('head', self.head)
+        if previous_head != self.head and not is_ancestor(repository, previous_head, self.head):
+            # lines of unchanged files may be blamed to commits which do not exist anymore
+            print(f"History has been rewritten since previous run (previous HEAD {previous_head[:7]} is not "
+                  f"an ancestor of {self.head[:7]}). Blame cache is rebuilt.")
+            return
+        records = content.get('records', {})
+        if previous_head != self.head and records:
+            # lines of a changed file may be blamed differently even if its content is the same as before
+            changed_paths = get_changed_paths(repository, previous_head, self.head)
+            records = {key: record for key, record in records.items() if key[0] not in changed_paths}
+        self._stored_records = records
+
+    def get(self, path: str, blob_id: git.Oid):
+        """
+        :return: stored record or None if file has not been blamed with this content yet
+        """
+        record = self._stored_records.get((path, blob_id.raw))
+        if record is None:
+            self.misses_count += 1
+        else:
+            self.hits_count += 1
+            self._visited_records[(path, blob_id.raw)] = record
+        return record
+
+    def put(self, path: str, blob_id: git.Oid, record):
+        self._visited_records[(path, blob_id.raw)] = record
+
+    def save(self):
+        print(f"Blame cache: {self.hits_count} files reused, {self.misses_count} files blamed")
+        write_pickle(self.path, {
+            'fingerprint': self.fingerprint,
+            'head': self.head,
+            'records': self._visited_records,
+        })
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+from typing import Dict, List
+
+
+class Categories:
+    """
+    Interned values: every distinct value gets an integer code, codes are given in order of values' first appearance
+    """
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def code(self, value) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def as_categorical(self, codes: np.ndarray) -> pd.Categorical:
+        return pd.Categorical.from_codes(codes, categories=self.values)
+
+
+class ColumnarRecords:
+    """
+    Table built row by row directly into typed numpy columns, i.e. without a Python object per row.
+
+    Columns grow by doubling their capacity. Columns of 'category' type store int32 codes of interned values.
+    """
+    initial_capacity = 1024
+
+    def __init__(self, dtypes: Dict[str, str], categories: Dict[str, Categories] = None):
+        """
+        :param dtypes: column name -> numpy dtype (or 'category' for interned values), in order of row values
+        :param categories: interned values of categorical columns shared with other tables (e.g. authors' names),
+        categorical columns not given here intern their values on their own
+        """
+        self.dtypes = dtypes
+        self.size = 0
+        self._capacity = self.initial_capacity
+        self._columns = {name: np.zeros(self._capacity, dtype=self._storage_dtype(dtype))
+                         for name, dtype in dtypes.items()}
+        categories = categories or {}
+        self.categories = {name: categories.get(name, Categories())
+                           for name, dtype in dtypes.items() if dtype == 'category'}
+
+    @staticmethod
+    def _storage_dtype(dtype: str):
+        return np.int32 if dtype == 'category' else dtype
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        self._capacity *= 2
+        for name, column in self._columns.items():
+            grown_column = np.zeros(self._capacity, dtype=column.dtype)
+            grown_column[:self.size] = column[:self.size]
+            self._columns[name] = grown_column
+
+    def intern(self, column_name: str, value) -> int:
+        return self.categories[column_name].code(value)
+
+    def append(self, row: tuple) -> int:
+        """
+        :param row: values in order of columns, categorical columns take codes (see `intern`)
+        :return: index of appended row
+        """
+        if self.size == self._capacity:
+            self._grow()
+        for column, value in zip(self._columns.values(), row):
+            column[self.size] = value
+        self.size += 1
+        return self.size - 1
+
+    def append_decoded(self, row: tuple) -> int:
+        """
+        :param row: values in order of columns, categorical columns take values (as given by `row`)
+        :return: index of appended row
+        """
+        return self.append(tuple(self.intern(name, value) if name in self.categories else value
+                                 for name, value in zip(self._columns, row)))
+
+    def row(self, index: int) -> tuple:
+        """
+        :return: row values as Python objects (e.g. to be persisted), categorical columns give values (not codes)
+        """
+        return tuple(self.categories[name].values[column[index]] if name in self.categories else column[index].item()
+                     for name, column in self._columns.items())
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        :return: writable view of filled part of the column (codes for categorical columns)
+        """
+        return self._columns[name][:self.size]
+
+    def as_columns(self, names: List[str] = None) -> dict:
+        """
+        :param names: names of columns to return, all columns by default
+        :return: column name -> numpy array (views, not copies) or pd.Categorical for categorical columns,
+        categories of the latter are in order of their codes
+        """
+        names = names if names is not None else self._columns.keys()
+        return {name: self.categories[name].as_categorical(self.column(name)) if name in self.categories
+                else self.column(name)
+                for name in names}
@@ -0,0 +1,114 @@
+"""
+Code ownership and bus factor of directories' subtrees aggregated from blame data
+"""
+import numpy as np
+import pandas as pd
+
+from typing import Iterable, Tuple
+
+# name of the repository's root directory
+ROOT_DIRECTORY = '.'
+
+
+class PathTrie:
+    """
+    Directories of file paths interned to ids, directories deeper than maximal depth are merged into their
+    ancestor at that depth. Every directory is interned after its parent, i.e. parent's id is less than child's one.
+    """
+
+    def __init__(self, paths: Iterable[str], max_depth: int = None):
+        """
+        :param paths: paths of files
+        :param max_depth: depth of the deepest directories (the root has depth 0), unlimited by default
+        """
+        self.directories = [ROOT_DIRECTORY]
+        self.parents = [-1]
+        self.depths = [0]
+        self._ids = {(): 0}
+        self.files_directories = np.array([self._intern(tuple(path.split('/')[:-1][:max_depth])) for path in paths],
+                                          dtype=np.int64)
+        self.parents = np.array(self.parents, dtype=np.int64)
+        self.depths = np.array(self.depths, dtype=np.int64)
+
+    def _intern(self, parts: Tuple[str, ...]) -> int:
+        directory_id = self._ids.get(parts)
+        if directory_id is None:
+            parent_id = self._intern(parts[:-1])
+            directory_id = len(self.directories)
+            self._ids[parts] = directory_id
+            self.directories.append('/'.join(parts))
+            self.parents.append(parent_id)
+            self.depths.append(len(parts))
+        return directory_id
+
+    def __len__(self):
+        return len(self.directories)
+
+    def aggregate(self, directories: np.ndarray, keys: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, ...]:
+        """
+        Sums values up bottom-up, i.e. every directory gets values of its whole subtree
+        :param directories: directory id of every value
+        :param keys: key (e.g. author id) of every value, values are summed per directory and key
+        :return: directories, keys and sums of values per (directory, key) of all subtrees
+        """
+        keys_count = int(keys.max()) + 1 if len(keys) else 1
+        values_depths = self.depths[directories]
+        # entries waiting for aggregation at every depth
+        pending = [[(directories[values_depths == depth], keys[values_depths == depth],
+                     values[values_depths == depth])] for depth in range(int(self.depths.max()) + 1)]
+        levels = []
+        for depth in range(len(pending) - 1, -1, -1):
+            level_directories, level_keys, level_values = (np.concatenate(arrays) for arrays in zip(*pending[depth]))
+            combined_keys, inverse = np.unique(level_directories * keys_count + level_keys, return_inverse=True)
+            sums = np.bincount(inverse, weights=level_values, minlength=len(combined_keys))
+            level = (combined_keys // keys_count, combined_keys % keys_count, sums)
+            levels.append(level)
+            if depth > 0:
+                pending[depth - 1].append((self.parents[level[0]], level[1], sums))
+        return tuple(np.concatenate([level[i] for level in levels]) for i in range(3))
+
+
+def get_directories_ownership(filepaths: pd.Categorical, authors: pd.Categorical, lines_count: np.ndarray,
+                              max_depth: int = None) -> pd.DataFrame:
+    """
+    :param filepaths: file path of every blame record
+    :param authors: author of every blame record, records without author are not taken into account
+    :param lines_count: (possibly weighted) lines count of every blame record
+    :param max_depth: depth of the deepest reported directories (the root has depth 0), unlimited by default
+    :return: table of directories (ordered by path) with their subtree's files count, lines count, authors count,
+    bus factor (the least number of authors owning at least half of lines) and top owner with its share of lines
+    """
+    trie = PathTrie(filepaths.categories, max_depth)
+    has_author = np.asarray(authors.codes) >= 0
+    files_directories = trie.files_directories[np.asarray(filepaths.codes)[has_author]]
+    directories, authors_ids, lines = trie.aggregate(files_directories, np.asarray(authors.codes)[has_author],
+                                                     np.asarray(lines_count, dtype=np.float64)[has_author])
+    files = np.unique(np.asarray(filepaths.codes)[has_author])
+    directories_files, _, files_counts = trie.aggregate(trie.files_directories[files], np.zeros(len(files), np.int64),
+                                                        np.ones(len(files)))
+
+    # authors of every directory from the top owner
+    order = np.lexsort((-lines, directories))
+    directories, authors_ids, lines = directories[order], authors_ids[order], lines[order]
+    totals = np.bincount(directories, weights=lines, minlength=len(trie))
+    starts = np.searchsorted(directories, np.arange(len(trie)), side='left')
+    cumulative_lines = np.concatenate([[0], np.cumsum(lines)])
+    # lines owned by more prominent owners of the directory
+    lines_before = cumulative_lines[:-1] - cumulative_lines[starts[directories]]
+    is_needed = lines_before < totals[directories] / 2
+    authors_counts = np.bincount(directories, minlength=len(trie))
+
+    is_owned = authors_counts > 0
+    top_owners = starts[is_owned]
+    df = pd.DataFrame({
+        'directory': np.array(trie.directories, dtype=object)[is_owned],
+        'depth': trie.depths[is_owned],
+        'files_count': np.bincount(directories_files, weights=files_counts, minlength=len(trie))[is_owned]
+        .astype(np.int64),
+        'lines_count': totals[is_owned],
+        'authors_count': authors_counts[is_owned],
+        'bus_factor': np.bincount(directories, weights=is_needed, minlength=len(trie))[is_owned].astype(np.int64),
+        'top_owner': pd.Categorical.from_codes(authors_ids[top_owners], categories=authors.categories),
+        'top_owner_share': lines[top_owners] / totals[is_owned],
+    })
+    return df.sort_values(by='directory').reset_index(drop=True)
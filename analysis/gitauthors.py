@@ -14,7 +14,7 @@ class GitAuthors(object):
 
         authors_grouped = self.raw_authors_data[['author_name', 'author_datetime',
                                                  'insertions', 'deletions', 'is_merge_commit']].groupby(
-            [self.raw_authors_data['author_name']])
+            [self.raw_authors_data['author_name']], observed=True)
 
 
         self.authors_summary = authors_grouped.sum(numeric_only=True)
@@ -57,7 +57,7 @@ class GitAuthors(object):
         wh = self.raw_authors_data[['author_name', 'insertions', 'deletions', 'author_datetime']].copy()
         wh = wh.set_index(wh['author_datetime'])
         wh_grouped = wh[['author_name', 'insertions', 'deletions']].groupby(
-            [wh['author_name'], pd.Grouper(freq=sampling)])
+            [wh['author_name'], pd.Grouper(freq=sampling)], observed=True)
 
         modifications_over_time = wh_grouped.sum(numeric_only=True)\
             .reset_index()
@@ -70,5 +70,5 @@ class GitAuthors(object):
         modifications_per_author_over_time = modifications_over_time.reset_index().pivot_table(
             index=modifications_over_time['author_datetime'],
             columns=modifications_over_time['author_name'],
-            values=['insertions', 'deletions', 'commits_count']).fillna(0)
+            values=['insertions', 'deletions', 'commits_count'], observed=True).fillna(0)
         return modifications_per_author_over_time
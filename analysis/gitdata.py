@@ -1,17 +1,37 @@
 import abc
+import heapq
+import itertools
+import math
+import time
+import warnings
+import multiprocessing
+import multiprocessing.connection
+import re
+import numpy as np
 import pandas as pd
 import pygit2 as git
 
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
 from tqdm import tqdm
-from tqdm.contrib.concurrent import thread_map
 
 from tools.timeit import Timeit
+from .cache import BlameCache, BlobsCache, HistoryCache
+from .columnar import Categories, ColumnarRecords
+from .pathfilter import PathFilter
+from .sampling import BlameSample
 
 
 def map_signature(mailmap, signature: git.Signature):
+    """
+    :param signature: pygit2.Signature or any object with `name` and `email` attributes
+    """
     # the unmapped email is used on purpose
     email = signature.email
     try:
+        if not isinstance(signature, git.Signature):
+            # pygit2 signature is not created for a malformed signature exactly as it is not resolved by mailmap
+            signature = git.Signature(signature.name, email)
         mapped_signature = mailmap.resolve_signature(signature)
         name = mapped_signature.name
     except ValueError:
@@ -25,173 +45,1128 @@ def map_signature(mailmap, signature: git.Signature):
     return name, email
 
 
-class History(abc.ABC):
+class AuthorIdentities:
+    """
+    Maps signatures via repository's mailmap once per distinct (name, email) pair and gives integer ids to mapped
+    authors' names and emails.
+
+    A single instance is meant to be shared by all data fetchers of a repository, so an author has the same id
+    (i.e. the same code of categorical 'author_name'-like columns) in all fetched data.
+    """
+
+    def __init__(self, repository: git.Repository):
+        self.mailmap = git.Mailmap.from_repository(repository)
+        self.names = Categories()
+        self.emails = Categories()
+        self._resolved = {}
+
+    def resolve(self, signature: git.Signature) -> Tuple[int, int]:
+        """
+        :return: id of author's mapped name and id of author's (unmapped) email
+        """
+        key = (signature.name, signature.email)
+        ids = self._resolved.get(key)
+        if ids is None:
+            name, email = map_signature(self.mailmap, signature)
+            ids = self._resolved[key] = self.names.code(name), self.emails.code(email)
+        return ids
+
+    def name(self, signature: git.Signature) -> str:
+        author_id, _ = self.resolve(signature)
+        return self.names.values[author_id]
+
+
+class DiffCostGuard:
+    """
+    Limits the cost of calculating a single commit's changes: changes of a commit which tree delta exceeds the limits
+    (e.g. vendor import or mass reformatting) are not diffed but estimated by `estimate_diff_stats`
+    """
+
+    def __init__(self, max_files: int = None, max_bytes: int = None):
+        """
+        :param max_files: maximal number of changed files of a diffed commit, unlimited if None
+        :param max_bytes: maximal total size of changed files' versions (before and after commit) of a diffed commit,
+        unlimited if None
+        """
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+
+    @property
+    def is_active(self) -> bool:
+        return self.max_files is not None or self.max_bytes is not None
+
+    @property
+    def options(self) -> tuple:
+        """
+        :return: arguments the guard is created with, e.g. to re-create it in another process
+        """
+        return self.max_files, self.max_bytes
+
+    def is_exceeded(self, repository: git.Repository, changed_files: List[Tuple[Optional[git.Oid], Optional[git.Oid]]]):
+        """
+        :param changed_files: blob ids of changed files before and after commit, None if a file does not exist
+        """
+        if self.max_files is not None and len(changed_files) > self.max_files:
+            return True
+        if self.max_bytes is not None:
+            # sizes are read only until the limit is reached
+            size = 0
+            for blob_ids in changed_files:
+                for blob_id in blob_ids:
+                    if blob_id is not None:
+                        size += repository[blob_id].size
+                        if size > self.max_bytes:
+                            return True
+        return False
+
+
+def _get_changed_blob_ids(delta: git.DiffDelta) -> Tuple[Optional[git.Oid], Optional[git.Oid]]:
+    # a file does not exist on the side with zero mode, submodules' commits are not blobs of the repository
+    return tuple(diff_file.id if diff_file.mode not in (0, git.GIT_FILEMODE_COMMIT) else None
+                 for diff_file in (delta.old_file, delta.new_file))
+
+
+def count_lines(blob: git.Blob) -> int:
+    """
+    :return: lines count of a text blob as git counts them (i.e. including the last line without newline),
+    0 for binary blob
+    """
+    if blob.is_binary:
+        return 0
+    data = blob.data
+    return data.count(b'\n') + (1 if data and not data.endswith(b'\n') else 0)
+
+
+def estimate_diff_stats(repository: git.Repository,
+                        changed_files: List[Tuple[Optional[git.Oid], Optional[git.Oid]]]) -> Tuple[int, int]:
+    """
+    Estimates inserted and deleted lines without diffing files: added and deleted files are counted exactly,
+    a modified file gives the change of its lines count only (i.e. the estimate is a lower bound)
+    :param changed_files: blob ids of changed files before and after commit, None if a file does not exist
+    :return: estimated inserted and deleted lines count
+    """
+    insertions, deletions = 0, 0
+    for old_blob_id, new_blob_id in changed_files:
+        old_lines_count = count_lines(repository[old_blob_id]) if old_blob_id is not None else 0
+        new_lines_count = count_lines(repository[new_blob_id]) if new_blob_id is not None else 0
+        insertions += max(new_lines_count - old_lines_count, 0)
+        deletions += max(old_lines_count - new_lines_count, 0)
+    return insertions, deletions
+
+
+def get_diff_stats(repository: git.Repository, commit_id, parent_id=None, path_filter: PathFilter = None,
+                   cost_guard: DiffCostGuard = None) -> Tuple[int, int, int, bool]:
+    """
+    :param commit_id: id of commit which changes are calculated
+    :param parent_id: id of the parent commit to diff against, if None the commit is diffed against an empty tree
+    :param path_filter: filter of files to take into account, all files by default
+    :param cost_guard: limits of commit's changes to diff, all commits are diffed by default
+    :return: inserted and deleted lines count, change of files count (added minus deleted files) and whether lines
+    count is estimated (the commit exceeds cost guard's limits)
+    """
+    commit = repository[commit_id]
+    if parent_id is None:
+        diff = commit.tree.diff_to_tree(swap=True)
+    else:
+        diff = repository.diff(repository[parent_id], commit)
+    is_filtered = path_filter is not None and path_filter.is_active
+    # deltas are found by comparing trees, i.e. without reading files' content
+    deltas = [(i, delta) for i, delta in enumerate(diff.deltas)
+              if not is_filtered or path_filter.is_included(delta.new_file.path)]
+    files_delta = 0
+    for _, delta in deltas:
+        if delta.status == git.GIT_DELTA_ADDED:
+            files_delta += 1
+        elif delta.status == git.GIT_DELTA_DELETED:
+            files_delta -= 1
+
+    if cost_guard is not None and cost_guard.is_active:
+        changed_files = [_get_changed_blob_ids(delta) for _, delta in deltas]
+        if cost_guard.is_exceeded(repository, changed_files):
+            insertions, deletions = estimate_diff_stats(repository, changed_files)
+            return insertions, deletions, files_delta, True
+
+    if not is_filtered:
+        st = diff.stats
+        return st.insertions, st.deletions, files_delta, False
+    insertions, deletions = 0, 0
+    for i, _ in deltas:
+        # a patch (i.e. the actual diff) is made for included files only
+        _, patch_insertions, patch_deletions = diff[i].line_stats
+        insertions += patch_insertions
+        deletions += patch_deletions
+    return insertions, deletions, files_delta, False
+
+
+def count_files(tree: git.Tree, path_filter: PathFilter = None) -> int:
+    """
+    :return: number of files in the tree (including its subtrees) which are taken into account by path filter
+    """
+    diff = tree.diff_to_tree()
+    if path_filter is None or not path_filter.is_active:
+        return len(diff)
+    return sum(1 for delta in diff.deltas if path_filter.is_included(delta.old_file.path))
+
+
+# repository, path filter and cost guard created once per worker process of DiffStatsFetcher
+_worker_repository = None
+_worker_path_filter = None
+_worker_cost_guard = None
+
+
+def _init_diff_stats_worker(repository_path: str, path_filter_options: tuple, cost_guard_options: tuple):
+    global _worker_repository, _worker_path_filter, _worker_cost_guard
+    _worker_repository = git.Repository(repository_path)
+    _worker_path_filter = PathFilter(_worker_repository, *path_filter_options)
+    _worker_cost_guard = DiffCostGuard(*cost_guard_options)
+
+
+def _fetch_diff_stats_chunk(diff_pairs: List[Tuple[str, Optional[str]]]):
+    stats = np.zeros((4, len(diff_pairs)), dtype=np.int64)
+    for i, (commit_sha, parent_sha) in enumerate(diff_pairs):
+        stats[:, i] = get_diff_stats(_worker_repository, commit_sha, parent_sha, _worker_path_filter,
+                                     _worker_cost_guard)
+    return stats
+
+
+class DiffStatsFetcher:
+    """
+    Calculates inserted/deleted lines count of commits either in current process or in a pool of worker processes.
 
-    def __init__(self, repository: git.Repository, branch: str = "master"):
+    A commit is always diffed against its first parent (or an empty tree), so calculated stats are memoized by commit
+    id: histories sharing the fetcher do not diff the same commit twice.
+    """
+    max_chunk_size = 500
+
+    def __init__(self, repository: git.Repository, jobs: int = 1, path_filter: PathFilter = None,
+                 cost_guard: DiffCostGuard = None):
+        """
+        :param jobs: number of worker processes, diff stats are calculated in current process if jobs <= 1
+        :param path_filter: filter of files to diff, all files are diffed by default
+        :param cost_guard: limits of commit's changes to diff, all commits are diffed by default
+        """
         self.repo = repository
-        self.branch = branch
-        self.cache = None
-        self.mailmap = git.Mailmap.from_repository(self.repo)
+        self.jobs = jobs
+        self.path_filter = path_filter if path_filter is not None else PathFilter(repository)
+        self.cost_guard = cost_guard if cost_guard is not None else DiffCostGuard()
+        self.diffs_count = 0
+        # memoized commits' ids and stats are kept in typed columns (about 50 bytes per commit), they are looked up
+        # via an index of ids sorted lazily once new commits are memoized
+        self._memo = ColumnarRecords({'commit_id': 'V20', 'insertions': 'int64', 'deletions': 'int64',
+                                      'files_delta': 'int64', 'is_estimated': 'int64'})
+        self._sorted_ids = None
+        self._sorted_rows = None
 
-    def as_dataframe(self):
-        data = self.fetch()
-        df = pd.DataFrame(data)
-        return self._optimize(df)
+    def _find_rows(self, commits_ids: List[git.Oid]) -> np.ndarray:
+        """
+        :return: rows of memoized stats of commits, -1 for commits which stats are not memoized
+        """
+        if self._sorted_ids is None:
+            # fixed-length ids compare as bytes strings
+            memoized_ids = self._memo.column('commit_id').view('S20')
+            self._sorted_rows = np.argsort(memoized_ids, kind='stable')
+            self._sorted_ids = memoized_ids[self._sorted_rows]
+        ids = np.array([commit_id.raw for commit_id in commits_ids], dtype='S20')
+        if not len(self._sorted_ids):
+            return np.full(len(ids), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self._sorted_ids, ids), len(self._sorted_ids) - 1)
+        return np.where(self._sorted_ids[positions] == ids, self._sorted_rows[positions], -1)
+
+    def fetch(self, diff_pairs: List[Tuple[git.Oid, Optional[git.Oid]]]) \
+            -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        :param diff_pairs: (commit id, first parent id) pairs, parent id is None for root commits
+        :return: arrays of inserted lines, deleted lines, files count change and flags of estimated lines count
+        in order of given pairs
+        """
+        rows = self._find_rows([commit_id for commit_id, _ in diff_pairs])
+        missing_pairs = [pair for pair, row in zip(diff_pairs, rows) if row < 0]
+        if missing_pairs:
+            missing_stats = self._fetch_missing(missing_pairs)
+            self.diffs_count += len(missing_pairs)
+            for (commit_id, _), commit_stats in zip(missing_pairs, missing_stats.T):
+                self.memoize(commit_id, commit_stats)
+            rows = self._find_rows([commit_id for commit_id, _ in diff_pairs])
+
+        return self._memo.column('insertions')[rows], self._memo.column('deletions')[rows], \
+            self._memo.column('files_delta')[rows], self._memo.column('is_estimated')[rows].astype(bool)
+
+    def memoize(self, commit_id: git.Oid, stats):
+        """
+        :param stats: inserted lines, deleted lines and files count change of the commit against its first parent,
+        optionally followed by whether lines count is estimated (it is not by default)
+        """
+        self._memo.append((commit_id.raw, *stats) if len(stats) == 4 else (commit_id.raw, *stats, 0))
+        self._sorted_ids = None
+
+    def _fetch_missing(self, diff_pairs) -> np.ndarray:
+        """
+        :return: (4, len(diff_pairs))-shaped array of inserted lines, deleted lines, files count change and
+        flags (0 or 1) of estimated lines count
+        """
+        if self.jobs <= 1 or len(diff_pairs) < 2:
+            stats = np.zeros((4, len(diff_pairs)), dtype=np.int64)
+            for i, (commit_id, parent_id) in enumerate(tqdm(diff_pairs, unit=" diffs")):
+                stats[:, i] = get_diff_stats(self.repo, commit_id, parent_id, self.path_filter, self.cost_guard)
+            return stats
+        return self._fetch_in_parallel(diff_pairs)
+
+    def _fetch_in_parallel(self, diff_pairs):
+        # pygit2 objects cannot be shared between processes, so workers receive hex shas and open own repositories
+        hex_pairs = [(str(commit_id), str(parent_id) if parent_id is not None else None)
+                     for commit_id, parent_id in diff_pairs]
+        # several chunks per worker keep all of them busy even if commits in some chunks are expensive to diff
+        chunk_size = min(self.max_chunk_size, math.ceil(len(hex_pairs) / (4 * self.jobs)))
+        chunks = [hex_pairs[i:i + chunk_size] for i in range(0, len(hex_pairs), chunk_size)]
+
+        results = []
+        initargs = (self.repo.path, self.path_filter.options, self.cost_guard.options)
+        with multiprocessing.Pool(self.jobs, initializer=_init_diff_stats_worker, initargs=initargs) as pool, \
+                tqdm(total=len(hex_pairs), unit=" diffs") as progress_bar:
+            for chunk_stats in pool.imap(_fetch_diff_stats_chunk, chunks):
+                results.append(chunk_stats)
+                progress_bar.update(chunk_stats.shape[1])
+        return np.concatenate(results, axis=1)
+
+
+# lightweight substitutes of pygit2.Commit and pygit2.Signature for commits which are not read via pygit2,
+# they have the subset of pygit2 objects' interface used by commits consumers
+CommitRecord = namedtuple('CommitRecord', ['id', 'parent_ids', 'author', 'committer'])
+SignatureRecord = namedtuple('SignatureRecord', ['name', 'email', 'time', 'offset'])
+
+
+class CommitsConsumer(abc.ABC):
+    """
+    Interface of an object fed with commits visited by CommitsScanner
+    """
 
     @abc.abstractmethod
-    def fetch(self):
+    def consume(self, commit: git.Commit, is_first_parent: bool):
+        """
+        :param commit: commit visited by scanner (pygit2.Commit or CommitRecord)
+        :param is_first_parent: whether the commit is on HEAD's first-parent chain
+        """
         pass
 
-    @abc.abstractmethod
-    def _optimize(self, df: pd.DataFrame):
-        return df
+
+class HistoryWindow:
+    """
+    Part of HEAD's history to analyse: commits committed within [since, until] time range, at most `max_commits` of
+    them (the most recent ones by commit time, as `git log --max-count` gives them).
+
+    Ancestors of a commit committed before `since` are hidden, even if they are committed later (e.g. rebased),
+    exactly as `git log --since` hides them.
+    """
+
+    def __init__(self, since: int = None, until: int = None, max_commits: int = None):
+        """
+        :param since: the earliest committer timestamp of analysed commits, unbounded if None
+        :param until: the latest committer timestamp of analysed commits, unbounded if None
+        :param max_commits: maximal number of analysed commits, unbounded if None
+        """
+        self.since = since
+        self.until = until
+        self.max_commits = max_commits
+
+    @property
+    def is_bounded(self) -> bool:
+        return self.since is not None or self.until is not None or self.max_commits is not None
+
+    def hides(self, commit: git.Commit) -> bool:
+        """
+        :return: whether the commit is committed before `since`, i.e. it is hidden along with its ancestors
+        """
+        return self.since is not None and commit.committer.time < self.since
+
+    def is_after_until(self, commit: git.Commit) -> bool:
+        """
+        :return: whether the commit is committed after `until`, i.e. it is not analysed but its ancestors may be
+        """
+        return self.until is not None and commit.committer.time > self.until
+
+    def is_filled(self, commits_count: int) -> bool:
+        """
+        :return: whether the number of analysed commits has reached `max_commits`
+        """
+        return commits_count == self.max_commits
+
+
+class CommitsScanner:
+    """
+    Walks HEAD's history once (in topological order) and feeds every visited commit to subscribed consumers.
+
+    A topological walk reads the whole history before it yields the first commit, so commits of a window bounded by
+    `since` or `max_commits` are found by an unsorted walk (in order of commit time, reading commits as they are
+    yielded) and then sorted topologically, i.e. only the window's part of history is read.
+    """
+
+    def __init__(self, repository: git.Repository, window: HistoryWindow = None):
+        """
+        :param window: part of history to feed consumers with, the whole history by default
+        """
+        self.repo = repository
+        self.window = window if window is not None else HistoryWindow()
+        self.consumers = []
+        self.commits_count = 0
+        # first parent of the oldest scanned commit of the first-parent chain, i.e. the commit the analysed history
+        # starts from, None if the chain is scanned down to its root commit
+        self.base_commit_id = None
+        self.is_scanned = False
+        # commits to walk in topological order if they are known before the walk, HEAD's whole history otherwise
+        self.ordered_ids = None
+
+    def subscribe(self, consumer: CommitsConsumer):
+        assert not self.is_scanned, "Consumer subscribed after history had been scanned"
+        self.consumers.append(consumer)
+        return self
 
     @property
     def commits_walker(self):
+        if self.ordered_ids is not None:
+            return (self.repo[commit_id] for commit_id in self.ordered_ids)
         return self.repo.walk(self.repo.head.target, git.GIT_SORT_TOPOLOGICAL)
 
-    def get_commits_count(self):
-        return sum(1 for _ in self.commits_walker)
+    def _want_parents(self, commit: git.Commit, wanted_ids: set, visited_ids: set,
+                      skipped_ids: set) -> List[git.Commit]:
+        """
+        Marks parents of a followed commit as wanted by the walk
+        :return: parents which the walk has already skipped (possible if commit time is skewed), they are to be
+        followed at once
+        """
+        skipped_parents = []
+        for parent_id in commit.parent_ids:
+            if parent_id in skipped_ids:
+                skipped_ids.remove(parent_id)
+                skipped_parents.append(self.repo[parent_id])
+            elif parent_id not in visited_ids:
+                wanted_ids.add(parent_id)
+        return skipped_parents
 
+    def _find_window(self) -> Dict[git.Oid, List[git.Oid]]:
+        """
+        Walks history in order of commit time till all commits of the window are visited
+        :return: commits of the window (along with its commits committed after `until`) -> their parents
+        """
+        # commits which parents are followed -> their parents
+        followed_parents_ids = {}
+        # commits visited before any of their children was followed
+        skipped_ids = set()
+        visited_ids = set()
+        wanted_ids = {self.repo.head.target}
+        window_commits_count = 0
+        # unsorted walk visits commits in order of commit time (as `git log` does) without reading the whole history,
+        # unlike an explicitly time-sorted one
+        for commit in self.repo.walk(self.repo.head.target, git.GIT_SORT_NONE):
+            if commit.id not in wanted_ids:
+                skipped_ids.add(commit.id)
+                continue
+            pending = [commit]
+            while pending:
+                commit = pending.pop()
+                wanted_ids.discard(commit.id)
+                visited_ids.add(commit.id)
+                if self.window.hides(commit):
+                    continue
+                followed_parents_ids[commit.id] = commit.parent_ids
+                if not self.window.is_after_until(commit):
+                    window_commits_count += 1
+                pending.extend(self._want_parents(commit, wanted_ids, visited_ids, skipped_ids))
+            if not wanted_ids or self.window.is_filled(window_commits_count):
+                break
+        return followed_parents_ids
 
-class WholeHistory(History):
+    def _select_window(self) -> List[git.Oid]:
+        """
+        :return: commits of the window (along with its commits committed after `until`) in topological order
+        """
+        followed_parents_ids = self._find_window()
+        # children go before parents, the first parent is visited first, so first-parent chain goes uninterrupted
+        # unless a merged branch joins it
+        children_counts = {}
+        for parents_ids in followed_parents_ids.values():
+            for parent_id in parents_ids:
+                children_counts[parent_id] = children_counts.get(parent_id, 0) + 1
+        ordered_ids = []
+        pending = [self.repo.head.target] if self.repo.head.target in followed_parents_ids else []
+        while pending:
+            commit_id = pending.pop()
+            ordered_ids.append(commit_id)
+            for parent_id in reversed(followed_parents_ids[commit_id]):
+                if parent_id in followed_parents_ids:
+                    children_counts[parent_id] -= 1
+                    if children_counts[parent_id] == 0:
+                        pending.append(parent_id)
+        return ordered_ids
 
-    @Timeit("Fetching whole history data")
-    def fetch(self):
-        records = []
-        for commit in tqdm(self.commits_walker, total=self.get_commits_count()):
-            author_name, author_email = map_signature(self.mailmap, commit.author)
-
-            is_merge_commit = False
-            insertions, deletions = 0, 0
-            if len(commit.parents) == 0:  # initial commit
-                st = commit.tree.diff_to_tree(swap=True).stats
-                insertions, deletions = st.insertions, st.deletions
-            elif len(commit.parents) == 1:
-                parent_commit = commit.parents[0]
-                st = self.repo.diff(parent_commit, commit).stats
-                insertions, deletions = st.insertions, st.deletions
-            # case len(commit.parents) > 1 corresponds to a merge commit
-            # merge commits are ignored: changes in merge commits are normally because of integration issues
+    def _walk_window(self):
+        """
+        :return: generator of (commit, is_first_parent) pairs of commits within the window
+        """
+        # topological order guarantees that commits of first-parent chain are visited one after another,
+        # i.e. the next visited commit of the chain is always the first parent of the previous one
+        first_parent_id = self.repo.head.target
+        # commits not visited yet which have a child within the window, all of them are visited after their children
+        wanted_ids = {first_parent_id}
+        walked_count = 0
+        for commit in self.commits_walker:
+            if commit.id not in wanted_ids:
+                # ancestor of commits outside the window only
+                continue
+            wanted_ids.remove(commit.id)
+            is_first_parent = commit.id == first_parent_id
+            if self.window.hides(commit):
+                # the commit and all its ancestors (unless wanted by other commits) are hidden
+                if is_first_parent:
+                    first_parent_id = None
             else:
-                is_merge_commit = True
-
-            records.append({'commit_sha': str(commit.id)[:7],
-                            'is_merge_commit': is_merge_commit,
-                            'author_name': author_name,
-                            'author_email': author_email,
-                            'author_tz_offset': commit.author.offset,
-                            'author_timestamp': commit.author.time,
-                            'review_duration': commit.committer.time - commit.author.time,
-                            'insertions': insertions,
-                            'deletions': deletions})
-        return records
+                wanted_ids.update(commit.parent_ids)
+                if is_first_parent:
+                    first_parent_id = commit.parent_ids[0] if commit.parent_ids else None
+                if not self.window.is_after_until(commit):
+                    if is_first_parent:
+                        self.base_commit_id = first_parent_id
+                    yield commit, is_first_parent
+                    walked_count += 1
+            if not wanted_ids or self.window.is_filled(walked_count):
+                break
+
+    @Timeit("Scanning commits history")
+    def scan(self):
+        if self.is_scanned:
+            return
+        if self.window.since is not None or self.window.max_commits is not None:
+            self.ordered_ids = self._select_window()
+        window_walker = self._walk_window()
+        for commit, is_first_parent in tqdm(window_walker, unit=" commits"):
+            for consumer in self.consumers:
+                consumer.consume(commit, is_first_parent)
+            self.commits_count += 1
+        self.is_scanned = True
+        # consumers keep reference to the scanner, so releasing them here breaks the reference cycle
+        self.consumers = []
+
+
+class HistoryBackend:
+    """
+    Source of histories' data: a scanner feeding commits to histories and a calculator of commits' changes
+    """
+    name = None
+
+    def __init__(self, scanner: CommitsScanner, diff_stats: DiffStatsFetcher):
+        self.scanner = scanner
+        self.diff_stats = diff_stats
+
+
+class Pygit2HistoryBackend(HistoryBackend):
+    """
+    Commits are walked and diffed via pygit2 (libgit2)
+    """
+    name = 'pygit2'
+
+    def __init__(self, repository: git.Repository, jobs: int = 1, prefetch_diffs: bool = True,
+                 window: HistoryWindow = None, path_filter: PathFilter = None, cost_guard: DiffCostGuard = None):
+        """
+        :param jobs: number of processes to diff commits in
+        :param prefetch_diffs: not used, commits are diffed only once their changes are fetched
+        :param window: part of history to scan, the whole history by default
+        :param path_filter: filter of files to diff, all files are diffed by default
+        :param cost_guard: limits of commit's changes to diff, all commits are diffed by default
+        """
+        super().__init__(CommitsScanner(repository, window),
+                         DiffStatsFetcher(repository, jobs=jobs, path_filter=path_filter, cost_guard=cost_guard))
+
+
+class History(CommitsConsumer):
+    # column name -> dtype of history records, order defines the order of values in a record's row
+    columns_dtypes = {}
+    # columns derived from commits' changes, i.e. commits are diffed only if any of these columns is fetched
+    diffed_columns = ('insertions', 'deletions', 'is_diff_estimated')
+
+    def __init__(self, repository: git.Repository, branch: str = "master", scanner: CommitsScanner = None,
+                 cache: HistoryCache = None, diff_stats: DiffStatsFetcher = None, identities: AuthorIdentities = None):
+        """
+        :param scanner: commits scanner shared with other consumers, if not given history is scanned on its own
+        :param cache: persistent storage of records computed in previous runs
+        :param diff_stats: calculator of inserted/deleted lines, by default diffs are done in current process
+        :param identities: authors' ids shared with other data fetchers
+        """
+        self.repo = repository
+        self.branch = branch
+        self.cache = cache
+        self.diff_stats = diff_stats if diff_stats is not None else DiffStatsFetcher(self.repo)
+        self.identities = identities if identities is not None else AuthorIdentities(self.repo)
+        self.records = ColumnarRecords(self.columns_dtypes, categories={
+            'author_name': self.identities.names,
+            'author_email': self.identities.emails,
+        })
+        # (record index, commit id, parent id) of records which wait for insertions/deletions
+        self._pending_diffs = []
+        self.scanner = scanner if scanner is not None else CommitsScanner(self.repo)
+        self.scanner.subscribe(self)
+
+    @property
+    def cache_section(self):
+        return self.__class__.__name__
+
+    def consume(self, commit: git.Commit, is_first_parent: bool):
+        if not self._is_recorded(commit, is_first_parent):
+            return
+
+        row = self.cache.get(self.cache_section, commit.id) if self.cache is not None else None
+        if row is not None:
+            self.records.append_decoded(row)
+            return
+
+        i = self.records.append(self._make_row(commit))
+        if self._is_diffed(commit):
+            # diffs are the expensive part, they are calculated all together once history is scanned
+            parent_id = commit.parent_ids[0] if commit.parent_ids else None
+            self._pending_diffs.append((i, commit.id, parent_id))
+        elif self.cache is not None:
+            self.cache.put(self.cache_section, commit.id, self.records.row(i))
+
+    @Timeit("Fetching commits changes")
+    def _fetch_pending_diffs(self):
+        diff_pairs = [(commit_id, parent_id) for _, commit_id, parent_id in self._pending_diffs]
+        insertions, deletions, files_deltas, is_estimated = self.diff_stats.fetch(diff_pairs)
+        pending_indices = np.array([i for i, _, _ in self._pending_diffs], dtype=np.int64)
+        self.records.column('insertions')[pending_indices] = insertions
+        self.records.column('deletions')[pending_indices] = deletions
+        self.records.column('is_diff_estimated')[pending_indices] = is_estimated
+        self._on_diffs_fetched(pending_indices, files_deltas)
+
+        if self.cache is not None:
+            for i, commit_id, _ in self._pending_diffs:
+                self.cache.put(self.cache_section, commit_id, self.records.row(i))
+        self._pending_diffs = []
+
+    def _on_diffs_fetched(self, records_indices: np.ndarray, files_deltas: np.ndarray):
+        """
+        Hook to complete pending records with data derived from commits' changes
+        :param records_indices: indices of pending records
+        :param files_deltas: change of files count by every pending commit
+        """
+        pass
+
+    def _is_recorded(self, commit: git.Commit, is_first_parent: bool) -> bool:
+        return True
+
+    def _is_diffed(self, commit: git.Commit) -> bool:
+        """
+        :return: whether commit's changes are calculated against its first parent (or an empty tree for root commit)
+        """
+        return True
+
+    @abc.abstractmethod
+    def _make_row(self, commit: git.Commit) -> tuple:
+        """
+        :return: commit's record values (in order of `columns_dtypes`) with zero (not estimated) insertions/deletions,
+        these are filled in after history is scanned; categorical columns take codes
+        """
+        pass
+
+    def as_dataframe(self, columns: List[str] = None):
+        """
+        :param columns: names of columns to fetch, all columns by default
+        """
+        data = self.fetch(columns)
+        if 'commit_id' in data:
+            # pandas cannot take rows (filter, sort, etc.) of a dataframe with numpy's void column,
+            # so raw commit ids are given as bytes objects
+            data['commit_id'] = data['commit_id'].astype(object)
+        # columns are numpy arrays, so dataframe is built around them without copying
+        df = pd.DataFrame(data, copy=False)
+        return self._optimize(df)
+
+    def fetch(self, columns: List[str] = None):
+        """
+        :param columns: names of columns to fetch, all columns by default
+        :return: column name -> values
+        """
+        columns = list(self.columns_dtypes) if columns is None else columns
+        unknown_columns = [name for name in columns if name not in self.columns_dtypes]
+        if unknown_columns:
+            raise ValueError(f"Unknown columns of {self.__class__.__name__}: {', '.join(unknown_columns)}")
+
+        self.scanner.scan()
+        # pending records stay pending (and are not cached) until their diffed columns are requested
+        if self._pending_diffs and any(name in self.diffed_columns for name in columns):
+            self._fetch_pending_diffs()
+        return self.records.as_columns(columns)
+
+    def get_records_indices(self, commit_ids: np.ndarray) -> np.ndarray:
+        """
+        :param commit_ids: raw commit ids ('V20' array)
+        :return: index of every commit's record, -1 for commits which are not recorded
+        """
+        self.scanner.scan()
+        # pandas does not index void values, bytes of the same length are indexed instead
+        recorded_ids = pd.Index(self.records.column('commit_id').view('S20'))
+        return recorded_ids.get_indexer(commit_ids.view('S20'))
+
+    @abc.abstractmethod
+    def _optimize(self, df: pd.DataFrame):
+        return df
+
+
+class WholeHistory(History):
+    columns_dtypes = {
+        'commit_id': 'V20',
+        'is_merge_commit': 'bool',
+        'author_name': 'category',
+        'author_email': 'category',
+        'author_tz_offset': 'int16',
+        'author_timestamp': 'int64',
+        'review_duration': 'int64',
+        'insertions': 'int32',
+        'deletions': 'int32',
+        # whether insertions/deletions are estimated as the commit exceeds limits of `DiffCostGuard`
+        'is_diff_estimated': 'bool',
+    }
+
+    def _is_diffed(self, commit: git.Commit) -> bool:
+        # merge commits are ignored: changes in merge commits are normally because of integration issues
+        return len(commit.parent_ids) <= 1
+
+    def _make_row(self, commit: git.Commit) -> tuple:
+        author_id, author_email_id = self.identities.resolve(commit.author)
+        return (commit.id.raw,
+                len(commit.parent_ids) > 1,
+                author_id,
+                author_email_id,
+                commit.author.offset,
+                commit.author.time,
+                commit.committer.time - commit.author.time,
+                0,
+                0,
+                False)
 
     def _optimize(self, df: pd.DataFrame):
-        df['author_name'] = pd.Categorical(df['author_name'])
-        df['author_email'] = pd.Categorical(df['author_email'])
+        # authors' columns are fetched as categorical with codes being authors' ids
         return df
 
 
 class LinearHistory(History):
+    columns_dtypes = {
+        'commit_id': 'V20',
+        'committer_timestamp': 'int64',
+        'files_count': 'int32',
+        'insertions': 'int32',
+        'deletions': 'int32',
+        # whether insertions/deletions are estimated as the commit exceeds limits of `DiffCostGuard`
+        'is_diff_estimated': 'bool',
+    }
+    diffed_columns = ('files_count', 'insertions', 'deletions', 'is_diff_estimated')
 
-    @Timeit("Fetching linear history data")
-    def fetch(self):
-        records = []
-        for commit in tqdm(self.commits_walker, total=self.get_commits_count()):
-
-            insertions, deletions = 0, 0
-            if len(commit.parents) == 0:  # initial commit
-                st = commit.tree.diff_to_tree(swap=True).stats
-                insertions, deletions = st.insertions, st.deletions
-            elif len(commit.parents) >= 1:
-                parent_commit = commit.parents[0]
-                st = self.repo.diff(parent_commit, commit).stats
-                insertions, deletions = st.insertions, st.deletions
-
-            records.append({'commit_sha': str(commit.id)[:7],
-                            'committer_timestamp': commit.committer.time,
-                            'files_count': len(commit.tree.diff_to_tree()),
-                            'insertions': insertions,
-                            'deletions': deletions})
-        return records
+    def _is_recorded(self, commit: git.Commit, is_first_parent: bool) -> bool:
+        return is_first_parent
+
+    def _make_row(self, commit: git.Commit) -> tuple:
+        # merge commits are diffed against their first parent, i.e. they contain all changes of merged branch
+        return (commit.id.raw,
+                commit.committer.time,
+                0,
+                0,
+                0,
+                False)
+
+    def _on_diffs_fetched(self, records_indices: np.ndarray, files_deltas: np.ndarray):
+        # files count of a commit is the one of its first parent plus files added and minus files deleted by commit,
+        # records are ordered from HEAD down the first-parent chain, so the counts are accumulated in reverse order
+        pending_deltas = {i: (files_delta, parent_id)
+                          for (i, _, parent_id), files_delta in zip(self._pending_diffs, files_deltas)}
+        files_counts = self.records.column('files_count')
+        files_count = None
+        for i in reversed(range(len(files_counts))):
+            if i not in pending_deltas:
+                files_count = int(files_counts[i])
+                continue
+            files_delta, parent_id = pending_deltas[i]
+            if files_count is None:
+                files_count = count_files(self.repo[parent_id].tree, self.diff_stats.path_filter) \
+                    if parent_id is not None else 0
+            files_count += int(files_delta)
+            files_counts[i] = files_count
 
     def _optimize(self, df: pd.DataFrame):
         return super()._optimize(df)
 
+
+# file of a revision's tree, binary files have zero lines count
+FileRecord = namedtuple('FileRecord', ['path', 'blob_id', 'size', 'is_binary', 'lines_count'])
+
+
+class RevisionSnapshot:
+    """
+    Files of a revision's tree, the tree is scanned (and its files are read) once for all data fetchers using it
+    """
+    def __init__(self, repository: git.Repository, revision: str = None, path_filter: PathFilter = None,
+                 cache: BlobsCache = None):
+        """
+        :param path_filter: filter of files to take into account, all files by default
+        :param cache: persistent storage of blobs' records computed in previous runs
+        """
+        self.repo = repository
+        self.path_filter = path_filter if path_filter is not None else PathFilter(self.repo)
+        self.cache = cache
+        # annotated tags are peeled to commits they point to
+        self.revision_commit = self.repo.revparse_single(revision).peel(git.Commit) if revision \
+            else self.repo.head.peel()
+        self._files = None
+
     @property
-    def commits_walker(self):
-        walker = super(LinearHistory, self).commits_walker
-        walker.simplify_first_parent()
-        return walker
+    def files(self) -> List[FileRecord]:
+        """
+        :return: included files of the revision except submodules, in order of their paths
+        """
+        if self._files is None:
+            self._files = self._scan()
+        return self._files
+
+    @Timeit("Scanning revision's files")
+    def _scan(self) -> List[FileRecord]:
+        submodules_paths = self.repo.listall_submodules()
+        diff = self.revision_commit.tree.diff_to_tree(swap=True)
+        files = []
+        for i, delta in enumerate(diff.deltas):
+            filepath = delta.new_file.path
+            if filepath not in submodules_paths and self.path_filter.is_included(filepath):
+                # blob's id is known from the tree, so cached blobs are not read at all
+                blob_record = self.cache.get(delta.new_file.id) if self.cache is not None else None
+                if blob_record is None:
+                    # patch (hence lines count) is made for included files only
+                    p = diff[i]
+                    blob_record = (p.delta.is_binary, p.delta.new_file.size, p.line_stats[1])
+                    if self.cache is not None:
+                        self.cache.put(delta.new_file.id, blob_record)
+                is_binary, size, lines_count = blob_record
+                files.append(FileRecord(filepath, delta.new_file.id, size, is_binary, lines_count))
+        return files
+
+
+def get_blame_window_start(months: int, now: pd.Timestamp = None) -> int:
+    """
+    :param months: number of months before current one lines are blamed within
+    :param now: current time (UTC), the actual one by default
+    :return: timestamp of the beginning of the month the window starts with, so that the blame boundary (and the blame
+    cache depending on it) stays the same for runs within a month
+    """
+    now = now if now is not None else pd.Timestamp.utcnow()
+    return int((now - pd.DateOffset(months=months)).normalize().replace(day=1).timestamp())
+
+
+def find_blame_boundary(repository: git.Repository, commit: git.Commit, since: int) -> Optional[git.Oid]:
+    """
+    :param since: timestamp lines are blamed since
+    :return: id of the latest commit of the first-parent chain committed before the timestamp, None if the whole chain
+    is newer
+    """
+    while commit.committer.time >= since:
+        if not commit.parent_ids:
+            return None
+        commit = repository[commit.parent_ids[0]]
+    return commit.id
+
+
+def blame_file(repository: git.Repository, file_path: str, oldest_commit_id: git.Oid = None,
+               newest_commit_id: git.Oid = None) -> Tuple[bytes, np.ndarray]:
+    """
+    :param oldest_commit_id: the commit blame stops at (see `find_blame_boundary`), the whole history is blamed if None
+    :param newest_commit_id: the commit file is blamed at, HEAD if None
+    :return: raw ids (concatenated) of commits file's lines come from and lines count of every commit, lines older
+    than the oldest commit are attributed to it
+    """
+    lines_counts = {}
+    blame = repository.blame(file_path, newest_commit=newest_commit_id, oldest_commit=oldest_commit_id)
+    for blame_hunk in blame:
+        # hunk's signature is resolved by its commit later, once per commit of the whole revision
+        commit_id = blame_hunk.final_commit_id.raw
+        lines_counts[commit_id] = lines_counts.get(commit_id, 0) + blame_hunk.lines_in_hunk
+    return b''.join(lines_counts), np.fromiter(lines_counts.values(), dtype=np.int32, count=len(lines_counts))
+
+
+def _blame_worker(connection: multiprocessing.connection.Connection, repository_path: str,
+                  oldest_commit_sha: Optional[str], newest_commit_sha: Optional[str]):
+    # every worker process has its own repository, files to blame are received one by one until None
+    repository = git.Repository(repository_path)
+    oldest_commit_id = git.Oid(hex=oldest_commit_sha) if oldest_commit_sha is not None else None
+    newest_commit_id = git.Oid(hex=newest_commit_sha) if newest_commit_sha is not None else None
+    for file_path in iter(connection.recv, None):
+        try:
+            connection.send((blame_file(repository, file_path, oldest_commit_id, newest_commit_id), None))
+        except Exception as ex:
+            connection.send((None, ex))
+    connection.close()
+
+
+class BlameExecutor:
+    """
+    Blames files in worker processes, each of them with its own repository.
+
+    Files are blamed largest first, so that a few huge files do not end up blamed alone at the end. A worker which
+    blames a file longer than the timeout (or crashes) is killed and replaced, the file is reported as failed.
+    """
+
+    def __init__(self, repository_path: str, jobs: int = 1, timeout: float = None, oldest_commit_id: git.Oid = None,
+                 newest_commit_id: git.Oid = None):
+        """
+        :param jobs: number of worker processes
+        :param timeout: maximal time (in seconds) to blame a file, unlimited if None
+        :param oldest_commit_id: the commit blame stops at, the whole history is blamed if None
+        :param newest_commit_id: the commit files are blamed at, HEAD if None
+        """
+        self.repository_path = repository_path
+        self.oldest_commit_sha = str(oldest_commit_id) if oldest_commit_id is not None else None
+        self.newest_commit_sha = str(newest_commit_id) if newest_commit_id is not None else None
+        self.jobs = max(jobs, 1)
+        self.timeout = timeout
+        # path of file which blame has timed out or failed -> reason of the failure
+        self.failures = {}
+
+    def _spawn(self) -> Tuple[multiprocessing.Process, multiprocessing.connection.Connection]:
+        connection, worker_connection = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=_blame_worker,
+                                          args=(worker_connection, self.repository_path, self.oldest_commit_sha,
+                                                self.newest_commit_sha),
+                                          daemon=True)
+        process.start()
+        worker_connection.close()
+        return process, connection
+
+    def blame(self, files: List[FileRecord]) -> Dict[str, Tuple[bytes, np.ndarray]]:
+        """
+        :return: file path -> blamed commits and their lines counts (see `blame_file`) of successfully blamed files
+        """
+        # files are taken from the end, i.e. the largest first
+        pending_paths = [file.path for file in sorted(files, key=lambda file: file.size)]
+        idle_workers = [self._spawn() for _ in range(min(self.jobs, len(pending_paths)))]
+        # connection -> (process, path of file being blamed, time the file was sent at)
+        busy_workers = {}
+        results = {}
+        try:
+            with tqdm(total=len(pending_paths), unit=" files") as progress_bar:
+                while pending_paths or busy_workers:
+                    while idle_workers and pending_paths:
+                        process, connection = idle_workers.pop()
+                        file_path = pending_paths.pop()
+                        connection.send(file_path)
+                        busy_workers[connection] = (process, file_path, time.monotonic())
+
+                    ready_connections = multiprocessing.connection.wait(list(busy_workers),
+                                                                        self._wait_timeout(busy_workers))
+                    for connection in ready_connections:
+                        process, file_path, _ = busy_workers.pop(connection)
+                        try:
+                            file_blame, error = connection.recv()
+                        except EOFError:
+                            self._replace_worker(process, connection, idle_workers, pending_paths)
+                            self._fail(file_path, "worker process has crashed")
+                        else:
+                            idle_workers.append((process, connection))
+                            if error is not None:
+                                raise error
+                            results[file_path] = file_blame
+                        progress_bar.update(1)
+
+                    for connection, (process, file_path, start_time) in list(busy_workers.items()):
+                        if self.timeout is not None and time.monotonic() - start_time > self.timeout:
+                            del busy_workers[connection]
+                            self._replace_worker(process, connection, idle_workers, pending_paths)
+                            self._fail(file_path, f"blame has taken more than {self.timeout} s")
+                            progress_bar.update(1)
+        finally:
+            for process, connection in idle_workers:
+                connection.send(None)
+                connection.close()
+                process.join()
+            for connection, (process, _, _) in busy_workers.items():
+                process.kill()
+                connection.close()
+                process.join()
+        return results
+
+    def _wait_timeout(self, busy_workers: dict) -> Optional[float]:
+        # results are waited for until the earliest started file exceeds the timeout
+        if self.timeout is None:
+            return None
+        earliest_start_time = min(start_time for _, _, start_time in busy_workers.values())
+        return max(earliest_start_time + self.timeout - time.monotonic(), 0)
+
+    def _replace_worker(self, process: multiprocessing.Process, connection: multiprocessing.connection.Connection,
+                        idle_workers: list, pending_paths: list):
+        process.kill()
+        process.join()
+        connection.close()
+        if pending_paths:
+            idle_workers.append(self._spawn())
+
+    def _fail(self, file_path: str, reason: str):
+        # failures are reported by the caller at once
+        self.failures[file_path] = reason
 
 
 class BlameData:
     """
     Class to fetch raw data about repository state at certain revision
     """
-    def __init__(self, repository: git.Repository, revision: str = None):
+    # number of files which failures are listed in the warning about not blamed files
+    reported_failures_count = 10
+
+    def __init__(self, repository: git.Repository, revision: str = None, identities: AuthorIdentities = None,
+                 path_filter: PathFilter = None, snapshot: RevisionSnapshot = None, cache: BlameCache = None,
+                 jobs: int = 1, timeout: float = None, oldest_commit_id: git.Oid = None, sample_size: int = None,
+                 sample_seed: int = 0, history: WholeHistory = None):
+        """
+        :param identities: authors' ids shared with other data fetchers, history's ones if history is given
+        :param path_filter: filter of files to blame, all files are blamed by default
+        :param snapshot: revision's files shared with other data fetchers (`revision` and `path_filter` are not used
+        if it is given)
+        :param cache: persistent storage of files' blame computed in previous runs
+        :param jobs: number of worker processes to blame files in, files are blamed in current process if jobs <= 1
+        and there is no timeout
+        :param timeout: maximal time (in seconds) to blame a file, files exceeding it are not blamed
+        :param oldest_commit_id: the commit blame stops at (see `find_blame_boundary`), lines older than it have
+        no committer (i.e. -1 committer id), the whole history is blamed if None
+        :param sample_size: number of text files to blame (see `BlameSample`), all files are blamed if None
+        :param sample_seed: seed of files' sampling
+        :param history: history of the repository blamed commits' authors and timestamps are taken from, commits
+        missing in it (or all commits if it is not given) are looked up in the repository
+        """
         self.repo = repository
-        self.mailmap = git.Mailmap.from_repository(self.repo)
-        self.revision_commit = self.repo.revparse_single(revision) if revision else self.repo.head.peel()
-
-    def _get_data_from_blame_hunk(self, blame_hunk):
-        hunk_committer = blame_hunk.final_committer
-        if not hunk_committer:
-            # if committer configured an empty email when created commit
-            # blame hunk corresponding to that commit will produce a None signature
-            # the following substitutes hunk's final committer with an author of the commit
-            hunk_committer = self.repo[blame_hunk.orig_commit_id].author
-        committer_name, _ = map_signature(self.mailmap, hunk_committer)
-        return [committer_name, blame_hunk.lines_in_hunk, hunk_committer.time]
-
-    def blame_file(self, file_path):
-        blob_blame = self.repo.blame(file_path)
-        blame_info = [self._get_data_from_blame_hunk(blame_hunk) + [file_path] for blame_hunk in blob_blame]
-        return blame_info
+        self.history = history
+        if identities is None:
+            identities = history.identities if history is not None else AuthorIdentities(self.repo)
+        self.identities = identities
+        self.snapshot = snapshot if snapshot is not None else RevisionSnapshot(self.repo, revision, path_filter)
+        self.cache = cache
+        self.jobs = jobs
+        self.timeout = timeout
+        self.oldest_commit_id = oldest_commit_id
+        self.sample_size = sample_size
+        self.sample_seed = sample_seed
+        # paths of files which blame has timed out or failed
+        self.failed_paths = []
+        # blamed files if only a sample of files is blamed
+        self.sample = None
+
+    def blame_file(self, file_path) -> Tuple[bytes, np.ndarray]:
+        """
+        :return: raw ids (concatenated) of commits file's lines come from and lines count of every commit
+        """
+        return blame_file(self.repo, file_path, self.oldest_commit_id, self.snapshot.revision_commit.id)
+
+    def _blame_files(self, files: List[FileRecord]) -> Dict[str, Tuple[bytes, np.ndarray]]:
+        if self.jobs <= 1 and self.timeout is None:
+            return {file.path: self.blame_file(file.path) for file in tqdm(files, unit=" files")}
+        executor = BlameExecutor(self.repo.path, self.jobs, self.timeout, self.oldest_commit_id,
+                                 self.snapshot.revision_commit.id)
+        files_blame = executor.blame(files)
+        self.failed_paths = list(executor.failures)
+        if executor.failures:
+            reported_failures = [f"{path} ({reason})" for path, reason in
+                                 itertools.islice(executor.failures.items(), self.reported_failures_count)]
+            more = f" and {len(executor.failures) - len(reported_failures)} more" \
+                if len(executor.failures) > len(reported_failures) else ""
+            warnings.warn(f"Files not blamed ({len(executor.failures)}): {', '.join(reported_failures)}{more}")
+        return files_blame
+
+    def _resolve_commits(self, commit_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param commit_ids: raw ids of blamed commits
+        :return: author's id and author's timestamp of every commit; lines of the oldest blamed commit may be older than
+        it, so its author's id is -1 and its timestamp is 0, i.e. its lines are older than any period
+        """
+        authors_ids = np.empty(len(commit_ids), dtype=np.int32)
+        timestamps = np.empty(len(commit_ids), dtype=np.int64)
+        records_indices = self.history.get_records_indices(commit_ids) if self.history is not None \
+            else np.full(len(commit_ids), -1)
+        is_recorded = records_indices >= 0
+        if is_recorded.any():
+            authors_ids[is_recorded] = self.history.records.column('author_name')[records_indices[is_recorded]]
+            timestamps[is_recorded] = self.history.records.column('author_timestamp')[records_indices[is_recorded]]
+        # commits out of history (e.g. older than history's window) are read from the repository
+        for i in np.flatnonzero(~is_recorded):
+            author = self.repo[git.Oid(raw=commit_ids[i].tobytes())].author
+            authors_ids[i], _ = self.identities.resolve(author)
+            timestamps[i] = author.time
+        if self.oldest_commit_id is not None:
+            is_oldest = commit_ids == np.frombuffer(self.oldest_commit_id.raw, dtype='V20')[0]
+            authors_ids[is_oldest] = -1
+            timestamps[is_oldest] = 0
+        return authors_ids, timestamps
 
     @Timeit("Fetching blame data")
     def fetch(self):
-        submodules_paths = self.repo.listall_submodules()
-        diff_to_tree = self.revision_commit.tree.diff_to_tree()
-        files_to_blame = [p.delta.new_file.path for p in diff_to_tree
-                          if not p.delta.is_binary and p.delta.new_file.path not in submodules_paths]
+        """
+        :return: column name -> values of blame records, i.e. lines count of a file coming from a commit;
+        committer of lines older than the oldest blamed commit is unknown (NaN) and their timestamp is 0
+        """
+        text_files = [file for file in self.snapshot.files if not file.is_binary]
+        if self.sample_size is not None and self.sample_size < len(text_files):
+            self.sample = BlameSample(text_files, self.sample_size, self.sample_seed)
+            text_files = self.sample.files
+
+        files_blame = {}
+        files_to_blame = []
+        for file in text_files:
+            file_blame = self.cache.get(file.path, file.blob_id) if self.cache is not None else None
+            if file_blame is None:
+                files_to_blame.append(file)
+            else:
+                files_blame[file.path] = file_blame
+
+        blamed_files = self._blame_files(files_to_blame)
+        for file in files_to_blame:
+            if file.path in blamed_files:
+                files_blame[file.path] = blamed_files[file.path]
+                if self.cache is not None:
+                    self.cache.put(file.path, file.blob_id, blamed_files[file.path])
+        if self.sample is not None:
+            # metrics are extrapolated from files which have been blamed
+            self.sample.discard(self.failed_paths)
 
-        results = thread_map(self.blame_file, files_to_blame)
-        return [rec for val in results for rec in val]
+        # blame records are typed arrays of file's path id, blamed commit's index and lines count, commits' authors
+        # and timestamps are joined to them by commit's index
+        paths = [file.path for file in self.snapshot.files if file.path in files_blame]
+        blames = [files_blame[path] for path in paths]
+        paths_ids = np.repeat(np.arange(len(paths), dtype=np.int32), [len(lines_counts) for _, lines_counts in blames])
+        commit_ids, commits_indices = np.unique(np.frombuffer(b''.join(ids for ids, _ in blames), dtype='V20'),
+                                                return_inverse=True)
+        lines_counts = np.concatenate([np.zeros(0, dtype=np.int32)] + [lines_counts for _, lines_counts in blames])
+        authors_ids, timestamps = self._resolve_commits(commit_ids)
+        return {
+            'committer_name': self.identities.names.as_categorical(authors_ids[commits_indices]),
+            'lines_count': lines_counts,
+            'timestamp': timestamps[commits_indices],
+            'filepath': pd.Categorical.from_codes(paths_ids, categories=paths),
+        }
 
     def as_dataframe(self):
-        data = self.fetch()
-        df = pd.DataFrame(data, columns=["committer_name", "lines_count", "timestamp", "filepath"])
-        # this saves some memory
-        df["committer_name"] = pd.Categorical(df["committer_name"])
-        df["filepath"] = pd.Categorical(df["filepath"])
-        return df
+        # committers' ids are codes of the categorical column, as in history data, unknown committers are NaN
+        return pd.DataFrame(self.fetch(), copy=False)
 
 
 class FilesData:
     """
     Class to fetch raw data about repository state at certain revision
     """
-    def __init__(self, repository: git.Repository, revision: str = None):
-        self.repo = repository
-        self.revision_commit = self.repo.revparse_single(revision) if revision else self.repo.head.peel()
+    def __init__(self, repository: git.Repository, revision: str = None, path_filter: PathFilter = None,
+                 cache: BlobsCache = None, snapshot: RevisionSnapshot = None):
+        """
+        :param path_filter: filter of files to take into account, all files by default
+        :param cache: persistent storage of blobs' records computed in previous runs
+        :param snapshot: revision's files shared with other data fetchers (`revision`, `path_filter` and `cache` are
+        not used if it is given)
+        """
+        self.snapshot = snapshot if snapshot is not None else RevisionSnapshot(repository, revision, path_filter, cache)
 
-    @Timeit("Fetching files data")
     def _fetch(self):
-        submodules_paths = self.repo.listall_submodules()
-        head_commit_tree = self.revision_commit.tree.diff_to_tree(swap=True)
-        records = []
-        for p in head_commit_tree:
-            filepath = p.delta.new_file.path
-            if filepath not in submodules_paths:
-                records.append({
-                    "file": filepath,
-                    "is_binary": p.delta.is_binary,
-                    "size_bytes": p.delta.new_file.size,
-                    "lines_count": p.line_stats[1]
-                })
-        return records
+        return [{
+            "file": file.path,
+            "is_binary": file.is_binary,
+            "size_bytes": file.size,
+            "lines_count": file.lines_count
+        } for file in self.snapshot.files]
 
     def as_dataframe(self):
         data = self._fetch()
@@ -199,59 +1174,203 @@ class FilesData:
         return df
 
 
-class TagsData:
-    def __init__(self, repository: git.Repository):
+def _natural_key(name: str) -> List:
+    """
+    :return: key of a name comparing its numbers as numbers, e.g. 'v9' goes before 'v10'
+    """
+    # numbers are at odd positions of the split name
+    return [int(part) if i % 2 else part for i, part in enumerate(re.split(r'(\d+)', name))]
+
+
+# tag of a commit, lightweight tags have no tagger (its time is -1)
+TagRecord = namedtuple('TagRecord', ['name', 'commit_id', 'commit_time', 'tagger_name', 'tagger_time'])
+
+
+class TagsData(CommitsConsumer):
+    """
+    Releases' commits: tags are ordered topologically (a tag goes after tags of its commit's ancestors, unrelated tags
+    are ordered by their commits' time) and a commit belongs to the first tag it is reachable from, i.e. a release
+    consists of commits reachable from its tag but not from any preceding tag. Commits not reachable from any tag are
+    unreleased. Tags which are not on HEAD's history (e.g. of release branches) are walked on their own after the scan.
+    """
+
+    def __init__(self, repository: git.Repository, scanner: CommitsScanner = None,
+                 identities: AuthorIdentities = None):
         """
-        :param path: path to a repository
+        :param repository: git repository
+        :param scanner: commits scanner shared with other consumers, if not given history is scanned on its own
+        :param identities: authors' ids shared with other data fetchers
         """
         self.repo = repository
-        self.mailmap = git.Mailmap.from_repository(self.repo)
+        self.identities = identities if identities is not None else AuthorIdentities(self.repo)
+        self._tags_references = None
+        self._tags = None
+        # commits in order of the walk, their parents and commit time
+        self._commits_ids = []
+        self._parents_ids = []
+        self._commits_times = []
+        self.records = ColumnarRecords({'commit_author': 'category', 'commit_time': 'int64', 'is_merge': 'bool'},
+                                       categories={'commit_author': self.identities.names})
+        self._records = None
+        self.scanner = scanner if scanner is not None else CommitsScanner(self.repo)
+        self.scanner.subscribe(self)
 
-    @Timeit("Fetching tags info")
-    def fetch(self):
-        # TODO: this should perhaps be a part of WholeHistory
-        tag_refs = {refobj.peel().oid: refobj
-                    for refobj in self.repo.listall_reference_objects() if refobj.name.startswith('refs/tags')}
-
-        result = []
-        tag_ref = None
-        is_symbolic_reference = False
-        for commit in self.repo.walk(self.repo.head.target, git.GIT_SORT_TOPOLOGICAL):
-            author_name, _ = map_signature(self.mailmap, commit.author)
-            if commit.oid in tag_refs:
-                tag_ref: git.Reference = tag_refs[commit.oid]
-                is_symbolic_reference = tag_ref.target.id == commit.id
-
-            if tag_ref is not None:
-                if not is_symbolic_reference:
-                    tag = self.repo[tag_ref.target]
-                    tagger_name, _ = map_signature(self.mailmap, tag.tagger)
-                    tag_metadata = {
-                        "tag_name": tag.name,
-                        "tagger_name": tagger_name,
-                        "tagger_time": tag.tagger.time,
-                    }
+    @property
+    def tags(self) -> List[TagRecord]:
+        """
+        :return: tags of commits from ancestors to descendants, tags of the same commit are ordered by tagging time and
+        name (numbers within names are compared as numbers)
+        """
+        if self._tags is None:
+            self.fetch()
+        return self._tags
+
+    def _read_tags(self) -> List[TagRecord]:
+        """
+        :return: tags of commits in arbitrary order, annotated tags are resolved once
+        """
+        if self._tags_references is None:
+            tags = []
+            for reference in self.repo.listall_reference_objects():
+                if not reference.name.startswith('refs/tags/'):
+                    continue
+                try:
+                    commit = reference.peel(git.Commit)
+                except git.InvalidSpecError:
+                    # tag of a tree or a blob
+                    continue
+                target = self.repo[reference.target]
+                if isinstance(target, git.Tag) and target.tagger is not None:
+                    tagger_name, tagger_time = self.identities.name(target.tagger), target.tagger.time
                 else:
-                    tag_metadata = {
-                        "tag_name": tag_ref.shorthand,
-                        "tagger_name": None,
-                        "tagger_time": -1,
-                    }
-            else:
-                tag_metadata = {
-                    "tag_name": None,
-                    "tagger_name": None,
-                    "tagger_time": -1,
-                }
-            tag_metadata["commit_author"] = author_name
-            tag_metadata["commit_time"] = commit.author.time
-            tag_metadata["is_merge"] = len(commit.parents) > 1
-            result.append(tag_metadata)
-
-        return result
+                    tagger_name, tagger_time = None, -1
+                tags.append(TagRecord(reference.shorthand, commit.id, commit.committer.time, tagger_name, tagger_time))
+            self._tags_references = tags
+        return self._tags_references
+
+    def _add_commit(self, commit: git.Commit):
+        author_id, _ = self.identities.resolve(commit.author)
+        self._commits_ids.append(commit.id)
+        self._parents_ids.append(commit.parent_ids)
+        self._commits_times.append(commit.committer.time)
+        self.records.append((author_id, commit.author.time, len(commit.parent_ids) > 1))
+
+    def consume(self, commit: git.Commit, is_first_parent: bool):
+        self._add_commit(commit)
+
+    def _walk_off_head_tags(self):
+        """
+        Adds commits of tags which are not on HEAD's history after HEAD's commits
+        """
+        scanned_ids = set(self._commits_ids)
+        tags_ids = list({tag.commit_id for tag in self._read_tags() if tag.commit_id not in scanned_ids})
+        if tags_ids:
+            since = self.scanner.window.since
+            walker = self.repo.walk(tags_ids[0], git.GIT_SORT_NONE)
+            for tag_id in tags_ids[1:]:
+                walker.push(tag_id)
+            walker.hide(self.repo.head.target)
+            for commit in walker:
+                if since is None or commit.committer.time >= since:
+                    self._add_commit(commit)
+
+    def _sort_topologically(self, indices: Dict[git.Oid, int]) -> List[int]:
+        """
+        :param indices: commit id -> index of walked commit
+        :return: indices of walked commits from descendants to ancestors, of commits not related to each other the
+        latest committed goes first, so that clock skew does not break the order
+        """
+        children_counts = [0] * len(self._commits_ids)
+        for parents_ids in self._parents_ids:
+            for parent_id in parents_ids:
+                j = indices.get(parent_id)
+                if j is not None:
+                    children_counts[j] += 1
+        pending = [(-self._commits_times[i], i) for i, count in enumerate(children_counts) if count == 0]
+        heapq.heapify(pending)
+        order = []
+        while pending:
+            _, i = heapq.heappop(pending)
+            order.append(i)
+            for parent_id in self._parents_ids[i]:
+                j = indices.get(parent_id)
+                if j is not None:
+                    children_counts[j] -= 1
+                    if children_counts[j] == 0:
+                        heapq.heappush(pending, (-self._commits_times[j], j))
+        return order
+
+    def _order_tags(self, indices: Dict[git.Oid, int], order: List[int]) -> List[TagRecord]:
+        """
+        :param indices: commit id -> index of walked commit
+        :param order: indices of walked commits from descendants to ancestors
+        :return: tags from ancestors to descendants, tags of commits which are not walked (i.e. older than history
+        window) go first in order of their commits' time
+        """
+        ranks = np.empty(len(order), dtype=np.int64)
+        ranks[order] = np.arange(len(order))
+
+        def tag_key(tag: TagRecord):
+            i = indices.get(tag.commit_id)
+            commit_key = (0, tag.commit_time) if i is None else (1, -ranks[i])
+            return commit_key, tag.tagger_time, _natural_key(tag.name)
+
+        return sorted(self._read_tags(), key=tag_key)
+
+    def _assign_releases(self, indices: Dict[git.Oid, int], order: List[int]) -> np.ndarray:
+        """
+        :param indices: commit id -> index of walked commit
+        :param order: indices of walked commits from descendants to ancestors
+        :return: index of every commit's tag in `tags` or -1 for unreleased commits
+        """
+        # bit k of commit's bitset is set if the commit is reachable from the k-th tag
+        bitsets = [0] * len(self._commits_ids)
+        for k, tag in enumerate(self._tags):
+            i = indices.get(tag.commit_id)
+            if i is not None:
+                bitsets[i] |= 1 << k
+        releases = np.full(len(self._commits_ids), -1, dtype=np.int64)
+        # commits are visited in topological order, so a commit's bitset is complete when it is visited
+        for i in order:
+            bitset = bitsets[i]
+            if bitset:
+                # the lowest bit is the first tag
+                releases[i] = (bitset & -bitset).bit_length() - 1
+                for parent_id in self._parents_ids[i]:
+                    j = indices.get(parent_id)
+                    if j is not None:
+                        bitsets[j] |= bitset
+                bitsets[i] = 0
+        return releases
+
+    def fetch(self):
+        """
+        :return: column name -> values of commits' records with their tags' metadata, unreleased commits go first,
+        then releases from the latest one
+        """
+        if self._records is None:
+            self.scanner.scan()
+            self._walk_off_head_tags()
+            indices = {commit_id: i for i, commit_id in enumerate(self._commits_ids)}
+            order = self._sort_topologically(indices)
+            self._tags = self._order_tags(indices, order)
+            releases = self._assign_releases(indices, order)
+            # unreleased commits get the last (empty) item of tags' columns
+            tags_names = np.array([tag.name for tag in self.tags] + [None], dtype=object)
+            taggers_names = np.array([tag.tagger_name for tag in self.tags] + [None], dtype=object)
+            taggers_times = np.array([tag.tagger_time for tag in self.tags] + [-1], dtype=np.int64)
+            order = np.argsort(-np.where(releases < 0, len(self.tags), releases), kind='stable')
+            releases = releases[order]
+            self._records = {
+                'tag_name': tags_names[releases],
+                'tagger_name': taggers_names[releases],
+                'tagger_time': taggers_times[releases],
+                'commit_author': np.array(self.identities.names.values, dtype=object)[
+                    self.records.column('commit_author')[order]],
+                'commit_time': self.records.column('commit_time')[order],
+                'is_merge': self.records.column('is_merge')[order],
+            }
+        return self._records
 
     def as_dataframe(self):
-        raw_data = pd.DataFrame(self.fetch())
-        # TODO: optimize memory by changing some datatypes
-        # .astype('bool')
-        return raw_data
+        return pd.DataFrame(self.fetch())
@@ -0,0 +1,240 @@
+"""
+History backend reading commits and their changes from the output of git command-line client
+"""
+import threading
+import subprocess
+import numpy as np
+import pygit2 as git
+
+from typing import Iterable, Iterator, List, Optional, Tuple
+from tqdm import tqdm
+
+from .gitdata import CommitRecord, CommitsScanner, DiffCostGuard, DiffStatsFetcher, HistoryBackend, HistoryWindow, \
+    estimate_diff_stats
+from .pathfilter import PathFilter
+from .rawcommit import parse_commit
+
+# commits are printed as "commit <hash>" line followed by commit object's headers as they are stored (i.e. not
+# re-encoded), so they are parsed as pygit2 does it, then the message (every line indented by 4 spaces) follows
+LOG_OPTIONS = ['--format=raw', '--encoding=none', '--no-decorate']
+LOG_RECORD_MARK = b'commit '
+MESSAGE_INDENT = b'    '
+
+# diffs are made independent of user's git configuration and equal to pygit2 ones (e.g. renames are not detected)
+DIFF_OPTIONS = ['--numstat', '--summary', '--no-renames', '--no-color', '--no-ext-diff', '--no-textconv',
+                '--diff-algorithm=myers']
+# changed files are listed with their modes and blob ids before and after commit, i.e. without diffing their content
+RAW_DIFF_OPTIONS = ['--raw', '--no-abbrev', '--no-renames']
+SUBMODULE_MODE = b'160000'
+
+
+def _git_command(repository: git.Repository, *args) -> List[str]:
+    return ['git', f'--git-dir={repository.path}', '-c', 'log.showRoot=true', '-c', 'log.showSignature=false',
+            *args]
+
+
+def stream_git_output(repository: git.Repository, command: List[str],
+                      input_lines: Iterable[bytes] = None) -> Iterator[bytes]:
+    """
+    Runs git command and yields lines of its output as soon as they are produced
+    :param repository: repository which git directory the command is run in (i.e. not depending on current one)
+    :param input_lines: lines written to command's standard input (in a separate thread, so that the command is
+    not blocked by its full output pipe)
+    """
+    process = subprocess.Popen(command, cwd=repository.path, stdout=subprocess.PIPE,
+                               stdin=subprocess.PIPE if input_lines is not None else subprocess.DEVNULL)
+    writer = None
+    if input_lines is not None:
+        def write_input():
+            with process.stdin:
+                process.stdin.writelines(input_lines)
+        writer = threading.Thread(target=write_input, daemon=True)
+        writer.start()
+    try:
+        yield from process.stdout
+    except GeneratorExit:
+        # the rest of output is not needed (e.g. commits walk has been stopped early), so the command is not waited for
+        process.kill()
+        raise
+    finally:
+        process.stdout.close()
+        if writer is not None:
+            writer.join()
+        return_code = process.wait()
+    if return_code != 0:
+        raise subprocess.CalledProcessError(return_code, command)
+
+
+def parse_stats_line(line: bytes, stats: np.ndarray):
+    """
+    Accumulates inserted lines, deleted lines and files count change given by a line of `--numstat --summary` output
+    """
+    if line.startswith(b' create mode '):
+        stats[2] += 1
+    elif line.startswith(b' delete mode '):
+        stats[2] -= 1
+    elif b'\t' in line:
+        insertions, deletions, _ = line.split(b'\t', 2)
+        # binary files have '-' instead of lines count
+        if insertions != b'-':
+            stats[0] += int(insertions)
+            stats[1] += int(deletions)
+
+
+def parse_raw_line(line: bytes) -> Tuple[bytes, Tuple[Optional[git.Oid], Optional[git.Oid]]]:
+    """
+    :param line: line of `--raw` output, i.e. ":<old mode> <new mode> <old blob id> <new blob id> <status>\t<path>"
+    :return: change status (e.g. b'A' for added file) and blob ids of changed file before and after commit,
+    a blob id is None if the file does not exist (or is a submodule)
+    """
+    old_mode, new_mode, old_id, new_id, status = line[1:].split(b'\t', 1)[0].split(b' ')
+    return status, tuple(git.Oid(hex=blob_id.decode()) if mode not in (b'000000', SUBMODULE_MODE) else None
+                         for mode, blob_id in ((old_mode, old_id), (new_mode, new_id)))
+
+
+def parse_log(lines: Iterable[bytes], with_stats: bool = True) -> Iterator[Tuple[CommitRecord, Optional[np.ndarray]]]:
+    """
+    Parses output of `git log` run with `LOG_OPTIONS` and, optionally, with `DIFF_OPTIONS`
+    :param with_stats: whether git was run with `DIFF_OPTIONS`
+    :return: commits and their stats (inserted lines, deleted lines, files count change), stats of merge commits are
+    None as git does not diff them, as well as stats of all commits if the log is read without stats
+    """
+    commit, stats = None, None
+    # headers of the commit being read
+    commit_id, header = None, None
+    for line in lines:
+        if header is not None and line != b'\n':
+            header.append(line)
+        elif header is not None:
+            # commit's headers end with an empty line
+            commit = parse_commit(commit_id, b''.join(header))
+            stats = np.zeros(3, dtype=np.int64) if with_stats and len(commit.parent_ids) <= 1 else None
+            header = None
+        elif line.startswith(LOG_RECORD_MARK):
+            if commit is not None:
+                yield commit, stats
+            commit_id, header = git.Oid(hex=line[len(LOG_RECORD_MARK):].strip().decode()), []
+        elif stats is not None and not line.startswith(MESSAGE_INDENT):
+            parse_stats_line(line, stats)
+    if commit is not None:
+        yield commit, stats
+
+
+class GitLogDiffStats(DiffStatsFetcher):
+    """
+    Keeps stats of commits diffed by `git log` during commits scan, the rest (e.g. merge commits diffed against their
+    first parent) is diffed by `git diff-tree` in a single process. Path filter is passed to git as pathspecs.
+    """
+
+    def _fetch_missing(self, diff_pairs) -> np.ndarray:
+        stats = np.zeros((4, len(diff_pairs)), dtype=np.int64)
+        diffed_indices = np.arange(len(diff_pairs))
+        if self.cost_guard.is_active:
+            # trees are compared first, commits exceeding the limits are estimated and the rest is diffed
+            is_estimated = self._estimate_exceeding(diff_pairs, stats)
+            diffed_indices = diffed_indices[~is_estimated]
+        for i, line in self._diff_tree([diff_pairs[i] for i in diffed_indices], DIFF_OPTIONS):
+            parse_stats_line(line, stats[:, diffed_indices[i]])
+        return stats
+
+    def _estimate_exceeding(self, diff_pairs, stats: np.ndarray) -> np.ndarray:
+        """
+        Fills stats of commits exceeding limits of cost guard
+        :return: flags of estimated commits
+        """
+        changed_files = [[] for _ in diff_pairs]
+        files_deltas = np.zeros(len(diff_pairs), dtype=np.int64)
+        for i, line in self._diff_tree(diff_pairs, RAW_DIFF_OPTIONS):
+            status, blob_ids = parse_raw_line(line)
+            changed_files[i].append(blob_ids)
+            files_deltas[i] += 1 if status == b'A' else -1 if status == b'D' else 0
+        for i, commit_changed_files in enumerate(changed_files):
+            if self.cost_guard.is_exceeded(self.repo, commit_changed_files):
+                insertions, deletions = estimate_diff_stats(self.repo, commit_changed_files)
+                stats[:, i] = insertions, deletions, files_deltas[i], 1
+        return stats[3].astype(bool)
+
+    def _diff_tree(self, diff_pairs, diff_options: List[str]) -> Iterator[Tuple[int, bytes]]:
+        """
+        :return: index of diffed pair and a line of its diff as `git diff-tree` prints it
+        """
+        # every line of diff-tree's input is "<commit> <parent>", a root commit is diffed with empty tree via --root
+        input_lines = [f"{commit_id} {parent_id}\n".encode() if parent_id is not None else f"{commit_id}\n".encode()
+                       for commit_id, parent_id in diff_pairs]
+        if not input_lines:
+            return
+        command = _git_command(self.repo, 'diff-tree', '--stdin', '-r', '--root', *diff_options)
+        if self.path_filter.is_active:
+            # commits which change excluded files only are not printed, i.e. they have zero stats
+            command += ['--', *self.path_filter.as_git_pathspecs()]
+        indices = {str(commit_id).encode(): i for i, (commit_id, _) in enumerate(diff_pairs)}
+        commit_index = None
+        with tqdm(total=len(diff_pairs), unit=" diffs") as progress_bar:
+            for line in stream_git_output(self.repo, command, input_lines):
+                # diff of every input line is preceded by commit's hash
+                commit_hash = line.rstrip(b'\n')
+                if commit_hash in indices:
+                    commit_index = indices[commit_hash]
+                    progress_bar.update(1)
+                elif commit_index is not None:
+                    yield commit_index, line
+
+
+class GitLogScanner(CommitsScanner):
+    """
+    Walks HEAD's history streaming `git log` output, commits are optionally diffed by git along the way
+    """
+
+    def __init__(self, repository: git.Repository, diff_stats: GitLogDiffStats, prefetch_diffs: bool = True,
+                 window: HistoryWindow = None):
+        """
+        :param diff_stats: storage of stats of commits diffed during the scan
+        :param prefetch_diffs: whether commits are diffed during the scan, otherwise only commits' metadata is read
+        :param window: part of history to scan, git is stopped as soon as the whole window is read
+        """
+        super().__init__(repository, window)
+        self.diff_stats = diff_stats
+        self.prefetch_diffs = prefetch_diffs
+
+    @property
+    def commits_walker(self):
+        # pathspecs given to `git log` would limit commits to the ones changing included files, so filtered changes
+        # are diffed by `git diff-tree` afterwards, as well as commits which may exceed limits of cost guard
+        prefetch_diffs = self.prefetch_diffs and not self.diff_stats.path_filter.is_active \
+            and not self.diff_stats.cost_guard.is_active
+        diff_options = DIFF_OPTIONS if prefetch_diffs else []
+        if self.ordered_ids is None:
+            command = _git_command(self.repo, 'log', '--topo-order', *LOG_OPTIONS, *diff_options,
+                                   str(self.repo.head.target))
+            revisions = None
+        else:
+            # commits of the window are printed in the given order, they are given via standard input as there may
+            # be too many of them for a command line
+            command = _git_command(self.repo, 'log', '--no-walk=unsorted', '--stdin', *LOG_OPTIONS, *diff_options)
+            revisions = [f'{commit_id}\n'.encode() for commit_id in self.ordered_ids]
+            if not revisions:
+                return
+        for commit, stats in parse_log(stream_git_output(self.repo, command, revisions), prefetch_diffs):
+            if stats is not None:
+                self.diff_stats.memoize(commit.id, stats)
+            yield commit
+
+
+class GitLogHistoryBackend(HistoryBackend):
+    """
+    Commits are walked and diffed by git command-line client (which may benefit from commit-graph file)
+    """
+    name = 'git'
+
+    def __init__(self, repository: git.Repository, jobs: int = 1, prefetch_diffs: bool = True,
+                 window: HistoryWindow = None, path_filter: PathFilter = None, cost_guard: DiffCostGuard = None):
+        """
+        :param jobs: not used, git diffs commits in a single process
+        :param prefetch_diffs: whether all commits are diffed during the walk, it is faster than diffing them
+        afterwards, but useless if commits' changes are not going to be fetched
+        :param window: part of history to scan, the whole history by default
+        :param path_filter: filter of files to diff, all files are diffed by default
+        :param cost_guard: limits of commit's changes to diff, all commits are diffed by default
+        """
+        diff_stats = GitLogDiffStats(repository, path_filter=path_filter, cost_guard=cost_guard)
+        super().__init__(GitLogScanner(repository, diff_stats, prefetch_diffs, window), diff_stats)
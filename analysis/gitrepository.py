@@ -4,24 +4,112 @@ import warnings
 from datetime import datetime
 import os
 import pytz
+from typing import List
 
 from tools import split_email_address
+from .cache import BlameCache, BlobsCache, HistoryCache
+from .gitdata import AuthorIdentities, DiffCostGuard, HistoryWindow, Pygit2HistoryBackend, find_blame_boundary, \
+    get_blame_window_start, get_diff_stats
+from .gitlog import GitLogHistoryBackend
+from .pathfilter import PathFilter
 from .gitdata import WholeHistory as GitWholeHistory
 from .gitdata import LinearHistory as GitLinearHistory
+from .gitdata import TagsData
 from .gitrevision import GitRevision
+from .ownership import OwnershipHistory
+from .survival import LineSurvival
 from .gitauthors import GitAuthors
 from .gittags import GitTags
 
 
+# name -> class of backend providing history data
+history_backends = {backend.name: backend for backend in (Pygit2HistoryBackend, GitLogHistoryBackend)}
+
+
 class GitRepository:
-    def __init__(self, path: str):
+    def __init__(self, path: str, cache_dir: str = None, jobs: int = 1,
+                 whole_history_columns: List[str] = None, linear_history_columns: List[str] = None,
+                 backend: str = Pygit2HistoryBackend.name, history_window: HistoryWindow = None,
+                 include: List[str] = None, exclude: List[str] = None, exclude_generated: bool = False,
+                 max_diff_files: int = None, max_diff_bytes: int = None, blame_timeout: float = None,
+                 blame_window_months: int = None, blame_sample_size: int = None, blame_sample_seed: int = 0,
+                 blame_engine: str = 'blame'):
         """
         :param path: path to a repository
+        :param cache_dir: directory to persist history data between runs, no caching if not given
+        :param jobs: number of processes to calculate commits' changes and to blame files in
+        :param whole_history_columns: columns of whole history data to fetch, all columns by default
+        :param linear_history_columns: columns of linear history data to fetch, all columns by default
+        :param backend: name of history backend (see `history_backends`)
+        :param history_window: part of history to analyse, the whole history by default
+        :param include: pathspecs of files to analyse, all files by default
+        :param exclude: pathspecs of files not to analyse
+        :param exclude_generated: whether files marked as generated or vendored in '.gitattributes' are not analysed
+        :param max_diff_files: changes of commits changing more files are estimated instead of diffed
+        :param max_diff_bytes: changes of commits which changed files' versions are larger in total are estimated
+        instead of diffed
+        :param blame_timeout: maximal time (in seconds) to blame a file, files exceeding it are not blamed
+        :param blame_window_months: lines are blamed within this number of months before current one only (older
+        lines are attributed in bulk), the whole history is blamed if None
+        :param blame_sample_size: number of files to blame, blame metrics are estimated from them, all files are
+        blamed if None
+        :param blame_sample_seed: seed of blamed files' sampling
+        :param blame_engine: how lines of HEAD are attributed to authors: 'blame' blames files, 'survival' replays
+        changes of HEAD's first-parent chain (see `LineSurvival`) along with history scan
+        :raises ValueError: if history window contains no commits
         """
         self.repo = git.Repository(path)
         self.branch = self.repo.head.shorthand
-        self.whole_history_df = GitWholeHistory(self.repo).as_dataframe()
-        self.linear_history_df = GitLinearHistory(self.repo).as_dataframe()
+        # excluded files are neither diffed in history nor blamed or counted in HEAD's snapshot
+        self.path_filter = PathFilter(self.repo, include, exclude, exclude_generated)
+        # giant commits (e.g. vendor imports) are not diffed, so that runtime does not depend on them
+        self.diff_cost_guard = DiffCostGuard(max_diff_files, max_diff_bytes)
+        history_cache = HistoryCache(cache_dir, self.repo, self.path_filter, self.diff_cost_guard.options) \
+            if cache_dir else None
+        # backend may diff commits along the walk if any of commits' changes are going to be fetched
+        is_diffed = any(columns is None or set(columns) & set(history_class.diffed_columns)
+                        for history_class, columns in [(GitWholeHistory, whole_history_columns),
+                                                       (GitLinearHistory, linear_history_columns)])
+        self.history_window = history_window if history_window is not None else HistoryWindow()
+        history_backend = history_backends[backend](self.repo, jobs=jobs, prefetch_diffs=is_diffed,
+                                                    window=self.history_window, path_filter=self.path_filter,
+                                                    cost_guard=self.diff_cost_guard)
+        diff_stats = history_backend.diff_stats
+        # authors have the same ids in history, blame and tags data
+        self._identities = AuthorIdentities(self.repo)
+        # all history consumers are fed during a single walk over commits
+        history_scanner = history_backend.scanner
+        whole_history = GitWholeHistory(self.repo, scanner=history_scanner, cache=history_cache,
+                                        diff_stats=diff_stats, identities=self._identities)
+        linear_history = GitLinearHistory(self.repo, scanner=history_scanner, cache=history_cache,
+                                          diff_stats=diff_stats, identities=self._identities)
+        self._tags_data = TagsData(self.repo, scanner=history_scanner, identities=self._identities)
+        self.line_survival = None
+        if blame_engine == 'survival':
+            if self.history_window.until is None:
+                self.line_survival = LineSurvival(self.repo, scanner=history_scanner, identities=self._identities,
+                                                  path_filter=self.path_filter, cost_guard=self.diff_cost_guard)
+            else:
+                warnings.warn("History replay does not reach HEAD as history window is bounded by time, "
+                              "files are blamed instead")
+        self.whole_history_df = whole_history.as_dataframe(whole_history_columns)
+        self.linear_history_df = linear_history.as_dataframe(linear_history_columns)
+        if history_cache is not None:
+            # records of commits outside the window are kept for runs analysing other parts of history
+            history_cache.save(prune=not self.history_window.is_bounded)
+        if self.whole_history_df.empty:
+            # HEAD's history is never empty, so only a bounded window may contain no commits
+            raise ValueError("No commits of HEAD's history are within the history window")
+        self._history_base_commit_id = history_scanner.base_commit_id
+        # blamed commits are resolved to their authors via whole history records
+        self._whole_history = whole_history
+        self._cache_dir = cache_dir
+        self._jobs = jobs
+        self._blame_timeout = blame_timeout
+        self.blame_window_months = blame_window_months
+        self._blame_sample_size = blame_sample_size
+        self._blame_sample_seed = blame_sample_seed
+        self._history_base_lines_count = None
         self._head_revision = None
         self._tags = None
         self._name = None
@@ -40,15 +128,42 @@ class GitRepository:
     @property
     def head(self):
         if not self._head_revision:
-            self._head_revision = GitRevision(self.repo, 'HEAD')
+            oldest_blamed_commit_id = None
+            if self.blame_window_months is not None:
+                oldest_blamed_commit_id = find_blame_boundary(self.repo, self.repo.head.peel(),
+                                                              get_blame_window_start(self.blame_window_months))
+            blobs_cache = BlobsCache(self._cache_dir, self.repo) if self._cache_dir else None
+            blame_cache = BlameCache(self._cache_dir, self.repo, oldest_blamed_commit_id) if self._cache_dir else None
+            self._head_revision = GitRevision(self.repo, 'HEAD', identities=self._identities,
+                                              path_filter=self.path_filter, blobs_cache=blobs_cache,
+                                              blame_cache=blame_cache, jobs=self._jobs,
+                                              blame_timeout=self._blame_timeout,
+                                              oldest_blamed_commit_id=oldest_blamed_commit_id,
+                                              blame_sample_size=self._blame_sample_size,
+                                              blame_sample_seed=self._blame_sample_seed,
+                                              history=self._whole_history, line_survival=self.line_survival,
+                                              blame_window_months=self.blame_window_months)
+            if blobs_cache is not None:
+                blobs_cache.save()
         return self._head_revision
 
     @property
     def tags(self):
         if not self._tags:
-            self._tags = GitTags(self.repo)
+            self._tags = GitTags(self.repo, self._tags_data)
         return self._tags
 
+    def get_tags_ownership(self, max_tags_count: int) -> pd.DataFrame:
+        """
+        :param max_tags_count: number of the latest tags (in topological order, see `TagsData.tags`) to blame
+        :return: lines count of every tag by author and age of lines (see `OwnershipHistory`), tags from the earliest
+        one
+        """
+        tags_names = [tag.name for tag in self._tags_data.tags[-max_tags_count:]]
+        blobs_cache = BlobsCache(self._cache_dir, self.repo) if self._cache_dir else None
+        return OwnershipHistory(self.repo, tags_names, history=self._whole_history, path_filter=self.path_filter,
+                                blobs_cache=blobs_cache, jobs=self._jobs, timeout=self._blame_timeout).as_dataframe()
+
     @property
     def total_commits_count(self):
         return self.whole_history_df.shape[0]
@@ -65,9 +180,31 @@ class GitRepository:
     def total_lines_removed(self):
         return self.linear_history_df['deletions'].sum()
 
+    @property
+    def history_base_lines_count(self):
+        """
+        :return: lines count of the tree analysed history starts from, i.e. 0 unless older history is out of the window
+        """
+        if self._history_base_lines_count is None:
+            self._history_base_lines_count = 0
+            if self._history_base_commit_id is not None:
+                # the tree is diffed against an empty one, so all its lines are insertions (which are counted exactly
+                # by cost guard's estimate as well)
+                self._history_base_lines_count, _, _, _ = get_diff_stats(self.repo, self._history_base_commit_id,
+                                                                         path_filter=self.path_filter,
+                                                                         cost_guard=self.diff_cost_guard)
+        return self._history_base_lines_count
+
+    @property
+    def estimated_commits_count(self):
+        """
+        :return: number of commits which changes are estimated as they exceed limits of diff cost guard
+        """
+        return self.whole_history_df['is_diff_estimated'].sum()
+
     @property
     def total_lines_count(self):
-        return self.total_lines_added - self.total_lines_removed
+        return self.history_base_lines_count + self.total_lines_added - self.total_lines_removed
 
     @property
     def first_commit_timestamp(self):
@@ -182,7 +319,7 @@ class GitRepository:
         """
         df = pd.DataFrame({'author_name': self.whole_history_df['author_name'],
                            'timestamp': pd.to_datetime(self.whole_history_df['author_timestamp'], unit='s')})
-        ts_agg = df.groupby([df.timestamp.dt.year, df.author_name]).size()
+        ts_agg = df.groupby([df.timestamp.dt.year, df.author_name], observed=True).size()
         # https://stackoverflow.com/questions/27842613/pandas-groupby-sort-within-groups
         # group by the first level of the index
         ts_agg = ts_agg.groupby(level=0, group_keys=False)
@@ -207,7 +344,7 @@ class GitRepository:
                           .dt.strftime('%Y-%m')})
 
         # https://stackoverflow.com/questions/27842613/pandas-groupby-sort-within-groups
-        ts_agg = df.groupby([df.timestamp, df.author_name]).size()
+        ts_agg = df.groupby([df.timestamp, df.author_name], observed=True).size()
         ts_agg = ts_agg.groupby(level=0, group_keys=False)
 
         # sort each group by value
@@ -263,5 +400,5 @@ class GitRepository:
         wh_grouped = df[['files_count', 'insertions', 'deletions']].groupby(pd.Grouper(freq=sampling))
         result = wh_grouped[['insertions', 'deletions']].sum().cumsum()
         result['files_count'] = wh_grouped['files_count'].mean().fillna(method='ffill')
-        result['lines_count'] = result['insertions'] - result['deletions']
+        result['lines_count'] = self.history_base_lines_count + result['insertions'] - result['deletions']
         return result
@@ -1,26 +1,200 @@
+import numpy as np
 import pygit2 as git
 import pandas as pd
 
 from tools import get_file_extension
-from .gitdata import BlameData, FilesData
+from .cache import BlameCache, BlobsCache
+from .directories import get_directories_ownership
+from .gitdata import AuthorIdentities, BlameData, FilesData, RevisionSnapshot, WholeHistory
+from .pathfilter import PathFilter
+from .survival import LineSurvival
+
+
+class BlameTimeIndex:
+    """
+    Blame records sorted by lines' timestamp with cumulative lines counts, overall and per author, so that lines
+    count of any period is found by a binary search instead of a scan over records
+    """
+
+    def __init__(self, timestamps: np.ndarray, authors: pd.Categorical, lines_count: np.ndarray):
+        """
+        :param timestamps: timestamps of blame records' lines
+        :param authors: authors of blame records, records without author are counted in overall lines only
+        :param lines_count: (possibly weighted) lines count of blame records
+        """
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        # integer lines count stays integer, weighted one is float
+        lines_count = np.asarray(lines_count)
+        order = np.argsort(timestamps, kind='stable')
+        self.timestamps = timestamps[order]
+        self.cumulative_lines_count = np.concatenate([[0], np.cumsum(lines_count[order])])
+
+        self.authors = authors.categories
+        codes = np.asarray(authors.codes, dtype=np.int64)
+        by_author = np.lexsort((timestamps, codes))
+        by_author = by_author[codes[by_author] >= 0]
+        self.authors_codes = codes[by_author]
+        self.authors_cumulative_lines_count = np.concatenate([[0], np.cumsum(lines_count[by_author])])
+        # records are searched by (author, timestamp) key, timestamps are shifted to [0, span)
+        self._min_timestamp = self.timestamps[0] if len(self.timestamps) else 0
+        self._span = (self.timestamps[-1] - self._min_timestamp + 2) if len(self.timestamps) else 1
+        self._authors_keys = self.authors_codes * self._span + (timestamps[by_author] - self._min_timestamp)
+        self._authors_ends = np.searchsorted(self.authors_codes, np.arange(len(self.authors)), side='right')
+
+    @property
+    def lines_count(self) -> float:
+        return self.cumulative_lines_count[-1]
+
+    def get_lines_count_before(self, timestamp: float) -> float:
+        """
+        :return: count of lines older than the timestamp
+        """
+        return self.cumulative_lines_count[np.searchsorted(self.timestamps, timestamp, side='left')]
+
+    def get_authors_lines_count_since(self, timestamp: float) -> pd.Series:
+        """
+        :return: count of lines not older than the timestamp by author (only authors having such lines)
+        """
+        shifted_timestamp = np.clip(np.ceil(timestamp - self._min_timestamp), 0, self._span - 1)
+        starts = np.searchsorted(self._authors_keys, np.arange(len(self.authors)) * self._span + shifted_timestamp,
+                                 side='left')
+        lines_count = self.authors_cumulative_lines_count[self._authors_ends] - \
+            self.authors_cumulative_lines_count[starts]
+        has_lines = self._authors_ends > starts
+        index = pd.CategoricalIndex(pd.Categorical.from_codes(np.flatnonzero(has_lines), categories=self.authors),
+                                    name='committer_name')
+        return pd.Series(lines_count[has_lines], index=index, name='lines_count')
 
 
 class GitRevision:
 
-    def __init__(self, repository: git.Repository, revision: str = 'HEAD'):
-        self.blame_data = BlameData(repository, revision)
-        self.files_data = FilesData(repository, revision).as_dataframe()
+    def __init__(self, repository: git.Repository, revision: str = 'HEAD', identities: AuthorIdentities = None,
+                 path_filter: PathFilter = None, blobs_cache: BlobsCache = None, blame_cache: BlameCache = None,
+                 jobs: int = 1, blame_timeout: float = None, oldest_blamed_commit_id: git.Oid = None,
+                 blame_sample_size: int = None, blame_sample_seed: int = 0, history: WholeHistory = None,
+                 line_survival: LineSurvival = None, blame_window_months: int = None):
+        """
+        :param identities: authors' ids shared with history data of the repository
+        :param path_filter: filter of files to analyse, all files by default
+        :param blobs_cache: persistent storage of files' lines counts computed in previous runs
+        :param blame_cache: persistent storage of files' blame computed in previous runs, it is saved once blame data
+        is loaded
+        :param jobs: number of processes to blame files in
+        :param blame_timeout: maximal time (in seconds) to blame a file, files exceeding it are not blamed
+        :param oldest_blamed_commit_id: the commit blame stops at (see `find_blame_boundary`), i.e. older lines have
+        no committer: knowledge metrics are exact for knowledge loss periods within the blamed window, authors'
+        contribution and files' contributors cover the window only; the whole history is blamed if None
+        :param blame_sample_size: number of text files to blame, lines-based blame metrics are extrapolated from them
+        to all files (see `BlameSample`); all files are blamed if None
+        :param blame_sample_seed: seed of blamed files' sampling
+        :param history: history data of the repository blamed commits' authors are taken from
+        :param line_survival: replay of HEAD's history lines are attributed by instead of blame (blame parameters are
+        not used if it is given)
+        :param blame_window_months: number of months the oldest blamed commit is found for (see
+        `get_blame_window_start`), knowledge metrics of longer periods are not available
+        """
+        # files statistics and blame use the same scan of revision's tree
+        snapshot = RevisionSnapshot(repository, revision, path_filter, blobs_cache)
+        if line_survival is not None:
+            self.blame_data = line_survival
+        else:
+            self.blame_data = BlameData(repository, identities=identities, snapshot=snapshot, cache=blame_cache,
+                                        jobs=jobs, timeout=blame_timeout, oldest_commit_id=oldest_blamed_commit_id,
+                                        sample_size=blame_sample_size, sample_seed=blame_sample_seed,
+                                        history=history)
+        self.files_data = FilesData(repository, snapshot=snapshot).as_dataframe()
+        self._blame_sample = None
+        # index of blamed file in the sample for every blame record
+        self._sample_indices = None
+        self._time_index = None
+        self.blame_window_months = blame_window_months if line_survival is None else None
 
     def _lazy_load_blame_data(self):
         # replaces class with raw DataFrame this class supposes to fetch
-        if isinstance(self.blame_data, BlameData):
+        if isinstance(self.blame_data, LineSurvival):
             self.blame_data = self.blame_data.as_dataframe()
+        elif isinstance(self.blame_data, BlameData):
+            blame_cache = self.blame_data.cache
+            blame_data = self.blame_data.as_dataframe()
+            self._blame_sample = self.blame_data.sample
+            self.blame_data = blame_data
+            if self._blame_sample is not None:
+                self._sample_indices = pd.Index(self._blame_sample.paths).get_indexer(self.blame_data['filepath'])
+            if blame_cache is not None:
+                blame_cache.save()
+
+    @property
+    def blame_sample(self):
+        """
+        :return: sample of blamed files or None if all files are blamed
+        """
+        self._lazy_load_blame_data()
+        return self._blame_sample
+
+    def _blamed_lines(self, weights: np.ndarray = None) -> pd.Series:
+        """
+        :param weights: weights of sampled files (see `BlameSample.weights`), the sample's own weights by default
+        :return: lines count of blame records, extrapolated to all files if only a sample of files is blamed
+        """
+        lines_count = self.blame_data['lines_count']
+        if self._blame_sample is None:
+            return lines_count
+        if weights is None:
+            weights = self._blame_sample.weights()
+        return lines_count * weights[self._sample_indices]
+
+    def fits_blame_window(self, knowledge_loss_period_month: int) -> bool:
+        """
+        :return: whether lines of the whole period are blamed, i.e. knowledge metrics of the period are exact
+        """
+        return self.blame_window_months is None or knowledge_loss_period_month <= self.blame_window_months
+
+    @staticmethod
+    def _period_start(knowledge_loss_period_month: int) -> float:
+        return (pd.Timestamp.utcnow() - pd.DateOffset(months=knowledge_loss_period_month)).timestamp()
+
+    def _knowing(self, knowledge_loss_period_month: int) -> pd.Series:
+        return self.blame_data['timestamp'] >= self._period_start(knowledge_loss_period_month)
+
+    @property
+    def time_index(self) -> BlameTimeIndex:
+        """
+        :return: blame records sorted by time, built once and shared by knowledge metrics of all periods
+        """
+        if self._time_index is None:
+            self._lazy_load_blame_data()
+            self._time_index = BlameTimeIndex(self.blame_data['timestamp'].values,
+                                              self.blame_data['committer_name'].values,
+                                              self._blamed_lines().values)
+        return self._time_index
+
+    def _contribution(self, lines_count: pd.Series) -> pd.Series:
+        return lines_count.groupby(self.blame_data['committer_name'], observed=True).sum()
+
+    def _knowledge_carriers(self, lines_count: pd.Series, knowing: pd.Series) -> pd.Series:
+        # `committer_name` is categorical with all authors of the repository as categories,
+        # so only authors present in recent blame data are grouped
+        return lines_count[knowing].groupby(self.blame_data['committer_name'][knowing], observed=True).sum()
+
+    @staticmethod
+    def _lost_knowledge_ratio(lines_count: pd.Series, knowing: pd.Series) -> float:
+        return lines_count[~knowing].astype('float').sum() / lines_count.sum()
 
     @property
     def authors_contribution(self):
         self._lazy_load_blame_data()
-        return self.blame_data[["committer_name", "lines_count"]]\
-            .groupby(by="committer_name")["lines_count"].sum()
+        contribution = self._contribution(self._blamed_lines())
+        return contribution.round().astype(int) if self._blame_sample is not None else contribution
+
+    def get_authors_contribution_confidence_intervals(self, level: float = 0.95):
+        """
+        :return: 'low' and 'high' bounds of authors' contribution estimated from the sample of blamed files,
+        None if all files are blamed
+        """
+        if self.blame_sample is None:
+            return None
+        return self._blame_sample.confidence_interval(
+            lambda weights: self._contribution(self._blamed_lines(weights)), level)
 
     def get_top_files_by_contributors_count(self, top_size=10):
         self._lazy_load_blame_data()
@@ -34,22 +208,44 @@ class GitRevision:
             .committer_name.nunique()
         return committer_per_file[committer_per_file == 1]
 
+    def get_directories_ownership(self, max_depth: int = None) -> pd.DataFrame:
+        """
+        :param max_depth: depth of the deepest directories (the root has depth 0), all directories by default
+        :return: ownership of every directory's subtree (see `directories.get_directories_ownership`), lines count is
+        estimated if only a sample of files is blamed
+        """
+        self._lazy_load_blame_data()
+        res = get_directories_ownership(self.blame_data['filepath'].values, self.blame_data['committer_name'].values,
+                                        self._blamed_lines().values, max_depth)
+        res['lines_count'] = res['lines_count'].round().astype(int)
+        return res
+
     def get_lost_knowledge_percentage(self, knowledge_loss_period_month=6):
         """
         Metrics is introduced in:
         https://www.feststelltaste.de/identifying-lost-knowledge-in-the-linux-kernel-source-code/
 
         :param knowledge_loss_period_month: months count after which code knowledge is considered to be "lost"
-        :return: the ratio of known code to unknown code (= code older than `knowledge_loss_period_month` months)
+        :return: the ratio of known code to unknown code (= code older than `knowledge_loss_period_month` months),
+        None if the period is longer than the blamed window
         """
-        self._lazy_load_blame_data()
-        months_ago = pd.Timestamp.utcnow() - pd.DateOffset(months=knowledge_loss_period_month)
-        df = self.blame_data[["lines_count", "timestamp"]].copy()
-        df.timestamp = pd.to_datetime(df.timestamp, unit='s', utc=True)
-        df['knowing'] = df.timestamp >= months_ago
-        total_lines_count = df.lines_count.sum()
-        forgotten_lines_count = df[~df.knowing].lines_count.astype('float').sum()
-        return forgotten_lines_count / total_lines_count
+        if not self.fits_blame_window(knowledge_loss_period_month):
+            return None
+        time_index = self.time_index
+        return time_index.get_lines_count_before(self._period_start(knowledge_loss_period_month)) / \
+            time_index.lines_count
+
+    def get_lost_knowledge_confidence_interval(self, knowledge_loss_period_month=6, level: float = 0.95):
+        """
+        :return: lower and upper bounds of "lost knowledge" ratio estimated from the sample of blamed files,
+        None if all files are blamed or the period is longer than the blamed window
+        """
+        if self.blame_sample is None or not self.fits_blame_window(knowledge_loss_period_month):
+            return None
+        knowing = self._knowing(knowledge_loss_period_month)
+        interval = self._blame_sample.confidence_interval(
+            lambda weights: pd.Series([self._lost_knowledge_ratio(self._blamed_lines(weights), knowing)]), level)
+        return interval['low'][0], interval['high'][0]
 
     def get_top_knowledge_carriers(self, knowledge_loss_period_month=6):
         """
@@ -57,21 +253,22 @@ class GitRevision:
         https://www.feststelltaste.de/identifying-lost-knowledge-in-the-linux-kernel-source-code/
 
         :param knowledge_loss_period_month: months count after which code knowledge is considered to be "lost"
-        :return: dataframe of contributors with lines count contributed in last `knowledge_loss_period_month`
+        :return: dataframe of contributors with lines count contributed in last `knowledge_loss_period_month`,
+        if only a sample of files is blamed, lines count is estimated and 'low' and 'high' columns give its confidence
+        interval; None if the period is longer than the blamed window
         """
-        self._lazy_load_blame_data()
-        months_ago = pd.Timestamp.utcnow() - pd.DateOffset(months=knowledge_loss_period_month)
-        df = self.blame_data[["lines_count", "timestamp", 'committer_name']].copy()
-        df.timestamp = pd.to_datetime(df.timestamp, unit='s', utc=True)
-        df['knowing'] = df.timestamp >= months_ago
-
-        res = df[df.knowing].groupby("committer_name").agg({"lines_count": 'sum'}).reset_index()
-
-        # this step is needed because `committer_name` is categorical and all authors appear to be present
-        # in grouped dataframe with zero contribution
-        recent_contributors = df[df.knowing].committer_name.unique()
-        res = res[res.committer_name.isin(recent_contributors)].sort_values(by="lines_count", ascending=False)\
-            .reset_index(drop=True)
+        if not self.fits_blame_window(knowledge_loss_period_month):
+            return None
+        res = self.time_index.get_authors_lines_count_since(self._period_start(knowledge_loss_period_month))\
+            .reset_index()
+        if self._blame_sample is not None:
+            knowing = self._knowing(knowledge_loss_period_month)
+            interval = self._blame_sample.confidence_interval(
+                lambda weights: self._knowledge_carriers(self._blamed_lines(weights), knowing))
+            res = res.merge(interval, left_on='committer_name', right_index=True, how='left')
+            res[['low', 'high']] = res[['low', 'high']].fillna(0).round().astype(int)
+            res['lines_count'] = res['lines_count'].round().astype(int)
+        res = res.sort_values(by="lines_count", ascending=False).reset_index(drop=True)
 
         return res
 
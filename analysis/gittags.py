@@ -64,8 +64,12 @@ class GitTag:
 
 class GitTags:
 
-    def __init__(self, repo: git.Repository):
-        self.tags_data = TagsData(repo).as_dataframe()
+    def __init__(self, repo: git.Repository, tags_data: TagsData = None):
+        """
+        :param tags_data: tags data fetcher (e.g. subscribed to a shared commits scanner), created if not given
+        """
+        tags_data = tags_data if tags_data is not None else TagsData(repo)
+        self.tags_data = tags_data.as_dataframe()
 
     def filter(self, regexp: str) -> List[GitTag]:
         pass
@@ -0,0 +1,130 @@
+"""
+Code ownership and age of code at a series of revisions (e.g. releases)
+"""
+import numpy as np
+import pandas as pd
+import pygit2 as git
+
+from typing import Iterable, List
+
+from tools.timeit import Timeit
+from .cache import BlobsCache, get_changed_paths
+from .gitdata import AuthorIdentities, BlameData, RevisionSnapshot, WholeHistory
+from .pathfilter import PathFilter
+
+# upper bounds (in days) and labels of lines' age buckets, the last bucket is unbounded
+AGE_BUCKETS = [
+    (30, '< 1 month'),
+    (182, '1-6 months'),
+    (365, '6-12 months'),
+    (730, '1-2 years'),
+    (None, '> 2 years'),
+]
+
+
+class RevisionsBlameCache:
+    """
+    Blame of files of the previously blamed revision, reused for files which have not been changed by any commit
+    between the revisions (the same blob at the same path may have a different history, e.g. a change may have been
+    reverted). It has the interface of `cache.BlameCache`, but keeps files of a single revision in memory.
+    """
+
+    def __init__(self):
+        self.hits_count = 0
+        self.misses_count = 0
+        self._previous_records = {}
+        self._records = {}
+
+    def get(self, path: str, blob_id: git.Oid):
+        record = self._previous_records.get((path, blob_id.raw))
+        if record is None:
+            self.misses_count += 1
+        else:
+            self.hits_count += 1
+            self._records[(path, blob_id.raw)] = record
+        return record
+
+    def put(self, path: str, blob_id: git.Oid, record):
+        self._records[(path, blob_id.raw)] = record
+
+    def next_revision(self, changed_paths: Iterable[str]):
+        """
+        Makes blame of the just blamed revision the one to be reused
+        :param changed_paths: paths of files changed by commits between the just blamed revision and the next one
+        """
+        changed_paths = set(changed_paths)
+        self._previous_records = {key: record for key, record in self._records.items() if key[0] not in changed_paths}
+        self._records = {}
+
+
+class OwnershipHistory:
+    """
+    Blames files at every given revision. Files which have not changed since the previous revision are not blamed
+    again, so revisions are better given in order of history (e.g. from the oldest release to the latest one).
+    """
+
+    def __init__(self, repository: git.Repository, revisions: List[str], identities: AuthorIdentities = None,
+                 history: WholeHistory = None, path_filter: PathFilter = None, blobs_cache: BlobsCache = None,
+                 jobs: int = 1, timeout: float = None):
+        """
+        :param revisions: revisions (e.g. tags' names) to blame files at
+        :param identities: authors' ids shared with other data fetchers, history's ones if history is given
+        :param history: history of the repository blamed commits' authors and timestamps are taken from
+        :param path_filter: filter of files to blame, all files are blamed by default
+        :param blobs_cache: storage of files' records (e.g. of previous runs), it is not saved
+        :param jobs: number of worker processes to blame files in
+        :param timeout: maximal time (in seconds) to blame a file, files exceeding it are not blamed
+        """
+        self.repo = repository
+        self.revisions = revisions
+        self.history = history
+        if identities is None:
+            identities = history.identities if history is not None else AuthorIdentities(self.repo)
+        self.identities = identities
+        self.path_filter = path_filter
+        self.blobs_cache = blobs_cache
+        self.jobs = jobs
+        self.timeout = timeout
+        self.blame_cache = RevisionsBlameCache()
+
+    @staticmethod
+    def _age_bucket(age_seconds: np.ndarray) -> pd.Categorical:
+        bins = [-np.inf] + [days * 24 * 3600 if days is not None else np.inf for days, _ in AGE_BUCKETS]
+        return pd.cut(age_seconds, bins, right=False, labels=[label for _, label in AGE_BUCKETS])
+
+    @Timeit("Blaming revisions")
+    def fetch(self) -> List[pd.DataFrame]:
+        """
+        :return: lines count of every revision by author and age bucket of lines
+        """
+        revisions_ownership = []
+        previous_commit_sha = None
+        for revision in self.revisions:
+            snapshot = RevisionSnapshot(self.repo, revision, self.path_filter, self.blobs_cache)
+            commit_sha = str(snapshot.revision_commit.id)
+            if previous_commit_sha is not None:
+                # revisions are not necessarily on the same branch, so commits of both sides are taken into account
+                self.blame_cache.next_revision(get_changed_paths(self.repo, previous_commit_sha, commit_sha) |
+                                               get_changed_paths(self.repo, commit_sha, previous_commit_sha))
+            blame_df = BlameData(self.repo, identities=self.identities, snapshot=snapshot, cache=self.blame_cache,
+                                 jobs=self.jobs, timeout=self.timeout, history=self.history).as_dataframe()
+            previous_commit_sha = commit_sha
+            # lines' age is counted at revision's commit
+            age = snapshot.revision_commit.committer.time - blame_df['timestamp'].values
+            ownership = blame_df['lines_count'].groupby([blame_df['committer_name'], self._age_bucket(age)],
+                                                        observed=True).sum()
+            revisions_ownership.append(ownership.rename_axis(['author_name', 'age']).reset_index()
+                                       .assign(revision=revision))
+        return revisions_ownership
+
+    def as_dataframe(self) -> pd.DataFrame:
+        """
+        :return: tidy table of lines count by revision, author and age bucket of lines
+        """
+        revisions_ownership = self.fetch()
+        columns = ['revision', 'author_name', 'age', 'lines_count']
+        if not revisions_ownership:
+            return pd.DataFrame(columns=columns)
+        df = pd.concat(revisions_ownership, ignore_index=True)[columns]
+        df['revision'] = pd.Categorical(df['revision'], categories=self.revisions, ordered=True)
+        return df
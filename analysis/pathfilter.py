@@ -0,0 +1,112 @@
+"""
+Repository-wide filter of analysed files: excluded files are never diffed, blamed or line-counted
+"""
+import os
+import hashlib
+import fnmatch
+import pygit2 as git
+
+from typing import Iterable, List
+
+
+def matches_pathspec(pattern: str, path: str) -> bool:
+    """
+    Matches path as git matches it against a pathspec without magic: the pattern is either a leading directory
+    (or the path itself) or a shell wildcard pattern, which wildcards match slashes as well
+    (e.g. '*.lock' matches 'dir/yarn.lock')
+    """
+    prefix = pattern.rstrip('/')
+    if prefix in ('', '.') or path == prefix or path.startswith(prefix + '/'):
+        return True
+    return fnmatch.fnmatchcase(path, pattern)
+
+
+def get_attributes_digest(repository: git.Repository) -> str:
+    """
+    Digest of repository-wide attributes files ('info/attributes' and root '.gitattributes'), nested '.gitattributes'
+    files are not taken into account
+    """
+    digest = hashlib.sha1()
+    attributes_paths = [os.path.join(repository.path, 'info', 'attributes')]
+    if not repository.is_bare:
+        attributes_paths.append(os.path.join(repository.workdir, '.gitattributes'))
+    for attributes_path in attributes_paths:
+        if os.path.isfile(attributes_path):
+            with open(attributes_path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+class PathFilter:
+    """
+    Keeps files matching any of include pathspecs (all files if none is given) and matching none of exclude pathspecs.
+    Optionally, files marked as generated or vendored in '.gitattributes' (as GitHub linguist does it) are excluded.
+    """
+    # attributes which exclude a file if they are set or set to "true"
+    excluding_attributes = ('linguist-generated', 'linguist-vendored')
+
+    def __init__(self, repository: git.Repository, include: List[str] = None, exclude: List[str] = None,
+                 exclude_generated: bool = False):
+        """
+        :param include: pathspecs of files to analyse, all files by default
+        :param exclude: pathspecs of files not to analyse
+        :param exclude_generated: whether files having any of `excluding_attributes` are excluded
+        """
+        self.repo = repository
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.exclude_generated = exclude_generated
+        # path -> whether it is included, a path is matched once per run
+        self._matched = {}
+
+    @property
+    def is_active(self) -> bool:
+        return bool(self.include or self.exclude or self.exclude_generated)
+
+    @property
+    def options(self) -> tuple:
+        """
+        :return: arguments the filter is created with (except repository), e.g. to re-create it in another process
+        """
+        return self.include, self.exclude, self.exclude_generated
+
+    def is_included(self, path: str) -> bool:
+        is_included = self._matched.get(path)
+        if is_included is None:
+            is_included = self._matched[path] = self._match(path)
+        return is_included
+
+    def _match(self, path: str) -> bool:
+        if self.include and not any(matches_pathspec(pattern, path) for pattern in self.include):
+            return False
+        if any(matches_pathspec(pattern, path) for pattern in self.exclude):
+            return False
+        if self.exclude_generated:
+            for attribute in self.excluding_attributes:
+                if self.repo.get_attr(path, attribute) in (True, 'true'):
+                    return False
+        return True
+
+    def filter(self, paths: Iterable[str]) -> List[str]:
+        return [path for path in paths if self.is_included(path)]
+
+    def as_git_pathspecs(self) -> List[str]:
+        """
+        :return: pathspecs limiting git command's output to included files
+        """
+        pathspecs = list(self.include)
+        pathspecs.extend(f":(exclude){pattern}" for pattern in self.exclude)
+        if self.exclude_generated:
+            pathspecs.extend(f":(exclude,attr:{attribute}{value})"
+                             for attribute in self.excluding_attributes for value in ('', '=true'))
+        return pathspecs
+
+    def get_digest(self) -> str:
+        """
+        Digest of filter's options and of repository-wide attributes files (if attributes are used), nested
+        '.gitattributes' files are not taken into account
+        """
+        digest = hashlib.sha1(repr(self.options).encode())
+        if self.exclude_generated:
+            digest.update(get_attributes_digest(self.repo).encode())
+        return digest.hexdigest()
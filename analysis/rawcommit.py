@@ -0,0 +1,84 @@
+"""
+Parser of raw commit objects' headers, i.e. of commits as they are stored in git's object database.
+
+Signatures are parsed and decoded as libgit2 and pygit2 do it, so parsed commits are mapped to authors exactly as
+pygit2 commits are by `map_signature`.
+"""
+import re
+import pygit2 as git
+
+from typing import Optional
+
+from .gitdata import CommitRecord, SignatureRecord
+
+# an integer as parsed by libgit2 (leading whitespaces and sign are allowed)
+_INTEGER = re.compile(rb'\s*([+-]?\d+)')
+# characters libgit2 trims from both ends of names and emails: control characters, space and some punctuation
+_CRUD = bytes(range(33)) + b'.,:;<>"\\\''
+
+
+def decode(value: bytes, encoding: Optional[str]) -> str:
+    # pygit2 decodes signatures with commit's encoding (utf-8 if not given) replacing undecodable bytes
+    try:
+        return value.decode(encoding or 'utf-8', errors='replace')
+    except LookupError:
+        # pygit2 fails on unknown encoding of a commit, here the signature is decoded as utf-8 instead
+        return value.decode('utf-8', errors='replace')
+
+
+def parse_signature(raw_signature: bytes, encoding: str = None) -> SignatureRecord:
+    """
+    :param raw_signature: value of author/committer header, i.e. "<name> <<email>> <timestamp> <timezone offset>"
+    :param encoding: commit's encoding given by its 'encoding' header
+    :raise ValueError: if libgit2 fails to parse the signature
+    """
+    email_start = raw_signature.rfind(b'<')
+    email_end = raw_signature.rfind(b'>')
+    if email_start < 0 or email_end <= email_start:
+        raise ValueError("failed to parse signature - malformed e-mail")
+    name = raw_signature[:email_start].strip(_CRUD)
+    email = raw_signature[email_start + 1:email_end].strip(_CRUD)
+
+    time, offset = 0, 0
+    if email_end + 2 < len(raw_signature):
+        time_match = _INTEGER.match(raw_signature, email_end + 2)
+        if time_match is None:
+            raise ValueError("failed to parse signature - invalid Unix timestamp")
+        time = int(time_match.group(1))
+        timezone = raw_signature[time_match.end() + 1:]
+        if timezone:
+            offset_match = _INTEGER.match(timezone, 1)
+            # malformed timezone is considered to be zero offset
+            raw_offset = int(offset_match.group(1)) if timezone[:1] in b'+-' and offset_match else 0
+            hours, minutes = abs(raw_offset) // 100, abs(raw_offset) % 100
+            if hours <= 14 and minutes <= 59:
+                offset = -(hours * 60 + minutes) if timezone[:1] == b'-' else hours * 60 + minutes
+    return SignatureRecord(decode(name, encoding), decode(email, encoding), time, offset)
+
+
+def parse_commit(commit_id: git.Oid, header: bytes) -> CommitRecord:
+    """
+    :param header: commit object's content up to its message (i.e. up to the first empty line)
+    :raise ValueError: if libgit2 fails to parse the commit
+    """
+    parent_ids = []
+    raw_author, raw_committer, encoding = None, None, None
+    for line in header.split(b'\n'):
+        # continuation lines of multi-line headers (e.g. 'gpgsig') start with a space and are skipped
+        key, _, value = line.partition(b' ')
+        if key == b'parent':
+            parent_ids.append(git.Oid(hex=value.decode()))
+        elif key == b'author':
+            # some tools create several author headers, the extra ones are ignored
+            raw_author = value if raw_author is None else raw_author
+        elif key == b'committer':
+            raw_committer = value if raw_committer is None else raw_committer
+        elif key == b'encoding':
+            encoding = value.decode(errors='replace')
+    if raw_author is None or raw_committer is None:
+        raise ValueError(f"{commit_id}: failed to parse commit - missing author or committer")
+    try:
+        return CommitRecord(commit_id, parent_ids, parse_signature(raw_author, encoding),
+                            parse_signature(raw_committer, encoding))
+    except ValueError as e:
+        raise ValueError(f"{commit_id}: {e}")
@@ -9,6 +9,7 @@ import time
 import webbrowser
 
 from report.htmlreportcreator import HTMLReportCreator
+from analysis.gitdata import HistoryWindow
 from analysis.gitrepository import GitRepository
 from tools.configuration import Configuration
 
@@ -33,7 +34,29 @@ def main():
     print('Git path: %s' % config.git_repository_path)
     print('Collecting data...')
 
-    repository_statistics = GitRepository(config.git_repository_path)
+    # only history data used by report's pages is fetched
+    whole_history_columns, linear_history_columns = HTMLReportCreator.get_history_columns(config)
+    try:
+        repository_statistics = GitRepository(config.git_repository_path,
+                                              cache_dir=config.get_cache_dir(),
+                                              jobs=config.get_jobs_count(),
+                                              backend=config.get_history_backend(),
+                                              history_window=HistoryWindow(*config.get_history_window()),
+                                              include=config.get_included_paths(),
+                                              exclude=config.get_excluded_paths(),
+                                              exclude_generated=config.do_exclude_generated(),
+                                              max_diff_files=config.get_max_diff_files(),
+                                              max_diff_bytes=config.get_max_diff_bytes(),
+                                              blame_timeout=config.get_blame_timeout(),
+                                              blame_window_months=config.get_blame_window_months(),
+                                              blame_sample_size=config.get_blame_sample_size(),
+                                              blame_sample_seed=config.get_blame_sample_seed(),
+                                              blame_engine=config.get_blame_engine(),
+                                              whole_history_columns=whole_history_columns,
+                                              linear_history_columns=linear_history_columns)
+    except ValueError as ve:
+        warnings.warn("Repository cannot be analysed: {}".format(ve))
+        sys.exit(1)
 
     output_path = config.statistics_output_path
     print('Output path: %s' % output_path)
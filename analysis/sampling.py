@@ -0,0 +1,125 @@
+"""
+Stratified sampling of files to blame, blame-based metrics are extrapolated from the sample to all files
+"""
+import numpy as np
+import pandas as pd
+
+from typing import Callable, Iterable, List
+
+from tools import get_file_extension
+
+
+def size_bucket(size: int) -> int:
+    """
+    :return: decimal order of the size, i.e. files of 1-9 bytes are in bucket 1, files of 10-99 bytes in bucket 2 etc.
+    """
+    return len(str(size)) if size > 0 else 0
+
+
+class BlameSample:
+    """
+    Sample of text files stratified by extension and size bucket.
+
+    Every stratum gets a share of the sample proportional to its lines count (at least one file while the sample
+    allows it). Blamed lines of a sampled file are weighted, so that sampled files of a stratum sum up to stratum's
+    lines count (known from files data), lines of strata left out of the sample are distributed over sampled ones.
+    """
+
+    def __init__(self, files: List, size: int, seed: int = 0):
+        """
+        :param files: file records (see `gitdata.FileRecord`) to sample from
+        :param size: number of files to sample
+        :param seed: seed of random choice of files, the same files are sampled for the same seed
+        """
+        self.population_size = len(files)
+        self.seed = seed
+        strata = {}
+        for file in files:
+            strata.setdefault((get_file_extension(file.path), size_bucket(file.size)), []).append(file)
+        # strata are ordered by their keys, so the sample does not depend on files' order
+        self.strata = [sorted(strata[key], key=lambda file: file.path) for key in sorted(strata)]
+        self.strata_lines_counts = np.array([sum(file.lines_count for file in stratum) for stratum in self.strata],
+                                            dtype=np.float64)
+
+        rng = np.random.default_rng(seed)
+        self.files = []
+        # stratum index of every sampled file
+        self.files_strata = []
+        for i, (stratum, stratum_size) in enumerate(zip(self.strata, self._allocate(size))):
+            chosen_indices = rng.choice(len(stratum), size=stratum_size, replace=False)
+            for j in sorted(chosen_indices):
+                self.files.append(stratum[j])
+                self.files_strata.append(i)
+        self.files_strata = np.array(self.files_strata, dtype=np.int64)
+
+    def _allocate(self, size: int) -> List[int]:
+        """
+        :return: number of files to sample from every stratum
+        """
+        strata_sizes = np.array([len(stratum) for stratum in self.strata])
+        allocation = np.zeros(len(self.strata), dtype=np.int64)
+        # the largest strata (by lines count) get the first file
+        by_lines = np.argsort(-self.strata_lines_counts, kind='stable')
+        allocation[by_lines[:size]] = 1
+        remaining_size = size - allocation.sum()
+        total_lines_count = self.strata_lines_counts.sum()
+        if remaining_size > 0 and total_lines_count > 0:
+            # the rest is allocated proportionally to strata's lines count (largest remainder method)
+            quotas = self.strata_lines_counts / total_lines_count * remaining_size
+            allocation += np.floor(quotas).astype(np.int64)
+            remainders = quotas - np.floor(quotas)
+            for i in np.argsort(-remainders, kind='stable')[:remaining_size - int(np.floor(quotas).sum())]:
+                allocation[i] += 1
+        return np.minimum(allocation, strata_sizes).tolist()
+
+    @property
+    def paths(self) -> List[str]:
+        return [file.path for file in self.files]
+
+    def discard(self, paths: Iterable[str]):
+        """
+        Removes files from the sample, e.g. the ones which blame has failed
+        """
+        paths = set(paths)
+        kept = [i for i, file in enumerate(self.files) if file.path not in paths]
+        self.files = [self.files[i] for i in kept]
+        self.files_strata = self.files_strata[kept]
+
+    def weights(self, multiplicities: np.ndarray = None) -> np.ndarray:
+        """
+        :param multiplicities: how many times every sampled file is taken (e.g. by bootstrap), once by default
+        :return: weights of blamed lines of sampled files
+        """
+        if multiplicities is None:
+            multiplicities = np.ones(len(self.files))
+        lines_counts = np.array([file.lines_count for file in self.files], dtype=np.float64) * multiplicities
+        sampled_lines_counts = np.bincount(self.files_strata, weights=lines_counts, minlength=len(self.strata))
+        is_covered = sampled_lines_counts > 0
+        strata_weights = np.zeros(len(self.strata))
+        strata_weights[is_covered] = self.strata_lines_counts[is_covered] / sampled_lines_counts[is_covered]
+        covered_lines_count = self.strata_lines_counts[is_covered].sum()
+        if covered_lines_count > 0:
+            strata_weights *= self.strata_lines_counts.sum() / covered_lines_count
+        return strata_weights[self.files_strata] * multiplicities
+
+    def confidence_interval(self, statistic: Callable[[np.ndarray], pd.Series], level: float = 0.95,
+                            iterations: int = 200) -> pd.DataFrame:
+        """
+        Bootstraps the statistic resampling files within strata
+        :param statistic: function of sampled files' weights (see `weights`)
+        :return: 'low' and 'high' bounds of the statistic's values
+        """
+        rng = np.random.default_rng(self.seed)
+        strata_files = [np.flatnonzero(self.files_strata == i) for i in range(len(self.strata))]
+        values = []
+        for _ in range(iterations):
+            multiplicities = np.zeros(len(self.files))
+            for files_indices in strata_files:
+                if len(files_indices):
+                    np.add.at(multiplicities, rng.choice(files_indices, size=len(files_indices)), 1)
+            values.append(statistic(self.weights(multiplicities)))
+        values = pd.concat(values, axis=1).fillna(0)
+        return pd.DataFrame({
+            'low': values.quantile((1 - level) / 2, axis=1),
+            'high': values.quantile((1 + level) / 2, axis=1),
+        })
@@ -0,0 +1,266 @@
+"""
+Attribution of lines to commits by replaying changes of HEAD's first-parent chain, i.e. without blaming files
+"""
+import numpy as np
+import pandas as pd
+import pygit2 as git
+
+from tqdm import tqdm
+from typing import List, Optional, Tuple
+
+from tools.timeit import Timeit
+from .gitdata import AuthorIdentities, CommitsConsumer, CommitsScanner, DiffCostGuard, RevisionSnapshot, \
+    _get_changed_blob_ids, count_lines
+from .pathfilter import PathFilter
+
+
+def _append_run(runs: List[list], length: int, author_id: int, timestamp: int):
+    # adjacent lines of the same commit are kept in a single run
+    if runs and runs[-1][1] == author_id and runs[-1][2] == timestamp:
+        runs[-1][0] += length
+    else:
+        runs.append([length, author_id, timestamp])
+
+
+def replay_hunks(runs: List[list], hunks: List[Tuple[int, int, int]], author_id: int,
+                 timestamp: int) -> Tuple[List[list], List[list]]:
+    """
+    :param runs: [lines count, author id, timestamp] runs of file's lines before the change
+    :param hunks: (old start, old lines count, new lines count) of change's hunks (without context lines) in order
+    of their positions, old start is the line new lines are inserted after if no old lines are changed
+    :param author_id: id of change's author new lines are attributed to
+    :param timestamp: time of the change
+    :return: runs of file's lines after the change and runs of removed lines
+    """
+    new_runs, removed_runs = [], []
+    # the run being consumed and number of its lines consumed already
+    i, offset = 0, 0
+
+    def move(count: int, target: List[list]):
+        nonlocal i, offset
+        while count > 0 and i < len(runs):
+            length, run_author_id, run_timestamp = runs[i]
+            moved_count = min(length - offset, count)
+            _append_run(target, moved_count, run_author_id, run_timestamp)
+            count -= moved_count
+            offset += moved_count
+            if offset == length:
+                i, offset = i + 1, 0
+
+    position = 0
+    for old_start, old_lines, new_lines in hunks:
+        start = old_start - 1 if old_lines else old_start
+        move(start - position, new_runs)
+        move(old_lines, removed_runs)
+        position = start + old_lines
+        if new_lines:
+            _append_run(new_runs, new_lines, author_id, timestamp)
+    move(sum(length for length, _, _ in runs) - position, new_runs)
+    return new_runs, removed_runs
+
+
+def kaplan_meier(durations: np.ndarray, counts: np.ndarray, is_death: np.ndarray) -> pd.Series:
+    """
+    :param durations: lifetimes of lines (till their deletion or till the end of observation)
+    :param counts: number of lines of every lifetime
+    :param is_death: whether lines have been deleted or are still alive (censored)
+    :return: ratio of lines surviving past a duration, indexed by durations at which lines have been deleted
+    """
+    events = pd.DataFrame({'deaths': np.where(is_death, counts, 0), 'total': counts}).groupby(durations).sum()
+    # lines at risk at a duration are the ones living at least that long
+    at_risk = events['total'][::-1].cumsum()[::-1]
+    survival = (1 - events['deaths'] / at_risk).cumprod()
+    return survival[events['deaths'] > 0]
+
+
+class LineSurvival(CommitsConsumer):
+    """
+    Replays changes of HEAD's first-parent chain (from its oldest commit) keeping files' lines as runs of lines
+    of the same (author, commit time). It gives the same data as `BlameData` at HEAD at the cost of a single pass
+    over history, as well as lifetimes of deleted lines.
+
+    Merge commits are replayed as diffs against their first parent, i.e. lines of merged branches are attributed to
+    authors of merge commits. Lines of files of the chain's base commit (if history is scanned within a window) have
+    no author.
+    """
+
+    def __init__(self, repository: git.Repository, scanner: CommitsScanner = None, identities: AuthorIdentities = None,
+                 path_filter: PathFilter = None, cost_guard: DiffCostGuard = None):
+        """
+        :param scanner: commits scanner shared with other consumers, if not given history is scanned on its own
+        :param identities: authors' ids shared with other data fetchers
+        :param path_filter: filter of files to take into account, all files by default
+        :param cost_guard: limits of commit's changes to diff, files changed by commits exceeding them are attributed
+        to those commits as a whole
+        """
+        self.repo = repository
+        self.identities = identities if identities is not None else AuthorIdentities(self.repo)
+        self.path_filter = path_filter if path_filter is not None else PathFilter(self.repo)
+        self.cost_guard = cost_guard if cost_guard is not None else DiffCostGuard()
+        # (commit id, first parent id, author id, author timestamp) of first-parent chain, the latest commit first
+        self.chain = []
+        # file path -> runs of file's lines (see `replay_hunks`)
+        self.files = {}
+        # (birth timestamp, death timestamp) -> number of deleted lines
+        self.deaths = {}
+        # the time lines alive after the replay are observed at
+        self.end_timestamp = None
+        self.is_replayed = False
+        self.scanner = scanner if scanner is not None else CommitsScanner(self.repo)
+        self.scanner.subscribe(self)
+
+    def consume(self, commit: git.Commit, is_first_parent: bool):
+        if is_first_parent:
+            author_id, _ = self.identities.resolve(commit.author)
+            parent_id = commit.parent_ids[0] if commit.parent_ids else None
+            self.chain.append((commit.id, parent_id, author_id, commit.author.time))
+
+    def _remove(self, runs: List[list], timestamp: int):
+        for length, author_id, birth_timestamp in runs:
+            # lifetime of lines without author (of the base commit) is unknown
+            if author_id >= 0:
+                self.deaths[(birth_timestamp, timestamp)] = self.deaths.get((birth_timestamp, timestamp), 0) + length
+
+    def _get_path(self, diff_file: git.DiffFile, is_existing: bool) -> Optional[str]:
+        if not is_existing or diff_file.mode == git.GIT_FILEMODE_COMMIT or \
+                not self.path_filter.is_included(diff_file.path):
+            return None
+        return diff_file.path
+
+    def _replay_commit(self, commit_id: git.Oid, parent_id: Optional[git.Oid], author_id: int, timestamp: int):
+        commit = self.repo[commit_id]
+        if parent_id is None:
+            diff = commit.tree.diff_to_tree(swap=True, context_lines=0)
+        else:
+            diff = self.repo.diff(self.repo[parent_id], commit, context_lines=0)
+        is_exceeded = self.cost_guard.is_active and \
+            self.cost_guard.is_exceeded(self.repo, [_get_changed_blob_ids(delta) for delta in diff.deltas])
+        if not is_exceeded:
+            # lines of renamed files keep their authors
+            diff.find_similar(flags=git.GIT_DIFF_FIND_RENAMES)
+
+        for i, delta in enumerate(diff.deltas):
+            old_path = self._get_path(delta.old_file, delta.status != git.GIT_DELTA_ADDED)
+            new_path = self._get_path(delta.new_file, delta.status != git.GIT_DELTA_DELETED)
+            old_runs = self.files.pop(old_path, []) if old_path is not None else []
+            if new_path is None:
+                self._remove(old_runs, timestamp)
+                continue
+            if is_exceeded:
+                # changed files of a giant commit are attributed to it as a whole
+                self._remove(old_runs, timestamp)
+                new_runs = []
+                _append_run(new_runs, count_lines(self.repo[delta.new_file.id]), author_id, timestamp)
+            else:
+                patch = diff[i]
+                if patch.delta.is_binary:
+                    self._remove(old_runs, timestamp)
+                    continue
+                hunks = [(hunk.old_start, hunk.old_lines, hunk.new_lines) for hunk in patch.hunks]
+                new_runs, removed_runs = replay_hunks(old_runs, hunks, author_id, timestamp)
+                self._remove(removed_runs, timestamp)
+            new_runs = [run for run in new_runs if run[0] > 0]
+            if new_runs:
+                self.files[new_path] = new_runs
+
+    @Timeit("Replaying history")
+    def replay(self):
+        if self.is_replayed:
+            return
+        self.scanner.scan()
+        if self.scanner.base_commit_id is not None:
+            # files of the commit history starts from have no author
+            base_commit = self.repo[self.scanner.base_commit_id]
+            for file in RevisionSnapshot(self.repo, str(base_commit.id), self.path_filter).files:
+                if not file.is_binary and file.lines_count > 0:
+                    self.files[file.path] = [[file.lines_count, -1, base_commit.author.time]]
+            self.end_timestamp = base_commit.author.time
+        for commit_id, parent_id, author_id, timestamp in tqdm(reversed(self.chain), total=len(self.chain),
+                                                               unit=" commits"):
+            self._replay_commit(commit_id, parent_id, author_id, timestamp)
+            self.end_timestamp = timestamp
+        self.is_replayed = True
+
+    def fetch(self):
+        """
+        :return: column name -> values of lines' records of the latest replayed revision (as `BlameData.fetch` gives
+        them), committer of lines without author is unknown (NaN)
+        """
+        self.replay()
+        paths = sorted(self.files)
+        runs = [run for path in paths for run in self.files[path]]
+        paths_ids = np.repeat(np.arange(len(paths), dtype=np.int32), [len(self.files[path]) for path in paths])
+        runs = np.array(runs, dtype=np.int64).reshape(-1, 3)
+        df = pd.DataFrame({
+            'filepath': paths_ids,
+            'committer_name': runs[:, 1].astype(np.int32),
+            'timestamp': runs[:, 2],
+            'lines_count': runs[:, 0].astype(np.int32),
+        })
+        # runs are aggregated by file, author and time as blame records are
+        df = df.groupby(['filepath', 'committer_name', 'timestamp'], sort=False, as_index=False)['lines_count'].sum()
+        return {
+            'committer_name': self.identities.names.as_categorical(df['committer_name'].values),
+            'lines_count': df['lines_count'].values,
+            'timestamp': df['timestamp'].values,
+            'filepath': pd.Categorical.from_codes(df['filepath'].values, categories=paths),
+        }
+
+    def as_dataframe(self):
+        return pd.DataFrame(self.fetch(), copy=False)
+
+    def get_lifetimes(self) -> pd.DataFrame:
+        """
+        :return: lines count by birth timestamp, lifetime (in seconds) and whether lines have been deleted (lines alive
+        after the replay are observed till its latest commit)
+        """
+        self.replay()
+        alive = {}
+        for runs in self.files.values():
+            for length, author_id, birth_timestamp in runs:
+                if author_id >= 0:
+                    alive[birth_timestamp] = alive.get(birth_timestamp, 0) + length
+        births = np.array([birth for birth, _ in self.deaths] + list(alive), dtype=np.int64)
+        ends = np.array([death for _, death in self.deaths] + [self.end_timestamp] * len(alive), dtype=np.int64)
+        return pd.DataFrame({
+            'birth_timestamp': births,
+            # commits' clocks may be skewed
+            'lifetime': np.maximum(ends - births, 0),
+            'lines_count': np.array(list(self.deaths.values()) + list(alive.values()), dtype=np.int64),
+            'is_deleted': np.arange(len(births)) < len(self.deaths),
+        })
+
+    def get_survival_curves(self, freq: str = 'Y') -> pd.DataFrame:
+        """
+        :param freq: period lines are grouped into cohorts by (pandas' offset alias, e.g. 'Y' for years)
+        :return: ratio of lines surviving past an age (in days, index) for every cohort (columns) of lines added
+        within a period, ratios are carried forward between ages lines have been deleted at
+        """
+        lifetimes = self.get_lifetimes()
+        cohorts = pd.to_datetime(lifetimes['birth_timestamp'], unit='s', utc=True).dt.tz_localize(None)\
+            .dt.to_period(freq)
+        ages = lifetimes['lifetime'] // (24 * 3600)
+        curves, max_ages = {}, {}
+        for cohort, cohort_lifetimes in lifetimes.groupby(cohorts):
+            cohort_ages = ages[cohort_lifetimes.index].values
+            curves[cohort] = kaplan_meier(cohort_ages, cohort_lifetimes['lines_count'].values,
+                                          cohort_lifetimes['is_deleted'].values)
+            max_ages[cohort] = cohort_ages.max()
+        # curves start from all lines alive at age 0
+        curves_df = pd.DataFrame(curves)
+        curves_df = curves_df.reindex(curves_df.index.union([0])).ffill().fillna(1.0)
+        for cohort, max_age in max_ages.items():
+            # cohort's lines are not observed older than that
+            curves_df.loc[curves_df.index > max_age, cohort] = np.nan
+        curves_df.index.name = 'age_days'
+        return curves_df
+
+    def get_half_life(self) -> Optional[int]:
+        """
+        :return: age (in days) half of lines do not survive, None if more than half of lines are still alive
+        """
+        lifetimes = self.get_lifetimes()
+        survival = kaplan_meier(lifetimes['lifetime'].values // (24 * 3600), lifetimes['lines_count'].values,
+                                lifetimes['is_deleted'].values)
+        half_dead = survival[survival <= 0.5]
+        return int(half_dead.index[0]) if not half_dead.empty else None
@@ -42,8 +42,11 @@ class GitTestRepository(git.Repository):
             self.repository.index.write()
             return self
 
-        def set_author(self, name: str, email: str):
-            self.author_signature = git.Signature(name, email)
+        def set_author(self, name: str, email: str, time: int = None):
+            """
+            :param time: author's (and committer's) timestamp, current time by default
+            """
+            self.author_signature = git.Signature(name, email) if time is None else git.Signature(name, email, time, 0)
             return self
 
         def commit(self):
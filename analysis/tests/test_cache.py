@@ -0,0 +1,280 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from pygit2 import Signature
+
+from analysis.cache import HistoryCache, BlobsCache, BlameCache
+from analysis.gitdata import WholeHistory, LinearHistory, CommitsScanner, HistoryWindow, DiffCostGuard, \
+    DiffStatsFetcher, FilesData, BlameData
+from analysis.tests.gitrepository import GitTestRepository
+
+
+class HistoryCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.test_repo = GitTestRepository()
+        self.cache_dir = tempfile.mkdtemp(prefix="repostat_cache_")
+
+        self.test_repo.commit_builder \
+            .set_author("John Doe", "john@doe.com") \
+            .add_file(filename="file.txt", content=["bzyk"]) \
+            .commit()
+        self.test_repo.commit_builder \
+            .set_author("Author Author", "author@author.net") \
+            .append_file(filename="file.txt", content=["some", "content"]) \
+            .commit()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def fetch_histories(self, window: HistoryWindow = None, cost_guard: DiffCostGuard = None):
+        """
+        :return: whole and linear history dataframes and how many times the repository diffed commits
+        """
+        cost_guard = cost_guard if cost_guard is not None else DiffCostGuard()
+        cache = HistoryCache(self.cache_dir, self.test_repo, diff_limits=cost_guard.options)
+        scanner = CommitsScanner(self.test_repo, window)
+        whole_history = WholeHistory(self.test_repo, scanner=scanner, cache=cache,
+                                     diff_stats=DiffStatsFetcher(self.test_repo, cost_guard=cost_guard))
+        linear_history = LinearHistory(self.test_repo, scanner=scanner, cache=cache,
+                                       diff_stats=DiffStatsFetcher(self.test_repo, cost_guard=cost_guard))
+        with patch.object(self.test_repo, 'diff', wraps=self.test_repo.diff) as diff_mock:
+            whole_history_df = whole_history.as_dataframe()
+            linear_history_df = linear_history.as_dataframe()
+        cache.save(prune=window is None)
+        return whole_history_df, linear_history_df, diff_mock.call_count
+
+    def test_cached_records_are_reused(self):
+        first_wh_df, first_lh_df, first_diffs_count = self.fetch_histories()
+        self.assertTrue(os.path.isfile(os.path.join(self.cache_dir, HistoryCache.file_name)))
+        self.assertEqual(2, first_diffs_count)
+
+        second_wh_df, second_lh_df, second_diffs_count = self.fetch_histories()
+        self.assertEqual(0, second_diffs_count)
+        self.assertTrue(first_wh_df.equals(second_wh_df))
+        self.assertTrue(first_lh_df.equals(second_lh_df))
+
+    def test_only_new_commits_are_processed(self):
+        self.fetch_histories()
+        self.test_repo.commit_builder \
+            .set_author("John Doe", "john@doe.com") \
+            .append_file(filename="file.txt", content=["new", "lines"]) \
+            .commit()
+
+        wh_df, _, diffs_count = self.fetch_histories()
+        # new commit is diffed once for whole history and once for linear history
+        self.assertEqual(2, diffs_count)
+        self.assertEqual(3, len(wh_df.index))
+        self.assertListEqual([2, 2, 1], wh_df['insertions'].tolist())
+
+    def test_mailmap_change_invalidates_cache(self):
+        self.fetch_histories()
+        with open(os.path.join(self.test_repo.location, ".mailmap"), 'w') as mm:
+            mm.write("John Doe <john@doe.com> Author Author <author@author.net>")
+
+        wh_df, _, diffs_count = self.fetch_histories()
+        self.assertEqual(2, diffs_count)
+        self.assertCountEqual(["John Doe"], wh_df['author_name'].unique())
+
+    def test_diff_limits_change_invalidates_cache(self):
+        self.fetch_histories()
+        wh_df, _, diffs_count = self.fetch_histories(cost_guard=DiffCostGuard(max_files=0))
+        # records of diffed commits are not reused, commits are compared again and exceed the limits
+        self.assertEqual(2, diffs_count)
+        self.assertTrue(wh_df['is_diff_estimated'].all())
+
+        _, _, diffs_count = self.fetch_histories(cost_guard=DiffCostGuard(max_files=0))
+        self.assertEqual(0, diffs_count)
+        wh_df, _, diffs_count = self.fetch_histories()
+        self.assertEqual(2, diffs_count)
+        self.assertFalse(wh_df['is_diff_estimated'].any())
+
+    def test_rewritten_history_is_not_reused(self):
+        self.fetch_histories()
+        # rewrite the latest commit as if it was amended and force-pushed
+        head_commit = self.test_repo.head.peel()
+        self.test_repo.commit_builder.append_file("file.txt", ["amended"])
+        tree = self.test_repo.index.write_tree()
+        self.test_repo.head.set_target(self.test_repo.create_commit(
+            None, head_commit.author, head_commit.committer, "Amended", tree, head_commit.parent_ids))
+
+        wh_df, _, diffs_count = self.fetch_histories()
+        self.assertEqual(2, diffs_count)
+        self.assertListEqual([3, 1], wh_df['insertions'].tolist())
+
+        cache = HistoryCache(self.cache_dir, self.test_repo)
+        self.assertIsNone(cache.get(WholeHistory.__name__, head_commit.id))
+
+    def test_rewritten_commits_are_not_kept_by_windowed_run(self):
+        self.fetch_histories()
+        head_commit = self.test_repo.head.peel()
+        self.test_repo.commit_builder.append_file("file.txt", ["amended"])
+        tree = self.test_repo.index.write_tree()
+        self.test_repo.head.set_target(self.test_repo.create_commit(
+            None, head_commit.author, head_commit.committer, "Amended", tree, head_commit.parent_ids))
+
+        # windowed run keeps records out of the window, but not the ones of commits out of HEAD's history
+        self.fetch_histories(HistoryWindow(max_commits=1))
+        cache = HistoryCache(self.cache_dir, self.test_repo)
+        self.assertIsNone(cache.get(WholeHistory.__name__, head_commit.id))
+        self.assertIsNotNone(cache.get(WholeHistory.__name__, head_commit.parent_ids[0]))
+        self.assertIsNotNone(cache.get(WholeHistory.__name__, self.test_repo.head.target))
+
+    def test_records_out_of_window_are_kept(self):
+        self.fetch_histories()
+        wh_df, _, diffs_count = self.fetch_histories(HistoryWindow(max_commits=1))
+        self.assertEqual(1, len(wh_df.index))
+        self.assertEqual(0, diffs_count)
+
+        wh_df, _, diffs_count = self.fetch_histories()
+        self.assertEqual(2, len(wh_df.index))
+        self.assertEqual(0, diffs_count)
+
+
+class BlobsCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.test_repo = GitTestRepository()
+        self.cache_dir = tempfile.mkdtemp(prefix="repostat_cache_")
+
+        self.test_repo.commit_builder \
+            .set_author("John Doe", "john@doe.com") \
+            .add_file(filename="file.txt", content=["bzyk"]) \
+            .add_file(filename="copy.txt", content=["bzyk"]) \
+            .add_file(filename="data.bin", content=["\0\0"]) \
+            .commit()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def fetch_files(self):
+        """
+        :return: files dataframe and the cache it has been fetched with
+        """
+        cache = BlobsCache(self.cache_dir, self.test_repo)
+        files_df = FilesData(self.test_repo, cache=cache).as_dataframe()
+        cache.save()
+        return files_df, cache
+
+    def test_cached_records_are_reused(self):
+        first_files_df, first_cache = self.fetch_files()
+        # files of the same content are read once
+        self.assertEqual(2, first_cache.misses_count)
+        self.assertTrue(first_files_df.equals(FilesData(self.test_repo).as_dataframe()))
+
+        second_files_df, second_cache = self.fetch_files()
+        self.assertEqual(0, second_cache.misses_count)
+        self.assertTrue(first_files_df.equals(second_files_df))
+
+    def test_only_new_blobs_are_read(self):
+        self.fetch_files()
+        self.test_repo.commit_builder \
+            .set_author("John Doe", "john@doe.com") \
+            .append_file(filename="file.txt", content=["new", "lines"]) \
+            .commit()
+
+        files_df, cache = self.fetch_files()
+        self.assertEqual(1, cache.misses_count)
+        self.assertListEqual([1, 0, 3], files_df['lines_count'].tolist())
+
+    def test_attributes_change_invalidates_cache(self):
+        self.fetch_files()
+        with open(os.path.join(self.test_repo.location, ".gitattributes"), 'w') as attributes:
+            attributes.write("*.txt binary")
+
+        files_df, cache = self.fetch_files()
+        self.assertEqual(2, cache.misses_count)
+        self.assertListEqual([True, True, True], files_df['is_binary'].tolist())
+
+
+class BlameCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.test_repo = GitTestRepository()
+        self.cache_dir = tempfile.mkdtemp(prefix="repostat_cache_")
+
+        self.test_repo.commit_builder \
+            .set_author("John Doe", "john@doe.com") \
+            .add_file(filename="file.txt", content=["bzyk"]) \
+            .add_file(filename="other.txt", content=["other"]) \
+            .commit()
+        self.test_repo.commit_builder \
+            .set_author("Author Author", "author@author.net") \
+            .append_file(filename="file.txt", content=["some", "content"]) \
+            .commit()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def fetch_blame(self):
+        """
+        :return: blame dataframe and the cache it has been fetched with
+        """
+        cache = BlameCache(self.cache_dir, self.test_repo)
+        blame_df = BlameData(self.test_repo, cache=cache).as_dataframe()
+        cache.save()
+        return blame_df, cache
+
+    def assertBlameEqual(self, expected_df, blame_df):
+        self.assertListEqual(expected_df.astype(str).values.tolist(), blame_df.astype(str).values.tolist())
+
+    def test_cached_blame_is_reused(self):
+        first_blame_df, first_cache = self.fetch_blame()
+        self.assertEqual(2, first_cache.misses_count)
+        self.assertBlameEqual(BlameData(self.test_repo).as_dataframe(), first_blame_df)
+
+        second_blame_df, second_cache = self.fetch_blame()
+        self.assertEqual(0, second_cache.misses_count)
+        self.assertBlameEqual(first_blame_df, second_blame_df)
+
+    def test_only_changed_files_are_blamed(self):
+        self.fetch_blame()
+        self.test_repo.commit_builder \
+            .set_author("John Doe", "john@doe.com") \
+            .append_file(filename="other.txt", content=["new", "lines"]) \
+            .commit()
+
+        blame_df, cache = self.fetch_blame()
+        self.assertEqual(1, cache.misses_count)
+        self.assertBlameEqual(BlameData(self.test_repo).as_dataframe(), blame_df)
+
+    def test_cached_blame_follows_mailmap_change(self):
+        self.fetch_blame()
+        with open(os.path.join(self.test_repo.location, ".mailmap"), 'w') as mm:
+            mm.write("John Doe <john@doe.com> Author Author <author@author.net>")
+
+        # cached blame refers to commits, which are mapped to their authors anew
+        blame_df, cache = self.fetch_blame()
+        self.assertEqual(0, cache.misses_count)
+        self.assertCountEqual(["John Doe"], blame_df['committer_name'].unique())
+
+    def test_rewritten_history_invalidates_cache(self):
+        self.fetch_blame()
+        # rewrite the latest commit with another author, file's content stays the same
+        head_commit = self.test_repo.head.peel()
+        author = Signature("Rewriter", "rewriter@rewriter.net")
+        self.test_repo.head.set_target(self.test_repo.create_commit(
+            None, author, author, "Rewritten", head_commit.tree.id, head_commit.parent_ids))
+
+        blame_df, cache = self.fetch_blame()
+        self.assertEqual(2, cache.misses_count)
+        self.assertIn("Rewriter", blame_df['committer_name'].tolist())
+
+    def test_reverted_change_invalidates_file_blame(self):
+        self.fetch_blame()
+        # file's content is changed and then restored, so its blob is the same as in the previous run
+        self.test_repo.commit_builder \
+            .set_author("Bob", "bob@bob.com") \
+            .add_file(filename="file.txt", content=["changed"]) \
+            .commit()
+        self.test_repo.commit_builder \
+            .set_author("Carol", "carol@carol.com") \
+            .add_file(filename="file.txt", content=["bzyk", "some", "content"]) \
+            .commit()
+
+        blame_df, cache = self.fetch_blame()
+        self.assertEqual(1, cache.misses_count)
+        self.assertBlameEqual(BlameData(self.test_repo).as_dataframe(), blame_df)
+        self.assertIn("Carol", blame_df['committer_name'].tolist())
@@ -0,0 +1,70 @@
+import unittest
+import numpy as np
+import pandas as pd
+
+from analysis.columnar import Categories, ColumnarRecords
+
+
+class ColumnarRecordsTest(unittest.TestCase):
+    dtypes = {
+        'commit_id': 'V20',
+        'author_name': 'category',
+        'timestamp': 'int64',
+        'insertions': 'int32',
+    }
+
+    def setUp(self):
+        self.records = ColumnarRecords(self.dtypes)
+        self.rows_count = 3 * ColumnarRecords.initial_capacity + 1
+        for i in range(self.rows_count):
+            self.records.append_decoded((i.to_bytes(20, 'big'), f"Author{i % 3}", 1580000000 + i, i % 7))
+
+    def test_rows_exceeding_initial_capacity_are_kept(self):
+        self.assertEqual(self.rows_count, len(self.records))
+        columns = self.records.as_columns()
+        self.assertEqual(np.dtype('V20'), columns['commit_id'].dtype)
+        self.assertEqual((self.rows_count - 1).to_bytes(20, 'big'), columns['commit_id'][-1].tobytes())
+        self.assertEqual(1580000000 + self.rows_count - 1, columns['timestamp'][-1])
+
+    def test_categorical_column(self):
+        author_names = self.records.as_columns()['author_name']
+        self.assertIsInstance(author_names, pd.Categorical)
+        self.assertListEqual(['Author0', 'Author1', 'Author2'], list(author_names.categories))
+        self.assertListEqual(['Author0', 'Author1', 'Author2', 'Author0'], list(author_names[:4]))
+
+    def test_categories_are_in_order_of_codes(self):
+        records = ColumnarRecords({'name': 'category'})
+        for name in ['b', 'c', 'a', 'b']:
+            records.append_decoded((name,))
+        names = records.as_columns()['name']
+        self.assertListEqual(['b', 'c', 'a'], list(names.categories))
+        self.assertListEqual([0, 1, 2, 0], list(names.codes))
+        self.assertListEqual(['b', 'c', 'a', 'b'], list(names))
+
+    def test_shared_categories(self):
+        names = Categories()
+        names.code('a')
+        records = ColumnarRecords({'name': 'category', 'count': 'int32'}, categories={'name': names})
+        records.append((names.code('b'), 1))
+        other_records = ColumnarRecords({'name': 'category'}, categories={'name': names})
+        other_records.append_decoded(('b',))
+        self.assertListEqual([1], list(records.as_columns()['name'].codes))
+        self.assertListEqual([1], list(other_records.as_columns()['name'].codes))
+        self.assertListEqual(['a', 'b'], list(other_records.as_columns()['name'].categories))
+
+    def test_row_round_trip(self):
+        row = self.records.row(5)
+        self.assertTupleEqual((int(5).to_bytes(20, 'big'), 'Author2', 1580000005, 5), row)
+        copy = ColumnarRecords(self.dtypes)
+        copy.append_decoded(row)
+        self.assertTupleEqual(row, copy.row(0))
+
+    def test_dataframe_is_built_without_copying(self):
+        columns = self.records.as_columns()
+        df = pd.DataFrame(columns, copy=False)
+        self.assertTrue(np.shares_memory(columns['timestamp'], df['timestamp'].values))
+        self.assertTrue(np.shares_memory(columns['insertions'], df['insertions'].values))
+
+    def test_column_is_writable_view(self):
+        self.records.column('insertions')[:] = 1
+        self.assertEqual(self.rows_count, self.records.as_columns()['insertions'].sum())
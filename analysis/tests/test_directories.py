@@ -0,0 +1,48 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from analysis.directories import PathTrie, get_directories_ownership
+
+
+class PathTrieTest(unittest.TestCase):
+
+    def test_directories_are_interned_after_parents(self):
+        trie = PathTrie(['a/b/c/x.py', 'a/y.py', 'z.py'])
+        self.assertListEqual(['.', 'a', 'a/b', 'a/b/c'], trie.directories)
+        self.assertListEqual([-1, 0, 1, 2], trie.parents.tolist())
+        self.assertListEqual([3, 1, 0], trie.files_directories.tolist())
+
+    def test_deep_directories_are_merged(self):
+        trie = PathTrie(['a/b/c/x.py', 'a/y.py', 'z.py'], max_depth=1)
+        self.assertListEqual(['.', 'a'], trie.directories)
+        self.assertListEqual([1, 1, 0], trie.files_directories.tolist())
+
+    def test_values_are_summed_up_subtrees(self):
+        trie = PathTrie(['a/b/x.py', 'a/y.py'])
+        directories, keys, sums = trie.aggregate(trie.files_directories, np.array([0, 1]), np.array([2., 3.]))
+        self.assertDictEqual({(0, 0): 2, (0, 1): 3, (1, 0): 2, (1, 1): 3, (2, 0): 2},
+                             {(d, k): s for d, k, s in zip(directories.tolist(), keys.tolist(), sums.tolist())})
+
+
+class DirectoriesOwnershipTest(unittest.TestCase):
+    filepaths = pd.Categorical(['a/b/x.py', 'a/y.py', 'z.py', 'a/b/c/w.py', 'a/b/x.py'])
+    authors = pd.Categorical.from_codes([0, 1, 0, 2, -1], ['Alice', 'Bob', 'Carol'])
+    lines_count = np.array([10, 5, 1, 8, 3])
+
+    def test_ownership(self):
+        df = get_directories_ownership(self.filepaths, self.authors, self.lines_count)
+        self.assertListEqual(['.', 'a', 'a/b', 'a/b/c'], df['directory'].tolist())
+        self.assertListEqual([4, 3, 2, 1], df['files_count'].tolist())
+        # lines without author are not taken into account
+        self.assertListEqual([24, 23, 18, 8], df['lines_count'].tolist())
+        self.assertListEqual([3, 3, 2, 1], df['authors_count'].tolist())
+        self.assertListEqual([2, 2, 1, 1], df['bus_factor'].tolist())
+        self.assertListEqual(['Alice', 'Alice', 'Alice', 'Carol'], df['top_owner'].astype(str).tolist())
+        self.assertAlmostEqual(10 / 18, df['top_owner_share'][2])
+
+    def test_ownership_of_limited_depth(self):
+        df = get_directories_ownership(self.filepaths, self.authors, self.lines_count, max_depth=1)
+        full_df = get_directories_ownership(self.filepaths, self.authors, self.lines_count)
+        pd.testing.assert_frame_equal(full_df[full_df['depth'] <= 1], df)
@@ -1,12 +1,21 @@
 import subprocess
+import time
 import unittest
 import os
 from collections import defaultdict
+from unittest.mock import patch
+import pandas as pd
 from pygit2 import Signature, Repository
 import pygit2
 
-from analysis.gitdata import WholeHistory, LinearHistory, BlameData, FilesData, TagsData
+from analysis.gitdata import WholeHistory, LinearHistory, BlameData, FilesData, TagsData, CommitsScanner, \
+    DiffStatsFetcher, AuthorIdentities, HistoryWindow, Pygit2HistoryBackend, DiffCostGuard, RevisionSnapshot, \
+    map_signature, blame_file, find_blame_boundary, get_blame_window_start
+from analysis.columnar import Categories
+from analysis.gitlog import GitLogHistoryBackend
+from analysis.pathfilter import PathFilter
 from analysis.gitrepository import GitRepository
+from analysis.gitrevision import GitRevision
 from analysis.tests.gitrepository import GitTestRepository
 
 
@@ -84,6 +93,120 @@ class GitHistoryTest(unittest.TestCase):
         # both emails are preserved for statistics
         self.assertCountEqual(["john@doe.com", "author@author.net"], emails)
 
+    def test_history_columns_projection(self):
+        self.test_repo.commit_builder \
+            .set_author("Author Author", "author@author.net") \
+            .add_file(content=["some content"]) \
+            .commit()
+        diff_stats = DiffStatsFetcher(self.test_repo)
+        whole_history = WholeHistory(self.test_repo, diff_stats=diff_stats)
+
+        authors_df = whole_history.as_dataframe(columns=['author_name', 'author_timestamp'])
+        self.assertListEqual(['author_name', 'author_timestamp'], list(authors_df.columns))
+        self.assertCountEqual(["John Doe", "Author Author"], authors_df['author_name'].tolist())
+        # no diffs are needed if no changes are requested
+        self.assertEqual(0, diff_stats.diffs_count)
+
+        changes_df = whole_history.as_dataframe(columns=['insertions'])
+        self.assertEqual(2, diff_stats.diffs_count)
+        self.assertTrue((changes_df['insertions'] > 0).all())
+
+        with self.assertRaises(ValueError):
+            whole_history.as_dataframe(columns=['no_such_column'])
+
+    def test_unrequested_columns_are_not_built(self):
+        with patch.object(DiffStatsFetcher, 'fetch', autospec=True, side_effect=DiffStatsFetcher.fetch) as fetch, \
+                patch('analysis.columnar.Categories.as_categorical', autospec=True,
+                      side_effect=Categories.as_categorical) as as_categorical:
+            repository = GitRepository(self.test_repo.location,
+                                       whole_history_columns=['author_timestamp', 'author_name'],
+                                       linear_history_columns=['committer_timestamp'])
+        self.assertListEqual(['author_timestamp', 'author_name'], list(repository.whole_history_df.columns))
+        self.assertListEqual(['committer_timestamp'], list(repository.linear_history_df.columns))
+        # neither commits are diffed nor e-mails are decoded as no changes and e-mails are requested
+        fetch.assert_not_called()
+        self.assertEqual(1, as_categorical.call_count)
+
+    def test_single_walk_feeds_all_consumers(self):
+        branch = self.test_repo.branches.local.create('second_branch', self.test_repo.head.peel())
+        self.test_repo.checkout(branch)
+        self.test_repo.commit_builder \
+            .set_author("Author Author", "author@author.net") \
+            .add_file(content=["some content"]) \
+            .commit()
+        master_branch = self.test_repo.branches.get('master')
+        self.test_repo.checkout(master_branch)
+        self.test_repo.merge(self.test_repo.branches.get('second_branch').peel().id)
+        author = Signature("name", "email")
+        tree = self.test_repo.index.write_tree()
+        self.test_repo.create_commit('HEAD', author, author, "Merge 'second_branch' into 'master'", tree,
+                                     [self.test_repo.head.target,
+                                      self.test_repo.branches.get('second_branch').peel().oid])
+
+        scanner = CommitsScanner(self.test_repo)
+        diff_stats = DiffStatsFetcher(self.test_repo)
+        whole_history = WholeHistory(self.test_repo, scanner=scanner, diff_stats=diff_stats)
+        linear_history = LinearHistory(self.test_repo, scanner=scanner, diff_stats=diff_stats)
+        tags_data = TagsData(self.test_repo, scanner=scanner)
+        with patch.object(self.test_repo, 'walk', wraps=self.test_repo.walk) as walk_mock:
+            whole_history_df = whole_history.as_dataframe()
+            linear_history_df = linear_history.as_dataframe()
+            tags_records = tags_data.fetch()
+            self.assertEqual(1, walk_mock.call_count)
+
+        self.assertEqual(3, scanner.commits_count)
+        # non-merge commits are diffed once for both histories, merge commit is diffed for linear history only
+        self.assertEqual(3, diff_stats.diffs_count)
+        self.assertEqual(3, len(whole_history_df.index))
+        self.assertEqual(3, len(tags_records['tag_name']))
+        # merge commit and initial commit are on the first-parent chain
+        self.assertListEqual([self.test_repo.head.target.raw, self.test_repo.head.peel().parent_ids[0].raw],
+                             linear_history_df['commit_id'].tolist())
+
+    def test_parallel_diff_stats_equal_serial_ones(self):
+        for i in range(5):
+            self.test_repo.commit_builder \
+                .set_author("Author Author", "author@author.net") \
+                .add_file(filename=f"file{i % 2}.txt", content=[f"line {j}" for j in range(i)]) \
+                .commit()
+
+        serial_df = WholeHistory(self.test_repo).as_dataframe()
+        parallel_df = WholeHistory(self.test_repo, diff_stats=DiffStatsFetcher(self.test_repo, jobs=2)).as_dataframe()
+        self.assertTrue(serial_df.equals(parallel_df))
+        self.assertListEqual([2, 2, 2, 1, 0, 4], parallel_df['insertions'].tolist())
+
+    def test_linear_history_files_count(self):
+        self.test_repo.commit_builder \
+            .set_author("Author Author", "author@author.net") \
+            .add_file(filename="file1.txt", content=["1"]) \
+            .add_file(filename="file2.txt", content=["2"]) \
+            .commit()
+        self.test_repo.index.remove("file1.txt")
+        self.test_repo.commit_builder \
+            .set_author("Author Author", "author@author.net") \
+            .add_file(filename="file3.txt", content=["3"]) \
+            .commit()
+        self.test_repo.index.remove("file2.txt")
+        self.test_repo.index.remove("file3.txt")
+        self.test_repo.commit_builder \
+            .set_author("Author Author", "author@author.net") \
+            .append_file(filename="file4.txt", content=["4"]) \
+            .commit()
+
+        linear_history_df = LinearHistory(self.test_repo).as_dataframe()
+        commits = self.test_repo.walk(self.test_repo.head.target, pygit2.GIT_SORT_TOPOLOGICAL)
+        # files count is derived from changes, so it must be the same as full tree count of every commit
+        self.assertListEqual([len(commit.tree.diff_to_tree()) for commit in commits],
+                             linear_history_df['files_count'].tolist())
+        self.assertListEqual([2, 3, 3, 1], linear_history_df['files_count'].tolist())
+
+    def test_history_rows_are_taken_by_commit_id(self):
+        whole_history_df = WholeHistory(self.test_repo).as_dataframe()
+        sorted_df = whole_history_df.sort_values(by='commit_id')
+        self.assertListEqual(sorted(whole_history_df['commit_id'].tolist()), sorted_df['commit_id'].tolist())
+        head_id = self.test_repo.head.target.raw
+        self.assertEqual(1, len(whole_history_df[whole_history_df['commit_id'] == head_id].index))
+
     # TODO: add test for inserted/deleted lines count
 
     def test_repository_name(self):
@@ -92,6 +215,204 @@ class GitHistoryTest(unittest.TestCase):
         self.assertEqual(expected_name, repo.name)
 
 
+class HistoryWindowTest(unittest.TestCase):
+    def setUp(self):
+        self.test_repo = GitTestRepository()
+        builder = self.test_repo.commit_builder
+        self.root_id = builder.set_author("A", "a@a.com", 100).add_file("file1.txt", ["a"]).commit()
+        self.first_id = builder.set_author("B", "b@b.com", 200).append_file("file1.txt", ["b", "c"]).commit()
+        # commit of the branch is older than commits of master
+        branch = self.test_repo.branches.local.create('branch', self.test_repo.head.peel())
+        self.test_repo.checkout(branch)
+        self.branch_id = builder.set_author("C", "c@c.com", 150).add_file("file2.txt", ["d"]).commit()
+        self.test_repo.checkout(self.test_repo.branches.get('master'))
+        self.second_id = builder.set_author("A", "a@a.com", 300).append_file("file1.txt", ["e"]).commit()
+        self.test_repo.merge(self.branch_id)
+        signature = Signature("B", "b@b.com", 400, 0)
+        self.merge_id = self.test_repo.create_commit('HEAD', signature, signature, "Merge 'branch' into 'master'",
+                                                     self.test_repo.index.write_tree(),
+                                                     [self.second_id, self.branch_id])
+
+    def fetch(self, window: HistoryWindow, backend_class=Pygit2HistoryBackend):
+        backend = backend_class(self.test_repo, window=window)
+        whole_history = WholeHistory(self.test_repo, scanner=backend.scanner, diff_stats=backend.diff_stats)
+        linear_history = LinearHistory(self.test_repo, scanner=backend.scanner, diff_stats=backend.diff_stats)
+        whole_history_df = whole_history.as_dataframe()
+        linear_history_df = linear_history.as_dataframe()
+        return whole_history_df, linear_history_df, backend.scanner
+
+    def assertCommits(self, expected_ids, df):
+        self.assertListEqual([commit_id.raw for commit_id in expected_ids], df['commit_id'].tolist())
+
+    def test_unbounded_window(self):
+        for backend_class in (Pygit2HistoryBackend, GitLogHistoryBackend):
+            whole_history_df, linear_history_df, scanner = self.fetch(HistoryWindow(), backend_class)
+            self.assertEqual(5, len(whole_history_df.index))
+            self.assertCommits([self.merge_id, self.second_id, self.first_id, self.root_id], linear_history_df)
+            self.assertIsNone(scanner.base_commit_id)
+
+    def test_since(self):
+        for backend_class in (Pygit2HistoryBackend, GitLogHistoryBackend):
+            whole_history_df, linear_history_df, scanner = self.fetch(HistoryWindow(since=180), backend_class)
+            # the branch's commit is older than the window
+            self.assertCountEqual([self.merge_id.raw, self.second_id.raw, self.first_id.raw],
+                                  whole_history_df['commit_id'].tolist())
+            self.assertCommits([self.merge_id, self.second_id, self.first_id], linear_history_df)
+            self.assertEqual(self.root_id, scanner.base_commit_id)
+            # the oldest commit of the window is diffed against its parent out of the window
+            self.assertListEqual([2, 1, 1], linear_history_df['files_count'].tolist())
+            self.assertListEqual([2], whole_history_df.loc[
+                whole_history_df['commit_id'] == self.first_id.raw, 'insertions'].tolist())
+
+    def test_ancestors_of_old_commits_are_hidden(self):
+        whole_history_df, _, scanner = self.fetch(HistoryWindow(since=250))
+        self.assertCountEqual([self.merge_id.raw, self.second_id.raw], whole_history_df['commit_id'].tolist())
+        self.assertEqual(self.first_id, scanner.base_commit_id)
+
+        # commit with a wrong clock hides its ancestors even if they are within the time range
+        builder = self.test_repo.commit_builder
+        skewed_commit_id = builder.set_author("C", "c@c.com", 50).add_file("file3.txt", ["f"]).commit()
+        builder.set_author("C", "c@c.com", 500).append_file("file3.txt", ["g"]).commit()
+        for backend_class in (Pygit2HistoryBackend, GitLogHistoryBackend):
+            whole_history_df, _, scanner = self.fetch(HistoryWindow(since=250), backend_class)
+            self.assertEqual(1, len(whole_history_df.index))
+            self.assertEqual(skewed_commit_id, scanner.base_commit_id)
+
+    def test_until(self):
+        for backend_class in (Pygit2HistoryBackend, GitLogHistoryBackend):
+            whole_history_df, linear_history_df, scanner = self.fetch(HistoryWindow(until=350), backend_class)
+            self.assertEqual(4, len(whole_history_df.index))
+            self.assertNotIn(self.merge_id.raw, whole_history_df['commit_id'].tolist())
+            # first-parent chain is followed through the commit out of the window
+            self.assertCommits([self.second_id, self.first_id, self.root_id], linear_history_df)
+            self.assertIsNone(scanner.base_commit_id)
+
+    def test_max_commits(self):
+        for backend_class in (Pygit2HistoryBackend, GitLogHistoryBackend):
+            whole_history_df, linear_history_df, scanner = self.fetch(HistoryWindow(max_commits=2), backend_class)
+            self.assertEqual(2, len(whole_history_df.index))
+            self.assertEqual(2, scanner.commits_count)
+            self.assertEqual(self.merge_id.raw, linear_history_df['commit_id'].iloc[0])
+            # the most recent commits are taken by commit time, the branch's commit is older than master's ones
+            whole_history_df, linear_history_df, _ = self.fetch(HistoryWindow(max_commits=3), backend_class)
+            self.assertCountEqual([self.merge_id.raw, self.second_id.raw, self.first_id.raw],
+                                  whole_history_df['commit_id'].tolist())
+            self.assertCommits([self.merge_id, self.second_id, self.first_id], linear_history_df)
+
+    def test_empty_window_is_rejected(self):
+        for window in (HistoryWindow(since=1000), HistoryWindow(until=50)):
+            with self.assertRaises(ValueError):
+                GitRepository(self.test_repo.location, history_window=window)
+
+    def test_repository_lines_count_in_window(self):
+        path = self.test_repo.location
+        lines_count = GitRepository(path).total_lines_count
+        windowed_repository = GitRepository(path, history_window=HistoryWindow(since=250))
+        self.assertEqual(2, windowed_repository.total_commits_count)
+        # lines of the tree the window starts from are counted in
+        self.assertEqual(3, windowed_repository.history_base_lines_count)
+        self.assertEqual(lines_count, windowed_repository.total_lines_count)
+        self.assertEqual(lines_count, windowed_repository.linear_history('D')['lines_count'].iloc[-1])
+
+
+class PathFilterDataTest(unittest.TestCase):
+    def setUp(self):
+        self.test_repo = GitTestRepository()
+        self.test_repo.commit_builder \
+            .set_author("John Doe", "john@doe.com") \
+            .add_file(filename="main.c", content=["a", "b"]) \
+            .add_file(filename="yarn.lock", content=["x", "y", "z"]) \
+            .commit()
+        self.test_repo.commit_builder \
+            .set_author("John Doe", "john@doe.com") \
+            .append_file(filename="yarn.lock", content=["w"]) \
+            .commit()
+        self.test_repo.commit_builder \
+            .set_author("Author Author", "author@author.net") \
+            .append_file(filename="main.c", content=["c"]) \
+            .add_file(filename="package.lock", content=["v"]) \
+            .commit()
+        self.path_filter = PathFilter(self.test_repo, exclude=['*.lock'])
+
+    def test_excluded_files_are_not_diffed(self):
+        for backend_class in (Pygit2HistoryBackend, GitLogHistoryBackend):
+            backend = backend_class(self.test_repo, path_filter=self.path_filter)
+            whole_history = WholeHistory(self.test_repo, scanner=backend.scanner, diff_stats=backend.diff_stats)
+            linear_history = LinearHistory(self.test_repo, scanner=backend.scanner, diff_stats=backend.diff_stats)
+            whole_history_df = whole_history.as_dataframe()
+            linear_history_df = linear_history.as_dataframe()
+            self.assertListEqual([1, 0, 2], whole_history_df['insertions'].tolist(), backend_class.name)
+            self.assertListEqual([1, 1, 1], linear_history_df['files_count'].tolist(), backend_class.name)
+
+    def test_files_count_of_tree_out_of_window(self):
+        backend = Pygit2HistoryBackend(self.test_repo, window=HistoryWindow(max_commits=1),
+                                       path_filter=self.path_filter)
+        linear_history = LinearHistory(self.test_repo, scanner=backend.scanner, diff_stats=backend.diff_stats)
+        self.assertListEqual([1], linear_history.as_dataframe()['files_count'].tolist())
+
+    def test_excluded_files_are_not_blamed_or_counted(self):
+        files_df = FilesData(self.test_repo, path_filter=self.path_filter).as_dataframe()
+        self.assertListEqual(['main.c'], files_df['file'].tolist())
+        self.assertListEqual([3], files_df['lines_count'].tolist())
+        blame_df = BlameData(self.test_repo, path_filter=self.path_filter).as_dataframe()
+        self.assertListEqual(['main.c'], blame_df['filepath'].unique().tolist())
+
+    def test_repository_lines_count(self):
+        repository = GitRepository(self.test_repo.location, exclude=['*.lock'])
+        self.assertEqual(3, repository.total_lines_count)
+        self.assertEqual(1, repository.head.files_count)
+
+
+class DiffCostGuardTest(unittest.TestCase):
+    def setUp(self):
+        self.test_repo = GitTestRepository()
+        self.test_repo.commit_builder \
+            .set_author("John Doe", "john@doe.com") \
+            .add_file(filename="a.txt", content=["a", "b"]) \
+            .commit()
+        # the giant commit: 3 files changed, 18 bytes of changed files' versions
+        self.test_repo.commit_builder \
+            .set_author("John Doe", "john@doe.com") \
+            .add_file(filename="a.txt", content=["x", "y", "z"]) \
+            .add_file(filename="b.txt", content=["1", "2", "3"]) \
+            .add_file(filename="c.txt", content=["4"]) \
+            .commit()
+        self.test_repo.commit_builder \
+            .set_author("Author Author", "author@author.net") \
+            .append_file(filename="c.txt", content=["5"]) \
+            .commit()
+
+    def fetch(self, backend_class, cost_guard: DiffCostGuard):
+        backend = backend_class(self.test_repo, cost_guard=cost_guard)
+        whole_history = WholeHistory(self.test_repo, scanner=backend.scanner, diff_stats=backend.diff_stats)
+        linear_history = LinearHistory(self.test_repo, scanner=backend.scanner, diff_stats=backend.diff_stats)
+        return whole_history.as_dataframe(), linear_history.as_dataframe()
+
+    def test_giant_commit_is_estimated(self):
+        for backend_class in (Pygit2HistoryBackend, GitLogHistoryBackend):
+            for cost_guard in (DiffCostGuard(max_files=2), DiffCostGuard(max_bytes=10)):
+                whole_history_df, linear_history_df = self.fetch(backend_class, cost_guard)
+                message = f"{backend_class.name}: {cost_guard.options}"
+                self.assertListEqual([False, True, False], whole_history_df['is_diff_estimated'].tolist(), message)
+                self.assertListEqual([False, True, False], linear_history_df['is_diff_estimated'].tolist(), message)
+                # a.txt's change is estimated by the change of its lines count, added files are counted exactly
+                self.assertListEqual([1, 5, 2], whole_history_df['insertions'].tolist(), message)
+                self.assertListEqual([0, 0, 0], whole_history_df['deletions'].tolist(), message)
+                self.assertListEqual([3, 3, 1], linear_history_df['files_count'].tolist(), message)
+
+    def test_commits_within_limits_are_diffed(self):
+        for backend_class in (Pygit2HistoryBackend, GitLogHistoryBackend):
+            whole_history_df, _ = self.fetch(backend_class, DiffCostGuard(max_files=3, max_bytes=18))
+            self.assertFalse(whole_history_df['is_diff_estimated'].any(), backend_class.name)
+            self.assertListEqual([1, 7, 2], whole_history_df['insertions'].tolist(), backend_class.name)
+            self.assertListEqual([0, 2, 0], whole_history_df['deletions'].tolist(), backend_class.name)
+
+    def test_repository_estimated_commits_count(self):
+        repository = GitRepository(self.test_repo.location, max_diff_files=2)
+        self.assertEqual(1, repository.estimated_commits_count)
+        self.assertEqual(8, repository.total_lines_count)
+
+
 class GitSnapshotTest(unittest.TestCase):
     def setUp(self):
         self.test_repo = GitTestRepository()
@@ -127,15 +448,15 @@ class GitSnapshotTest(unittest.TestCase):
             .commit()
 
     @staticmethod
-    def records_for_author(snapshot_data):
+    def records_for_author(blame_data):
         recs = defaultdict(list)
-        for name, lines, time, file in snapshot_data:
-            recs[name].append((lines, file))
+        blame_df = blame_data.as_dataframe()
+        for committer_name, lines, file in zip(blame_df['committer_name'], blame_df['lines_count'], blame_df['filepath']):
+            recs[committer_name].append((lines, file))
         return recs
 
     def test_blame_records_content(self):
-        snapshot_data = BlameData(self.test_repo).fetch()
-        recs = self.records_for_author(snapshot_data)
+        recs = self.records_for_author(BlameData(self.test_repo))
         self.assertCountEqual(recs["Jack Dau"], [(2, 'jacksfile.txt')])
         self.assertCountEqual(recs["John Snow"], [(3, 'jacksfile.txt'), (1, 'johnsfile.txt')])
         self.assertCountEqual(recs["John Doe"], [(1, 'jd.dat')])
@@ -147,10 +468,25 @@ class GitSnapshotTest(unittest.TestCase):
         with open(os.path.join(self.test_repo.location, ".mailmap"), 'w') as mm:
             mm.write(f"{real_author[0]} <{real_author[1]}> "
                      f"{pseudo_author[0]} <{pseudo_author[1]}>")
-        snapshot_data = BlameData(self.test_repo).fetch()
-        recs = self.records_for_author(snapshot_data)
+        recs = self.records_for_author(BlameData(self.test_repo))
         self.assertCountEqual(recs["John Snow"], [(3, 'jacksfile.txt'), (1, 'johnsfile.txt'), (1, 'jd.dat')])
 
+    def test_blame_and_history_share_authors_ids(self):
+        identities = AuthorIdentities(self.test_repo)
+        with patch('analysis.gitdata.map_signature', wraps=map_signature) as map_signature_mock:
+            history_df = WholeHistory(self.test_repo, identities=identities).as_dataframe()
+            blame_df = BlameData(self.test_repo, identities=identities).as_dataframe()
+            # each of 5 distinct authors is mapped once
+            self.assertEqual(5, map_signature_mock.call_count)
+
+        history_ids = dict(zip(history_df['author_name'], history_df['author_name'].cat.codes))
+        blame_ids = dict(zip(blame_df['committer_name'], blame_df['committer_name'].cat.codes))
+        self.assertDictEqual(history_ids, blame_ids)
+        # blame data and history data are joined by authors' integer ids
+        joined_df = blame_df.assign(author_id=blame_df['committer_name'].cat.codes).merge(
+            history_df[['author_name']].assign(author_id=history_df['author_name'].cat.codes), on='author_id')
+        self.assertTrue((joined_df['committer_name'] == joined_df['author_name']).all())
+
     def test_files_records_content(self):
         files_data = FilesData(self.test_repo)._fetch()
         expected_files_data = {
@@ -169,6 +505,135 @@ class GitSnapshotTest(unittest.TestCase):
             file_abs_path = os.path.join(self.test_repo.location, filename)
             self.assertEqual(os.stat(file_abs_path).st_size, file_data["size_bytes"])
 
+    def test_blamed_commits_are_resolved_by_history(self):
+        blame_df = BlameData(self.test_repo).as_dataframe()
+        history = WholeHistory(self.test_repo)
+        with patch.object(GitTestRepository, '__getitem__', autospec=True,
+                          side_effect=GitTestRepository.__getitem__) as getitem_mock:
+            history_blame_df = BlameData(self.test_repo, history=history).as_dataframe()
+            # commits are looked up while history is scanned only
+            self.assertEqual(0, len([call for call in getitem_mock.call_args_list
+                                     if isinstance(call.args[1], pygit2.Oid)]))
+        # authors' ids differ as history has been scanned before blame
+        self.assertListEqual(blame_df.astype(str).values.tolist(), history_blame_df.astype(str).values.tolist())
+
+        # commits out of history's window are read from the repository
+        windowed_history = WholeHistory(self.test_repo, scanner=CommitsScanner(self.test_repo,
+                                                                               HistoryWindow(max_commits=1)))
+        windowed_blame_df = BlameData(self.test_repo, history=windowed_history).as_dataframe()
+        self.assertListEqual(blame_df.astype(str).values.tolist(), windowed_blame_df.astype(str).values.tolist())
+
+    def test_parallel_blame_equals_serial_one(self):
+        serial_blame_df = BlameData(self.test_repo).as_dataframe()
+        blame_data = BlameData(self.test_repo, jobs=2)
+        pd.testing.assert_frame_equal(serial_blame_df, blame_data.as_dataframe())
+        self.assertListEqual([], blame_data.failed_paths)
+
+    def test_blame_timeout(self):
+        def slow_blame_file(repository, file_path, oldest_commit_id, newest_commit_id):
+            if file_path == 'jacksfile.txt':
+                time.sleep(30)
+            return blame_file(repository, file_path, oldest_commit_id, newest_commit_id)
+
+        # worker processes are forked, so they blame files with the patched function
+        with patch('analysis.gitdata.blame_file', side_effect=slow_blame_file):
+            blame_data = BlameData(self.test_repo, jobs=2, timeout=1)
+            with self.assertWarnsRegex(UserWarning, r"Files not blamed \(1\): jacksfile\.txt \(blame has taken"):
+                blame_df = blame_data.as_dataframe()
+        self.assertListEqual(['jacksfile.txt'], blame_data.failed_paths)
+        self.assertCountEqual(['abc.doc', 'jd.dat', 'johnsfile.txt', 'xxx.xxx'], blame_df['filepath'].unique())
+
+    def test_files_and_blame_share_snapshot(self):
+        with patch.object(RevisionSnapshot, '_scan', autospec=True, side_effect=RevisionSnapshot._scan) as scan_mock:
+            revision = GitRevision(self.test_repo)
+            blamed_files = revision.get_top_files_by_contributors_count().index.tolist()
+            self.assertEqual(1, scan_mock.call_count)
+        # files' table gives blame its list of text files
+        self.assertCountEqual(revision.files_data[~revision.files_data['is_binary']]['file'].tolist(), blamed_files)
+
+
+class WindowedBlameTest(unittest.TestCase):
+    def setUp(self):
+        self.test_repo = GitTestRepository()
+        year_ago = int(time.time()) - 365 * 24 * 3600
+        self.test_repo.commit_builder \
+            .set_author("Jack Dau", "jack@dau.org", year_ago) \
+            .add_file(filename="file.txt", content=["a", "b", "c"]) \
+            .add_file(filename="old.txt", content=["d"]) \
+            .commit()
+        self.old_commit_id = self.test_repo.commit_builder \
+            .set_author("John Snow", "john@snow.com", year_ago + 3600) \
+            .append_file(filename="file.txt", content=["e"]) \
+            .commit()
+        self.test_repo.commit_builder \
+            .set_author("John Doe", "john@doe.com") \
+            .append_file(filename="file.txt", content=["f", "g"]) \
+            .commit()
+
+    def test_blame_boundary(self):
+        head_commit = self.test_repo.head.peel()
+        self.assertEqual(self.old_commit_id, find_blame_boundary(self.test_repo, head_commit, int(time.time()) - 3600))
+        self.assertIsNone(find_blame_boundary(self.test_repo, head_commit, 0))
+
+    def test_blame_window_starts_with_month(self):
+        # runs within a month share the boundary, so that cached blame is reused
+        for day in ['2024-05-01', '2024-05-17', '2024-05-31T23:59']:
+            self.assertEqual(int(pd.Timestamp('2023-11-01', tz='UTC').timestamp()),
+                             get_blame_window_start(6, pd.Timestamp(day, tz='UTC')))
+
+    def test_old_lines_have_no_committer(self):
+        blame_df = BlameData(self.test_repo, oldest_commit_id=self.old_commit_id).as_dataframe()
+        unknown_df = blame_df[blame_df['committer_name'].isna()]
+        # old lines are older than any period, whatever the oldest blamed commit's time is
+        self.assertCountEqual([(4, 0, 'file.txt'), (1, 0, 'old.txt')],
+                              zip(unknown_df['lines_count'], unknown_df['timestamp'], unknown_df['filepath']))
+        self.assertEqual(7, blame_df['lines_count'].sum())
+
+    def test_knowledge_metrics_equal_full_blame_ones(self):
+        revision = GitRevision(self.test_repo)
+        windowed_revision = GitRevision(self.test_repo, oldest_blamed_commit_id=self.old_commit_id)
+        self.assertEqual(revision.get_lost_knowledge_percentage(), windowed_revision.get_lost_knowledge_percentage())
+        self.assertListEqual(revision.get_top_knowledge_carriers().to_dict('records'),
+                             windowed_revision.get_top_knowledge_carriers().to_dict('records'))
+        self.assertDictEqual({'John Doe': 2}, windowed_revision.authors_contribution.to_dict())
+
+
+
+class SampledBlameTest(unittest.TestCase):
+    def setUp(self):
+        self.test_repo = GitTestRepository()
+        builder = self.test_repo.commit_builder.set_author("Jack Dau", "jack@dau.org")
+        for i in range(6):
+            builder.add_file(filename="file%d.txt" % i, content=["a%d" % j for j in range(i + 1)])
+        builder.add_file(filename="module.py", content=["import os"])
+        builder.commit()
+        self.test_repo.commit_builder \
+            .set_author("John Doe", "john@doe.com") \
+            .append_file(filename="file5.txt", content=["b", "c"]) \
+            .append_file(filename="module.py", content=["import sys"]) \
+            .commit()
+
+    def test_sample_of_all_files_equals_full_blame(self):
+        revision = GitRevision(self.test_repo)
+        sampled_revision = GitRevision(self.test_repo, blame_sample_size=7)
+        self.assertIsNone(sampled_revision.blame_sample)
+        self.assertDictEqual(revision.authors_contribution.to_dict(), sampled_revision.authors_contribution.to_dict())
+
+    def test_sampled_blame(self):
+        blame_data = BlameData(self.test_repo, sample_size=3, sample_seed=1)
+        blame_df = blame_data.as_dataframe()
+        self.assertEqual(3, len(blame_data.sample.files))
+        self.assertSetEqual(set(blame_data.sample.paths), set(blame_df['filepath']))
+
+        revision = GitRevision(self.test_repo, blame_sample_size=3, blame_sample_seed=1)
+        # estimates are extrapolated to all lines of text files
+        self.assertAlmostEqual(25, revision.authors_contribution.sum(), delta=1)
+        low, high = revision.get_lost_knowledge_confidence_interval()
+        self.assertLessEqual(low, high)
+        intervals = revision.get_authors_contribution_confidence_intervals()
+        self.assertListEqual(['low', 'high'], intervals.columns.tolist())
+        self.assertListEqual(['committer_name', 'lines_count', 'low', 'high'],
+                             revision.get_top_knowledge_carriers().columns.tolist())
 
 class IncompleteSignaturesTest(unittest.TestCase):
 
@@ -252,11 +717,11 @@ class TagsDataTest(unittest.TestCase):
             .set_author("Incognito", "j@anonimous.net").add_file() \
             .commit()
 
-        tags_data = TagsData(test_repo).fetch()
+        tags_names = TagsData(test_repo).fetch()['tag_name'].tolist()
 
-        self.assertEqual(4, len([x for x in tags_data if x['tag_name'] == 'v1']))
-        self.assertEqual(1, len([x for x in tags_data if x['tag_name'] == 'v2']))
-        self.assertEqual(1, len([x for x in tags_data if x['tag_name'] is None]))
+        self.assertEqual(4, tags_names.count('v1'))
+        self.assertEqual(1, tags_names.count('v2'))
+        self.assertEqual(1, tags_names.count(None))
 
     def test_unannotated_tag(self):
         test_repo = GitTestRepository()
@@ -269,7 +734,94 @@ class TagsDataTest(unittest.TestCase):
         # this creates an unannotated tag (symbolic tag)
         test_repo.references.create('refs/tags/version1', oid)
         tags_data = TagsData(test_repo).fetch()
-        self.assertEqual(1, len(tags_data))
-        tag_data = tags_data[0]
-        self.assertIsNone(tag_data['tagger_name'])
-        self.assertEqual(-1, tag_data['tagger_time'])
+        self.assertEqual(1, len(tags_data['tag_name']))
+        self.assertEqual('version1', tags_data['tag_name'][0])
+        self.assertIsNone(tags_data['tagger_name'][0])
+        self.assertEqual(-1, tags_data['tagger_time'][0])
+
+    def test_commits_are_assigned_by_reachability(self):
+        test_repo = GitTestRepository()
+        test_repo.commit_builder \
+            .set_author("John Doe", "john@doe.com", 1000) \
+            .add_file(filename="a.txt", content=["a"]) \
+            .commit()
+        branch = test_repo.branches.local.create('side_branch', test_repo.head.peel())
+        test_repo.checkout(branch)
+        side_oid = test_repo.commit_builder \
+            .set_author("Author Author", "author@author.net", 2000) \
+            .add_file(filename="b.txt", content=["b"]) \
+            .commit()
+        test_repo.checkout(test_repo.branches.get('master'))
+        v1_oid = test_repo.commit_builder \
+            .set_author("Jack Johns", "jack@johns.com", 3000) \
+            .add_file(filename="c.txt", content=["c"]) \
+            .commit()
+        test_repo.references.create('refs/tags/v1', v1_oid)
+        # side branch is merged after v1, so its commit is released by v2 whatever the order of the walk is
+        test_repo.merge(side_oid)
+        author = Signature("name", "email", 4000, 0)
+        v2_oid = test_repo.create_commit('HEAD', author, author, "Merge 'side_branch' into 'master'",
+                                         test_repo.index.write_tree(), [test_repo.head.target, side_oid])
+        test_repo.create_tag("v2", str(v2_oid), pygit2.GIT_OBJ_COMMIT, Signature('John Doe', 'jdoe@example.com'),
+                             "v2 tag")
+
+        tags_data = TagsData(test_repo)
+        self.assertListEqual(['v1', 'v2'], [tag.name for tag in tags_data.tags])
+        records = tags_data.fetch()
+        self.assertDictEqual({1000: 'v1', 2000: 'v2', 3000: 'v1', 4000: 'v2'},
+                             dict(zip(records['commit_time'].tolist(), records['tag_name'].tolist())))
+        # releases are listed from the latest one
+        self.assertListEqual(['v2', 'v2', 'v1', 'v1'], records['tag_name'].tolist())
+
+    def test_tags_are_ordered_topologically(self):
+        test_repo = GitTestRepository()
+        # 'v1a' is an ancestor of 'v1' committed at the same time
+        v1a_oid = test_repo.commit_builder \
+            .set_author("John Doe", "john@doe.com", 1000) \
+            .add_file(filename="a.txt", content=["a"]) \
+            .commit()
+        test_repo.references.create('refs/tags/v1a', v1a_oid)
+        v1_oid = test_repo.commit_builder \
+            .set_author("John Doe", "john@doe.com", 1000) \
+            .add_file(filename="b.txt", content=["b"]) \
+            .commit()
+        test_repo.references.create('refs/tags/v1', v1_oid)
+        # a descendant committed with a wrong clock
+        skewed_oid = test_repo.commit_builder \
+            .set_author("John Doe", "john@doe.com", 500) \
+            .add_file(filename="c.txt", content=["c"]) \
+            .commit()
+        for name in ['release-10', 'release-9']:
+            test_repo.references.create(f'refs/tags/{name}', skewed_oid)
+
+        tags_data = TagsData(test_repo)
+        self.assertListEqual(['v1a', 'v1', 'release-9', 'release-10'], [tag.name for tag in tags_data.tags])
+        records = tags_data.fetch()
+        self.assertListEqual(['release-9', 'v1', 'v1a'], records['tag_name'].tolist())
+
+    def test_tag_off_head_history(self):
+        test_repo = GitTestRepository()
+        v1_oid = test_repo.commit_builder \
+            .set_author("John Doe", "john@doe.com", 1000) \
+            .add_file(filename="a.txt", content=["a"]) \
+            .commit()
+        test_repo.references.create('refs/tags/v1', v1_oid)
+        branch = test_repo.branches.local.create('release', test_repo.head.peel())
+        test_repo.checkout(branch)
+        fix_oid = test_repo.commit_builder \
+            .set_author("Author Author", "author@author.net", 2000) \
+            .add_file(filename="a.txt", content=["b"]) \
+            .commit()
+        test_repo.create_tag("v1.1", str(fix_oid), pygit2.GIT_OBJ_COMMIT, Signature('John Doe', 'jdoe@example.com'),
+                             "v1.1 tag")
+        test_repo.checkout(test_repo.branches.get('master'))
+        test_repo.commit_builder \
+            .set_author("Jack Johns", "jack@johns.com", 3000) \
+            .add_file(filename="c.txt", content=["c"]) \
+            .commit()
+
+        records = TagsData(test_repo).as_dataframe()
+        self.assertDictEqual({None: 3000, 'v1.1': 2000, 'v1': 1000},
+                             dict(zip(records['tag_name'], records['commit_time'])))
+        self.assertEqual('Author Author', records.loc[records['tag_name'] == 'v1.1', 'commit_author'].item())
+        self.assertEqual('John Doe', records.loc[records['tag_name'] == 'v1.1', 'tagger_name'].item())
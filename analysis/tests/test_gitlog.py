@@ -0,0 +1,133 @@
+import unittest
+import subprocess
+from pygit2 import Signature
+
+from analysis.gitdata import WholeHistory, LinearHistory, TagsData, Pygit2HistoryBackend
+from analysis.gitlog import GitLogHistoryBackend, parse_log
+from analysis.tests.gitrepository import GitTestRepository
+
+
+class GitLogParserTest(unittest.TestCase):
+    log_output = [
+        b'commit ' + b'b' * 40 + b'\n',
+        b'tree ' + b'f' * 40 + b'\n',
+        b'parent ' + b'a' * 40 + b'\n',
+        'author Jürgen <j@x.de> 1580000000 -0130\n'.encode('latin-1'),
+        b'committer Committer <c@x.de> 1580000100 +0000\n',
+        b'encoding ISO-8859-1\n',
+        b'\n',
+        b'    Message\n',
+        b'    1\t2\tnot a stats line\n',
+        b'\n',
+        b'3\t1\tfile.txt\n',
+        b'-\t-\timage.png\n',
+        b'0\t2\told.txt\n',
+        b' create mode 100644 image.png\n',
+        b' delete mode 100644 old.txt\n',
+        b'commit ' + b'c' * 40 + b'\n',
+        b'tree ' + b'f' * 40 + b'\n',
+        b'parent ' + b'a' * 40 + b'\n',
+        b'parent ' + b'b' * 40 + b'\n',
+        b'author Empty <> 1580000200 +0000\n',
+        b'committer Empty <> 1580000200 +0000\n',
+        b'\n',
+        b'    Merge\n',
+        b'commit ' + b'a' * 40 + b'\n',
+        b'tree ' + b'f' * 40 + b'\n',
+        b'author Root <root@x.de> 1570000000 +0200\n',
+        b'committer Root <root@x.de> 1570000000 +0200\n',
+        b'gpgsig -----BEGIN PGP SIGNATURE-----\n',
+        b' create mode 100644 signature\n',
+        b' -----END PGP SIGNATURE-----\n',
+        b'\n',
+        b'    Root\n',
+        b'\n',
+        b'1\t0\tREADME\n',
+        b' create mode 100644 README\n',
+    ]
+
+    def test_commits_and_stats(self):
+        (commit, stats), (merge_commit, merge_stats), (root_commit, root_stats) = parse_log(self.log_output)
+
+        self.assertEqual('b' * 40, str(commit.id))
+        self.assertListEqual(['a' * 40], [str(parent_id) for parent_id in commit.parent_ids])
+        # signature is decoded with commit's encoding
+        self.assertEqual('Jürgen', commit.author.name)
+        self.assertEqual(1580000000, commit.author.time)
+        self.assertEqual(-90, commit.author.offset)
+        self.assertEqual(1580000100, commit.committer.time)
+        # binary file's lines are not counted, one file is created and one deleted
+        self.assertListEqual([3, 3, 0], stats.tolist())
+
+        # merge commits are not diffed
+        self.assertEqual(2, len(merge_commit.parent_ids))
+        self.assertEqual('', merge_commit.author.email)
+        self.assertIsNone(merge_stats)
+
+        self.assertListEqual([], root_commit.parent_ids)
+        self.assertEqual(120, root_commit.author.offset)
+        self.assertListEqual([1, 0, 1], root_stats.tolist())
+
+
+class GitLogHistoryBackendTest(unittest.TestCase):
+    def setUp(self):
+        self.test_repo = GitTestRepository()
+        self.test_repo.commit_builder \
+            .set_author("John Doe", "john@doe.com") \
+            .add_file(filename="file1.txt", content=["a", "b"]) \
+            .commit()
+        branch = self.test_repo.branches.local.create('second_branch', self.test_repo.head.peel())
+        self.test_repo.checkout(branch)
+        self.test_repo.commit_builder \
+            .set_author("Author Author", "author@author.net") \
+            .add_file(filename="file2.txt", content=["c", "d", "e"]) \
+            .commit()
+        self.test_repo.checkout(self.test_repo.branches.get('master'))
+        self.test_repo.commit_builder \
+            .set_author("John Doe", "john@doe.com") \
+            .append_file(filename="file1.txt", content=["f"]) \
+            .commit()
+        self.test_repo.merge(self.test_repo.branches.get('second_branch').peel().id)
+        author = Signature("name", "email")
+        self.test_repo.create_commit('HEAD', author, author, "Merge 'second_branch' into 'master'",
+                                     self.test_repo.index.write_tree(),
+                                     [self.test_repo.head.target, self.test_repo.branches.get('second_branch').peel().id])
+        self.test_repo.create_tag('v1', self.test_repo.head.target, 1, author, "Tag v1")
+
+    def fetch(self, backend):
+        whole_history = WholeHistory(self.test_repo, scanner=backend.scanner, diff_stats=backend.diff_stats)
+        linear_history = LinearHistory(self.test_repo, scanner=backend.scanner, diff_stats=backend.diff_stats)
+        tags_data = TagsData(self.test_repo, scanner=backend.scanner)
+        whole_history_df = whole_history.as_dataframe().sort_values(by='commit_id').reset_index(drop=True)
+        linear_history_df = linear_history.as_dataframe()
+        return whole_history_df, linear_history_df, tags_data.fetch()
+
+    def test_backends_give_equal_histories(self):
+        whole_history_df, linear_history_df, tags_records = self.fetch(Pygit2HistoryBackend(self.test_repo))
+        backend = GitLogHistoryBackend(self.test_repo)
+        git_whole_history_df, git_linear_history_df, git_tags_records = self.fetch(backend)
+
+        self.assertListEqual(whole_history_df.columns.tolist(), git_whole_history_df.columns.tolist())
+        for column in whole_history_df.columns:
+            self.assertListEqual(whole_history_df[column].tolist(), git_whole_history_df[column].tolist(), column)
+        for column in linear_history_df.columns:
+            self.assertListEqual(linear_history_df[column].tolist(), git_linear_history_df[column].tolist(), column)
+        self.assertListEqual(sorted(tags_records, key=str), sorted(git_tags_records, key=str))
+        # only the merge commit of the first-parent chain is diffed after `git log`
+        self.assertEqual(1, backend.diff_stats.diffs_count)
+
+    def test_metadata_only_walk(self):
+        whole_history_df, linear_history_df, _ = self.fetch(Pygit2HistoryBackend(self.test_repo))
+        backend = GitLogHistoryBackend(self.test_repo, prefetch_diffs=False)
+        git_whole_history_df, git_linear_history_df, _ = self.fetch(backend)
+        # all 3 non-merge commits are diffed once for both histories, and the merge commit for linear history
+        self.assertEqual(4, backend.diff_stats.diffs_count)
+        self.assertListEqual(whole_history_df['insertions'].tolist(), git_whole_history_df['insertions'].tolist())
+        self.assertListEqual(linear_history_df['files_count'].tolist(), git_linear_history_df['files_count'].tolist())
+
+    def test_incomplete_signature(self):
+        self.test_repo.commit_builder.add_file(filename="file3.txt", content=["g"])
+        subprocess.run(['git', 'commit', '-m', 'No-email author', '--author', 'Author NoEmail <>'],
+                       cwd=self.test_repo.location, check=True)
+        whole_history_df, _, _ = self.fetch(GitLogHistoryBackend(self.test_repo))
+        self.assertIn("empty@empty.empty", whole_history_df['author_email'].tolist())
@@ -1,18 +1,21 @@
 import unittest
 from unittest.mock import patch, MagicMock
 
-from analysis.gitdata import BlameData, FilesData
-from analysis.gitrevision import GitRevision
+import numpy as np
+import pandas as pd
+
+from analysis.gitdata import BlameData, FilesData, find_blame_boundary, get_blame_window_start
+from analysis.gitrevision import BlameTimeIndex, GitRevision
+from analysis.tests.gitrepository import GitTestRepository
 
 
 class GitRevisionTest(unittest.TestCase):
-    # "committer_name", "lines_count", "timestamp", "filepath"
-    test_revision_blame_data_records = [
-        ['Author1', 1, 1580666336, "file1.txt"],
-        ['Author2', 2, 1580666146, "file2.txt"],
-        ['Author1', 3, 1583449674, "file3.txt"],
-        ['Author3', 4, 1185807283, "file1.txt"]
-    ]
+    test_revision_blame_data_columns = {
+        "committer_name": pd.Categorical.from_codes([0, 1, 0, 2], categories=['Author1', 'Author2', 'Author3']),
+        "lines_count": np.array([1, 2, 3, 4], dtype=np.int32),
+        "timestamp": np.array([1580666336, 1580666146, 1583449674, 1185807283]),
+        "filepath": pd.Categorical(["file1.txt", "file2.txt", "file3.txt", "file1.txt"]),
+    }
 
     test_revision_files_data_records = [
         {"file": 'file1.txt', "is_binary": False, "size_bytes": 1, "lines_count": 1},
@@ -21,7 +24,7 @@ class GitRevisionTest(unittest.TestCase):
         {"file": 'folder/file4.txt', "is_binary": False, "size_bytes": 16, "lines_count": 4}
     ]
 
-    @patch.object(BlameData, 'fetch', return_value=test_revision_blame_data_records)
+    @patch.object(BlameData, 'fetch', return_value=test_revision_blame_data_columns)
     def test_contribution(self, mock_fetch):
         with patch("pygit2.Mailmap"):
             revision = GitRevision(MagicMock())
@@ -42,3 +45,74 @@ class GitRevisionTest(unittest.TestCase):
                                  {(False, 'dat'): 2, (False, 'log'): 3, (False, 'txt'): 5})
             self.assertDictEqual(revision.files_extensions_summary["files_count"].to_dict(),
                                  {(False, 'dat'): 1, (False, 'log'): 1, (False, 'txt'): 2})
+
+    @patch.object(BlameData, 'fetch', return_value=test_revision_blame_data_columns)
+    def test_knowledge_metrics_of_periods(self, mock_fetch):
+        with patch("pygit2.Mailmap"):
+            revision = GitRevision(MagicMock())
+            revision._lazy_load_blame_data()
+            for months in [3, 6, 12, 24, 12 * 20]:
+                knowing = revision._knowing(months)
+                self.assertAlmostEqual(revision._lost_knowledge_ratio(revision.blame_data['lines_count'], knowing),
+                                       revision.get_lost_knowledge_percentage(months))
+                self.assertDictEqual(
+                    revision._knowledge_carriers(revision.blame_data['lines_count'], knowing).to_dict(),
+                    revision.get_top_knowledge_carriers(months).set_index('committer_name')['lines_count'].to_dict())
+
+    def test_time_index(self):
+        index = BlameTimeIndex(np.array([30, 10, 20, 10]), pd.Categorical.from_codes([0, 1, -1, 0], ['A', 'B', 'C']),
+                               np.array([1, 2, 4, 8]))
+        self.assertEqual(15, index.lines_count)
+        self.assertListEqual([0, 0, 10, 14, 15], [index.get_lines_count_before(t) for t in [0, 10, 11, 25, 40]])
+        self.assertDictEqual({'A': 9, 'B': 2}, index.get_authors_lines_count_since(10).to_dict())
+        self.assertDictEqual({'A': 1}, index.get_authors_lines_count_since(10.5).to_dict())
+        self.assertDictEqual({}, index.get_authors_lines_count_since(31).to_dict())
+
+    @patch.object(BlameData, 'fetch', return_value=test_revision_blame_data_columns)
+    def test_directories_ownership(self, mock_fetch):
+        with patch("pygit2.Mailmap"):
+            revision = GitRevision(MagicMock())
+            directories_ownership = revision.get_directories_ownership()
+            self.assertListEqual(['.'], directories_ownership['directory'].tolist())
+            self.assertListEqual([10], directories_ownership['lines_count'].tolist())
+            self.assertListEqual([2], directories_ownership['bus_factor'].tolist())
+
+
+class WindowedKnowledgeMetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.test_repo = GitTestRepository()
+        now = pd.Timestamp.utcnow()
+        # a commit every month for 3 years
+        for months in range(36, -1, -1):
+            self.test_repo.commit_builder \
+                .set_author(f"Author {months % 3}", f"author{months % 3}@example.com",
+                            int((now - pd.DateOffset(months=months, days=3)).timestamp())) \
+                .append_file(filename=f"file{months % 4}.txt",
+                             content=[f"{months}-{i}" for i in range(months % 5 + 1)]) \
+                .commit()
+
+    def get_revision(self, blame_window_months: int = None) -> GitRevision:
+        oldest_blamed_commit_id = None
+        if blame_window_months is not None:
+            oldest_blamed_commit_id = find_blame_boundary(self.test_repo, self.test_repo.head.peel(),
+                                                          get_blame_window_start(blame_window_months))
+        return GitRevision(self.test_repo, oldest_blamed_commit_id=oldest_blamed_commit_id,
+                           blame_window_months=blame_window_months)
+
+    def test_windowed_ratios_equal_full_blame_ones(self):
+        full_revision = self.get_revision()
+        for blame_window_months in [12, 30, 48]:
+            revision = self.get_revision(blame_window_months)
+            for months in [3, 6, 12, 24, 30]:
+                if months <= blame_window_months:
+                    self.assertAlmostEqual(full_revision.get_lost_knowledge_percentage(months),
+                                           revision.get_lost_knowledge_percentage(months))
+                    self.assertListEqual(
+                        full_revision.get_top_knowledge_carriers(months).astype(str).values.tolist(),
+                        revision.get_top_knowledge_carriers(months).astype(str).values.tolist())
+                else:
+                    self.assertIsNone(revision.get_lost_knowledge_percentage(months))
+                    self.assertIsNone(revision.get_top_knowledge_carriers(months))
+        # window longer than history blames it all
+        self.assertDictEqual(full_revision.authors_contribution.to_dict(),
+                             self.get_revision(48).authors_contribution.to_dict())
@@ -0,0 +1,78 @@
+import time
+import unittest
+
+import pygit2 as git
+
+from analysis.gitdata import BlameData, RevisionSnapshot
+from analysis.gitrepository import GitRepository
+from analysis.ownership import OwnershipHistory
+from analysis.tests.gitrepository import GitTestRepository
+
+
+class OwnershipHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.test_repo = GitTestRepository()
+        year_ago = int(time.time()) - 365 * 24 * 3600
+        first_commit_id = self.test_repo.commit_builder \
+            .set_author("Jack Dau", "jack@dau.org", year_ago) \
+            .add_file(filename="file.txt", content=["a", "b", "c"]) \
+            .add_file(filename="other.txt", content=["d"]) \
+            .commit()
+        self.test_repo.create_reference('refs/tags/v1', first_commit_id)
+        second_commit_id = self.test_repo.commit_builder \
+            .set_author("John Doe", "john@doe.com", year_ago + 200 * 24 * 3600) \
+            .append_file(filename="file.txt", content=["e", "f"]) \
+            .commit()
+        signature = git.Signature("John Doe", "john@doe.com")
+        self.test_repo.create_tag('v2', second_commit_id, git.GIT_OBJ_COMMIT, signature, "Release 2")
+
+    def test_unchanged_files_are_not_blamed_again(self):
+        ownership_history = OwnershipHistory(self.test_repo, ['v1', 'v2'])
+        ownership_df = ownership_history.as_dataframe()
+        # 'other.txt' is reused at 'v2'
+        self.assertEqual(3, ownership_history.blame_cache.misses_count)
+        self.assertEqual(1, ownership_history.blame_cache.hits_count)
+
+        self.assertListEqual(['v1', 'v2'], ownership_df['revision'].cat.categories.tolist())
+        records = {(revision, author, age): lines_count for revision, author, age, lines_count
+                   in ownership_df.itertuples(index=False)}
+        self.assertDictEqual({
+            ('v1', 'Jack Dau', '< 1 month'): 4,
+            ('v2', 'Jack Dau', '6-12 months'): 4,
+            ('v2', 'John Doe', '< 1 month'): 2,
+        }, records)
+
+    def test_ownership_equals_blame_at_revision(self):
+        ownership_df = OwnershipHistory(self.test_repo, ['v1', 'v2']).as_dataframe()
+        for revision in ['v1', 'v2']:
+            blame_df = BlameData(self.test_repo, snapshot=RevisionSnapshot(self.test_repo, revision)).as_dataframe()
+            self.assertDictEqual(
+                blame_df.groupby('committer_name', observed=True)['lines_count'].sum().to_dict(),
+                ownership_df[ownership_df['revision'] == revision]
+                .groupby('author_name', observed=True)['lines_count'].sum().to_dict())
+
+    def test_reverted_change_invalidates_file_blame(self):
+        year_ago = int(time.time()) - 365 * 24 * 3600
+        # 'other.txt' is changed and then restored between the tags, so its blob is the same at both of them
+        self.test_repo.commit_builder \
+            .set_author("Bob", "bob@bob.com", year_ago + 300 * 24 * 3600) \
+            .add_file(filename="other.txt", content=["x"]) \
+            .commit()
+        third_commit_id = self.test_repo.commit_builder \
+            .set_author("Carol", "carol@carol.com", year_ago + 301 * 24 * 3600) \
+            .add_file(filename="other.txt", content=["d"]) \
+            .commit()
+        self.test_repo.create_reference('refs/tags/v3', third_commit_id)
+
+        ownership_history = OwnershipHistory(self.test_repo, ['v2', 'v3'])
+        ownership_df = ownership_history.as_dataframe()
+        # only 'file.txt' is reused at 'v3'
+        self.assertEqual(1, ownership_history.blame_cache.hits_count)
+        v3_df = ownership_df[ownership_df['revision'] == 'v3']
+        self.assertEqual(1, v3_df.loc[v3_df['author_name'] == 'Carol', 'lines_count'].sum())
+
+    def test_tags_ownership(self):
+        repository = GitRepository(self.test_repo.location)
+        ownership_df = repository.get_tags_ownership(1)
+        self.assertListEqual(['v2'], ownership_df['revision'].unique().tolist())
+        self.assertEqual(6, ownership_df['lines_count'].sum())
@@ -0,0 +1,62 @@
+import os
+import unittest
+
+from analysis.pathfilter import PathFilter, matches_pathspec
+from analysis.tests.gitrepository import GitTestRepository
+
+
+class PathspecTest(unittest.TestCase):
+    def test_leading_directory(self):
+        self.assertTrue(matches_pathspec('vendor', 'vendor/lib/a.c'))
+        self.assertTrue(matches_pathspec('vendor/', 'vendor/lib/a.c'))
+        self.assertTrue(matches_pathspec('vendor/lib', 'vendor/lib/a.c'))
+        self.assertTrue(matches_pathspec('a.c', 'a.c'))
+        self.assertFalse(matches_pathspec('vendor', 'vendored/a.c'))
+        self.assertFalse(matches_pathspec('lib', 'vendor/lib/a.c'))
+
+    def test_wildcards_match_slashes(self):
+        self.assertTrue(matches_pathspec('*.lock', 'yarn.lock'))
+        self.assertTrue(matches_pathspec('*.lock', 'web/yarn.lock'))
+        self.assertTrue(matches_pathspec('proto/*.pb.go', 'proto/api/v1/api.pb.go'))
+        self.assertFalse(matches_pathspec('*.lock', 'yarn.lock.txt'))
+
+    def test_root(self):
+        self.assertTrue(matches_pathspec('.', 'a/b.c'))
+
+
+class PathFilterTest(unittest.TestCase):
+    def setUp(self):
+        self.test_repo = GitTestRepository()
+
+    def test_include_and_exclude(self):
+        path_filter = PathFilter(self.test_repo, include=['src', '*.md'], exclude=['src/generated'])
+        self.assertTrue(path_filter.is_active)
+        self.assertListEqual(['src/a.py', 'README.md'],
+                             path_filter.filter(['src/a.py', 'src/generated/b.py', 'README.md', 'setup.py']))
+        self.assertListEqual(['src', '*.md', ':(exclude)src/generated'], path_filter.as_git_pathspecs())
+
+    def test_inactive_filter(self):
+        path_filter = PathFilter(self.test_repo)
+        self.assertFalse(path_filter.is_active)
+        self.assertListEqual(['a', 'b/c'], path_filter.filter(['a', 'b/c']))
+
+    def test_linguist_attributes(self):
+        with open(os.path.join(self.test_repo.location, '.gitattributes'), 'w') as f:
+            f.write("gen/** linguist-generated\n"
+                    "*.lock linguist-vendored=true\n"
+                    "keep.lock -linguist-vendored\n")
+        paths = ['gen/api.pb.go', 'yarn.lock', 'keep.lock', 'main.c']
+        self.assertListEqual(paths, PathFilter(self.test_repo).filter(paths))
+        path_filter = PathFilter(self.test_repo, exclude_generated=True)
+        self.assertListEqual(['keep.lock', 'main.c'], path_filter.filter(paths))
+
+    def test_digest(self):
+        digest = PathFilter(self.test_repo, exclude=['vendor']).get_digest()
+        self.assertEqual(digest, PathFilter(self.test_repo, exclude=['vendor']).get_digest())
+        self.assertNotEqual(digest, PathFilter(self.test_repo, exclude=['vendor', 'gen']).get_digest())
+
+        path_filter = PathFilter(self.test_repo, exclude_generated=True)
+        digest = path_filter.get_digest()
+        with open(os.path.join(self.test_repo.location, '.gitattributes'), 'w') as f:
+            f.write("gen/** linguist-generated\n")
+        self.assertNotEqual(digest, path_filter.get_digest())
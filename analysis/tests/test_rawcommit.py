@@ -0,0 +1,70 @@
+import unittest
+import pygit2 as git
+
+from analysis.rawcommit import parse_commit, parse_signature
+from analysis.tests.gitrepository import GitTestRepository
+
+
+class RawCommitParserTest(unittest.TestCase):
+    # author and committer headers of commits which pygit2 (libgit2) is able to read
+    readable_signatures = {
+        'latin-1 with encoding header': (b'J\xfcrgen <j@x.de> 1500000000 +0200', b'ISO-8859-1'),
+        'latin-1 without encoding header': (b'J\xfcrgen <j@x.de> 1500000000 +0200', None),
+        'no email': (b'Name <> 1500000000 +0200', None),
+        'no name': (b'<a@b> 1500000000 +0200', None),
+        'extra spaces': (b'  Spaced Name   <  sp@x  > 1500000000 -0130', None),
+        'unsigned timezone': (b'N <n@x> 1500000000 0200', None),
+        'too large timezone': (b'N <n@x> 1500000000 +1500', None),
+        'too many minutes': (b'N <n@x> 1500000000 -0075', None),
+        'no time': (b'N <n@x>', None),
+        'angle brackets in name': (b'N <x> <n@x> 1500000000 +0100', None),
+        'punctuation around name and email': (b'"N." <,a@b;> 1500000000 +0100', None),
+    }
+    # signatures which make libgit2 fail to read commit
+    unreadable_signatures = {
+        'invalid time': b'N <n@x> abc +0100',
+        'no angle brackets': b'N n@x 1500000000 +0100',
+    }
+
+    def setUp(self):
+        self.test_repo = GitTestRepository()
+        self.tree_id = self.test_repo.TreeBuilder().write()
+
+    def write_commit(self, raw_signature: bytes, encoding: bytes = None):
+        header = b'tree ' + str(self.tree_id).encode() + b'\n' \
+                 + b'author ' + raw_signature + b'\n' \
+                 + b'committer ' + raw_signature + b'\n'
+        if encoding is not None:
+            header += b'encoding ' + encoding + b'\n'
+        return self.test_repo.odb.write(git.GIT_OBJ_COMMIT, header + b'\nMessage\n'), header
+
+    def test_signatures_are_parsed_as_by_pygit2(self):
+        for case, (raw_signature, encoding) in self.readable_signatures.items():
+            commit_id, header = self.write_commit(raw_signature, encoding)
+            author = self.test_repo[commit_id].author
+            parsed_author = parse_commit(commit_id, header).author
+            self.assertEqual((author.name, author.email, author.time, author.offset), tuple(parsed_author), case)
+
+    def test_malformed_signatures_are_not_parsed(self):
+        for case, raw_signature in self.unreadable_signatures.items():
+            commit_id, header = self.write_commit(raw_signature)
+            with self.assertRaises(ValueError, msg=case):
+                self.test_repo.get(commit_id)
+            with self.assertRaises(ValueError, msg=case):
+                parse_commit(commit_id, header)
+
+    def test_unknown_encoding(self):
+        self.assertEqual('J�rgen', parse_signature(b'J\xfcrgen <j@x.de> 1500000000 +0200', 'bogus').name)
+
+    def test_parents(self):
+        parent_id, _ = self.write_commit(b'N <n@x> 1500000000 +0100')
+        header = b'tree ' + str(self.tree_id).encode() + b'\n' \
+                 + b'parent ' + str(parent_id).encode() + b'\n' \
+                 + b'author A <a@x> 1500000001 +0100\n' \
+                 + b'author B <b@x> 1500000002 +0100\n' \
+                 + b'committer C <c@x> 1500000003 +0100\n'
+        commit = parse_commit(git.Oid(hex='a' * 40), header)
+        self.assertListEqual([parent_id], commit.parent_ids)
+        # extra author headers are ignored
+        self.assertEqual('A', commit.author.name)
+        self.assertEqual(1500000003, commit.committer.time)
@@ -0,0 +1,57 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from analysis.gitdata import FileRecord
+from analysis.sampling import BlameSample, size_bucket
+
+
+def make_files():
+    files = []
+    for i in range(20):
+        files.append(FileRecord('src/module%d.py' % i, None, 100 + i, False, 10 + i))
+    for i in range(10):
+        files.append(FileRecord('doc/page%d.md' % i, None, 5000 + i, False, 200))
+    files.append(FileRecord('README', None, 3, False, 1))
+    return files
+
+
+class BlameSampleTest(unittest.TestCase):
+
+    def test_size_bucket(self):
+        self.assertListEqual([0, 1, 2, 3], [size_bucket(size) for size in [0, 9, 10, 999]])
+
+    def test_every_stratum_is_sampled(self):
+        sample = BlameSample(make_files(), 5)
+        self.assertEqual(31, sample.population_size)
+        self.assertEqual(5, len(sample.files))
+        self.assertSetEqual({0, 1, 2}, set(sample.files_strata.tolist()))
+
+    def test_sampling_is_deterministic(self):
+        self.assertListEqual(BlameSample(make_files(), 6, seed=3).paths, BlameSample(make_files(), 6, seed=3).paths)
+        self.assertListEqual(BlameSample(list(reversed(make_files())), 6).paths, BlameSample(make_files(), 6).paths)
+
+    def test_weights_extrapolate_to_all_lines(self):
+        files = make_files()
+        sample = BlameSample(files, 4)
+        sampled_lines_counts = np.array([file.lines_count for file in sample.files])
+        self.assertAlmostEqual(sum(file.lines_count for file in files), (sample.weights() * sampled_lines_counts).sum())
+
+        # lines of a stratum left out of the sample are distributed over sampled strata
+        sample.discard([path for path in sample.paths if path == 'README'])
+        sampled_lines_counts = np.array([file.lines_count for file in sample.files])
+        self.assertAlmostEqual(sum(file.lines_count for file in files), (sample.weights() * sampled_lines_counts).sum())
+
+    def test_confidence_interval_contains_estimate(self):
+        sample = BlameSample(make_files(), 8)
+        sampled_lines_counts = np.array([file.lines_count for file in sample.files])
+
+        def statistic(weights):
+            return pd.Series({'lines': (weights * sampled_lines_counts).sum(),
+                              'docs': (weights * sampled_lines_counts)[sample.files_strata == 0].sum()})
+
+        estimate = statistic(sample.weights())
+        interval = sample.confidence_interval(statistic)
+        self.assertTrue(((interval['low'] <= estimate + 1e-6) & (estimate - 1e-6 <= interval['high'])).all())
+        pd.testing.assert_frame_equal(interval, sample.confidence_interval(statistic))
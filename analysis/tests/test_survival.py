@@ -0,0 +1,85 @@
+import time
+import unittest
+
+import numpy as np
+
+from analysis.gitdata import BlameData
+from analysis.survival import LineSurvival, kaplan_meier, replay_hunks
+from analysis.tests.gitrepository import GitTestRepository
+
+
+class ReplayHunksTest(unittest.TestCase):
+
+    def test_insertion_into_empty_file(self):
+        new_runs, removed_runs = replay_hunks([], [(0, 0, 3)], 1, 100)
+        self.assertListEqual([[3, 1, 100]], new_runs)
+        self.assertListEqual([], removed_runs)
+
+    def test_insertion(self):
+        # 2 lines are inserted after the 3rd line
+        new_runs, removed_runs = replay_hunks([[5, 0, 10]], [(3, 0, 2)], 1, 100)
+        self.assertListEqual([[3, 0, 10], [2, 1, 100], [2, 0, 10]], new_runs)
+        self.assertListEqual([], removed_runs)
+
+    def test_deletion(self):
+        new_runs, removed_runs = replay_hunks([[2, 0, 10], [3, 1, 20]], [(2, 2, 0)], 2, 100)
+        self.assertListEqual([[1, 0, 10], [2, 1, 20]], new_runs)
+        self.assertListEqual([[1, 0, 10], [1, 1, 20]], removed_runs)
+
+    def test_replacement(self):
+        new_runs, removed_runs = replay_hunks([[4, 0, 10]], [(1, 1, 1), (4, 1, 2)], 1, 100)
+        self.assertListEqual([[1, 1, 100], [2, 0, 10], [2, 1, 100]], new_runs)
+        self.assertListEqual([[2, 0, 10]], removed_runs)
+
+
+class KaplanMeierTest(unittest.TestCase):
+
+    def test_censored_lines_are_at_risk_till_their_observation(self):
+        # 2 of 4 lines die at 10, 1 line is alive at 15, the last one dies at 20
+        survival = kaplan_meier(np.array([10, 15, 20]), np.array([2, 1, 1]), np.array([True, False, True]))
+        self.assertListEqual([10, 20], survival.index.tolist())
+        self.assertListEqual([0.5, 0.0], survival.tolist())
+
+
+class LineSurvivalTest(unittest.TestCase):
+    def setUp(self):
+        self.test_repo = GitTestRepository()
+        year_ago = int(time.time()) - 365 * 24 * 3600
+        self.test_repo.commit_builder \
+            .set_author("Jack Dau", "jack@dau.org", year_ago) \
+            .add_file(filename="file.txt", content=["a", "b", "c", "d"]) \
+            .add_file(filename="other.txt", content=["e"]) \
+            .commit()
+        self.test_repo.commit_builder \
+            .set_author("John Doe", "john@doe.com", year_ago + 100 * 24 * 3600) \
+            .add_file(filename="file.txt", content=["a", "x", "d", "y"]) \
+            .commit()
+        self.test_repo.commit_builder \
+            .set_author("Jack Dau", "jack@dau.org", year_ago + 200 * 24 * 3600) \
+            .append_file(filename="other.txt", content=["f", "g"]) \
+            .commit()
+
+    def test_replayed_lines_equal_blame(self):
+        survival_df = LineSurvival(self.test_repo).as_dataframe()
+        blame_df = BlameData(self.test_repo).as_dataframe()
+        for df in [survival_df, blame_df]:
+            df['committer_name'] = df['committer_name'].astype(str)
+            df['filepath'] = df['filepath'].astype(str)
+        columns = ['filepath', 'committer_name', 'timestamp', 'lines_count']
+        self.assertListEqual(sorted(blame_df[columns].values.tolist()), sorted(survival_df[columns].values.tolist()))
+
+    def test_deleted_lines_lifetimes(self):
+        lifetimes = LineSurvival(self.test_repo).get_lifetimes()
+        deleted = lifetimes[lifetimes['is_deleted']]
+        # "b" and "c" are replaced by John 100 days after Jack has added them
+        self.assertListEqual([2], deleted['lines_count'].tolist())
+        self.assertListEqual([100 * 24 * 3600], deleted['lifetime'].tolist())
+        self.assertEqual(9, lifetimes['lines_count'].sum())
+
+    def test_half_life(self):
+        line_survival = LineSurvival(self.test_repo)
+        # 2 of 9 lines have died
+        self.assertIsNone(line_survival.get_half_life())
+        # 2 of 5 lines added by the first commit have died
+        curves = line_survival.get_survival_curves(freq='D')
+        self.assertAlmostEqual(3 / 5, curves.iloc[:, 0].loc[100])
@@ -85,8 +85,8 @@ release_tag_date_yymmdd = datetime.fromtimestamp(head_commit.author.time).strfti
 release_data['user_version'] = release_tag_date_yymmdd
 
 print("Fetching contributors...")
-wh = WholeHistory(REPOSTAT_REPO, REPOSTAT_REPO.head.shorthand).as_dataframe()
-contributors = wh[['author_name', 'author_timestamp']].groupby(by='author_name').max()\
+wh = WholeHistory(REPOSTAT_REPO, REPOSTAT_REPO.head.shorthand).as_dataframe(columns=['author_name', 'author_timestamp'])
+contributors = wh[['author_name', 'author_timestamp']].groupby(by='author_name', observed=True).max()\
     .sort_values(by='author_timestamp', ascending=False).index.tolist()
 release_data['contributors'] = contributors
 
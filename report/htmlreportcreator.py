@@ -8,6 +8,7 @@ from jinja2 import Environment, FileSystemLoader
 import pandas as pd
 
 from analysis.gitrepository import GitRepository
+from analysis.survival import LineSurvival
 from tools.configuration import Configuration
 from tools import packages_info
 
@@ -19,8 +20,25 @@ HERE = os.path.dirname(os.path.abspath(__file__))
 
 class HTMLReportCreator:
     recent_activity_period_weeks = 32
+    # periods (in months) "lost knowledge" ratio is reported for, confidence interval is given for the default one
+    knowledge_loss_periods_months = [3, 6, 12, 24]
+    default_knowledge_loss_period_months = 6
     assets_subdir = "assets"
     templates_subdir = "templates"
+    # page name -> (whole history columns, linear history columns) used to render the page
+    pages_history_columns = {
+        'General': (['author_name', 'is_merge_commit', 'author_timestamp', 'insertions', 'deletions',
+                     'is_diff_estimated'],
+                    ['insertions', 'deletions']),
+        'Activity': (['author_tz_offset', 'author_timestamp', 'review_duration'],
+                     []),
+        'Authors': (['is_merge_commit', 'author_name', 'author_email', 'author_timestamp', 'insertions', 'deletions'],
+                    ['insertions', 'deletions']),
+        'Files': ([],
+                  ['committer_timestamp', 'files_count', 'insertions', 'deletions']),
+        'Tags': ([], []),
+        'About': ([], []),
+    }
 
     def __init__(self, config: Configuration, repository: GitRepository):
         self.path = None
@@ -42,6 +60,19 @@ class HTMLReportCreator:
         colors = colormaps.colormaps[self.configuration['colormap']]
         self.j2_env.filters['to_heatmap'] = lambda val, max_val: "%d, %d, %d" % colors[int(float(val) / max_val * (len(colors) - 1))]
 
+    @classmethod
+    def get_history_columns(cls, config: Configuration):
+        """
+        :return: whole history and linear history columns used by pages the report is configured to contain
+        """
+        whole_history_columns, linear_history_columns = [], []
+        for page_name, (whole_columns, linear_columns) in cls.pages_history_columns.items():
+            if page_name == 'Tags' and not config.do_process_tags():
+                continue
+            whole_history_columns.extend(c for c in whole_columns if c not in whole_history_columns)
+            linear_history_columns.extend(c for c in linear_columns if c not in linear_history_columns)
+        return whole_history_columns, linear_history_columns
+
     def set_time_sampling(self, offset: str):
         """
         :param offset: any valid string composed of Pandas' offset aliases
@@ -170,8 +201,10 @@ class HTMLReportCreator:
             "total_lines_count": self.git_repository_statistics.total_lines_count,
             "added_lines_count": self.git_repository_statistics.total_lines_added,
             "removed_lines_count": self.git_repository_statistics.total_lines_removed,
+            "estimated_commits_count": self.git_repository_statistics.estimated_commits_count,
             "first_commit_date": first_commit_datetime,
             "last_commit_date": last_commit_datetime,
+            "history_window_bounds": self._get_history_window_bounds(),
         }
 
         generation_data = {
@@ -183,6 +216,17 @@ class HTMLReportCreator:
                         generation=generation_data)
         return page
 
+    def _get_history_window_bounds(self):
+        window = self.git_repository_statistics.history_window
+        bounds = []
+        if window.since is not None:
+            bounds.append(f"commits since {datetime.datetime.fromtimestamp(window.since):%Y-%m-%d %H:%M}")
+        if window.until is not None:
+            bounds.append(f"commits until {datetime.datetime.fromtimestamp(window.until):%Y-%m-%d %H:%M}")
+        if window.max_commits is not None:
+            bounds.append(f"{window.max_commits} most recent commits at most")
+        return bounds
+
     def make_activity_page(self):
         # TODO: this conversion from old 'data' to new 'project data' should perhaps be removed in future
         project_data = {
@@ -297,10 +341,19 @@ class HTMLReportCreator:
         }
 
         if self._is_blame_data_allowed:
+            head = self.git_repository_statistics.head
+            top_knowledge_carriers = head.get_top_knowledge_carriers(self.default_knowledge_loss_period_months)
             project_data.update({
-                'top_knowledge_carriers': self.git_repository_statistics.head.get_top_knowledge_carriers()
-                    .head(self.configuration['authors_top'])
+                'top_knowledge_carriers': top_knowledge_carriers.head(self.configuration['authors_top'])
+                if top_knowledge_carriers is not None else None,
+                'knowledge_loss_period': self.default_knowledge_loss_period_months,
+                'blame_sample': head.blame_sample,
             })
+            if head.blame_sample is not None:
+                contribution_intervals = head.get_authors_contribution_confidence_intervals()
+                contribution_intervals['lines_count'] = head.authors_contribution
+                project_data['contribution_intervals'] = contribution_intervals\
+                    .sort_values(by='lines_count', ascending=False).head(self.configuration['authors_top'])
 
         raw_authors_data = self.git_repository_statistics.get_authors_ranking_by_month()
         ordered_months = raw_authors_data.index.get_level_values(0).unique().sort_values(ascending=False)
@@ -422,17 +475,35 @@ class HTMLReportCreator:
             'is_blame_data_available': self._is_blame_data_allowed
         }
         if self._is_blame_data_allowed:
+            head = self.git_repository_statistics.head
+            # metrics of periods longer than the blame window are not exact, so they are not reported
+            knowledge_loss_periods_months = [months for months in self.knowledge_loss_periods_months
+                                             if head.fits_blame_window(months)]
             project_data.update({
-                'top_files_by_contributors_count': self.git_repository_statistics.head.get_top_files_by_contributors_count(),
-                'monoauthor_files_count': self.git_repository_statistics.head.monoauthor_files.count(),
-                'lost_knowledge_ratio': self.git_repository_statistics.head.get_lost_knowledge_percentage()
+                'top_files_by_contributors_count': head.get_top_files_by_contributors_count(),
+                'monoauthor_files_count': head.monoauthor_files.count(),
+                'lost_knowledge_ratios': {
+                    months: head.get_lost_knowledge_percentage(months) for months in knowledge_loss_periods_months},
+                'dropped_knowledge_loss_periods': [months for months in self.knowledge_loss_periods_months
+                                                   if months not in knowledge_loss_periods_months],
+                'blame_window_months': head.blame_window_months,
+                'lost_knowledge_interval_period': self.default_knowledge_loss_period_months,
+                'lost_knowledge_interval': head.get_lost_knowledge_confidence_interval(
+                    self.default_knowledge_loss_period_months),
+                'blame_sample': head.blame_sample,
+                'directories_ownership': head.get_directories_ownership(
+                    self.configuration.get_directories_depth()),
             })
+        line_survival = self.git_repository_statistics.line_survival if self._is_blame_data_allowed else None
+        project_data['is_line_survival_available'] = line_survival is not None
+        if line_survival is not None:
+            project_data['lines_half_life_days'] = line_survival.get_half_life()
 
         page = HtmlPage('Files', project=project_data)
-        page.add_plot(self.make_files_plot())
+        page.add_plot(self.make_files_plot(line_survival))
         return page
 
-    def make_files_plot(self) -> JsPlot:
+    def make_files_plot(self, line_survival: LineSurvival = None) -> JsPlot:
         hst = self.git_repository_statistics.linear_history(self._time_sampling_interval).copy()
         hst["epoch"] = (hst.index - pd.Timestamp("1970-01-01 00:00:00+00:00")) // pd.Timedelta('1s') * 1000
 
@@ -448,8 +519,16 @@ class HTMLReportCreator:
             "maxFiles": maxFiles,
             "maxLines": maxLines
         }
-
-        files_plot = JsPlot('files.js', json_data=json.dumps(graph_data))
+        survival_data = {}
+        if line_survival is not None:
+            curves = line_survival.get_survival_curves()
+            survival_data = {"data": [
+                {"key": str(cohort), "values": [{"x": int(age), "y": round(float(ratio) * 100, 2)}
+                                                for age, ratio in curves[cohort].dropna().items()]}
+                for cohort in curves.columns
+            ]}
+
+        files_plot = JsPlot('files.js', json_data=json.dumps(graph_data), survival_data=json.dumps(survival_data))
         return files_plot
 
     def make_tags_page(self):
@@ -461,12 +540,42 @@ class HTMLReportCreator:
         project_data = {
             'tags': tags,
             # this is total tags count, generally len(tags) != total_tags_count
-            'tags_count': self.git_repository_statistics.tags.count
+            'tags_count': self.git_repository_statistics.tags.count,
+            'is_ownership_available': self._is_blame_data_allowed and bool(self.configuration.get_ownership_tags_count()),
         }
 
         page = HtmlPage(name='Tags', project=project_data)
+        page.add_plot(self.make_tags_plot(project_data['is_ownership_available']))
         return page
 
+    def make_tags_plot(self, is_ownership_available: bool) -> JsPlot:
+        ownership_by_authors, ownership_by_age = {}, {}
+        ownership = self.git_repository_statistics.get_tags_ownership(self.configuration.get_ownership_tags_count()) \
+            if is_ownership_available else None
+        if ownership is not None and not ownership.empty:
+            tags_names = ownership['revision'].cat.categories.tolist()
+            # authors with the most lines at the latest tag are charted, the rest are summed up as "Others"
+            latest_ownership = ownership[ownership['revision'] == tags_names[-1]] \
+                .groupby('author_name', observed=True)['lines_count'].sum().sort_values(ascending=False)
+            top_authors = latest_ownership.index[:self.configuration['max_plot_authors_count']]
+            authors = ownership['author_name'].astype(object).where(ownership['author_name'].isin(top_authors),
+                                                                     "Others")
+            by_authors = ownership['lines_count'].groupby([authors, ownership['revision']]).sum()
+            by_age = ownership.groupby(['age', 'revision'])['lines_count'].sum()
+            ownership_by_authors = {"data": [
+                {"key": author, "values": [{"x": tag, "y": int(by_authors.get((author, tag), 0))}
+                                           for tag in tags_names]}
+                for author in list(top_authors) + (["Others"] if (authors == "Others").any() else [])
+            ]}
+            ownership_by_age = {"data": [
+                {"key": age, "values": [{"x": tag, "y": int(by_age.get((age, tag), 0))} for tag in tags_names]}
+                for age in ownership['age'].cat.categories
+            ]}
+
+        return JsPlot('tags.js',
+                      ownership_by_authors=json.dumps(ownership_by_authors),
+                      ownership_by_age=json.dumps(ownership_by_age))
+
     def make_about_page(self):
         repostat_version = self.configuration.get_release_data_info()['develop_version']
         repostat_version_date = self.configuration.get_release_data_info()['user_version']
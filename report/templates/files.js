@@ -14,3 +14,18 @@ nv.addGraph(function() {
 	d3.select('#chart_files svg').datum(dataset.data).call(chart);
 	return chart;
 });
+
+const survival_data = {{survival_data}}
+// Setup the line survival chart, it is shown if history has been replayed
+if (!d3.select('#chart_survival').empty()) {
+	nv.addGraph(function() {
+		var chart = nv.models.lineChart()
+			.margin({left: 60, right: 60});
+		chart.xAxis.options({axisLabel: "Age (days)"});
+		chart.yAxis.options({axisLabel: "Surviving lines (%)"});
+		chart.forceY([0, 100]);
+
+		d3.select('#chart_survival svg').datum(survival_data.data).call(chart);
+		return chart;
+	});
+}
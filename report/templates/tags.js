@@ -0,0 +1,27 @@
+const ownership_by_authors = {{ownership_by_authors}}
+// Setup the code ownership chart
+nv.addGraph(function() {
+	var chart = nv.models.multiBarChart()
+		.stacked(true)
+		.showControls(false)
+		.reduceXTicks(false);
+	chart.yAxis.options({ "axisLabel": "Lines" });
+	chart.xAxis.options({ "rotateLabels": -45 });
+
+	d3.select('#chart_ownership_authors svg').datum(ownership_by_authors.data).call(chart);
+	return chart;
+});
+
+const ownership_by_age = {{ownership_by_age}}
+// Setup the age of code chart
+nv.addGraph(function() {
+	var chart = nv.models.multiBarChart()
+		.stacked(true)
+		.showControls(false)
+		.reduceXTicks(false);
+	chart.yAxis.options({ "axisLabel": "Lines" });
+	chart.xAxis.options({ "rotateLabels": -45 });
+
+	d3.select('#chart_ownership_age svg').datum(ownership_by_age.data).call(chart);
+	return chart;
+});
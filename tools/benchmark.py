@@ -0,0 +1,130 @@
+"""
+Benchmarks of repository data fetching on synthetic repositories.
+
+Run from repository root, e.g.:
+    python -m tools.benchmark diff-memo --commits 2000
+    python -m tools.benchmark history-backends --repository <path to an existing repository>
+"""
+import sys
+import time
+import random
+import shutil
+import tempfile
+import argparse
+import pygit2 as git
+
+from analysis.gitdata import CommitsScanner, DiffStatsFetcher, WholeHistory, LinearHistory
+from analysis.gitrepository import history_backends
+
+
+def create_linear_repository(path: str, commits_count: int, files_count: int, seed: int = 0) -> git.Repository:
+    """
+    Creates repository with linear history: every commit modifies a few random lines in one or two random files
+    """
+    rnd = random.Random(seed)
+    repo = git.init_repository(path)
+    files = {}
+    parents = []
+    timestamp = 1500000000
+    for i in range(commits_count):
+        for _ in range(rnd.randint(1, 2)):
+            filename = f"file{rnd.randrange(files_count)}.txt"
+            lines = files.get(filename, [])
+            for _ in range(rnd.randint(0, min(3, len(lines)))):
+                del lines[rnd.randrange(len(lines))]
+            for _ in range(rnd.randint(1, 10)):
+                lines.insert(rnd.randint(0, len(lines)), f"line {rnd.randrange(10 ** 6)} of commit {i}")
+            files[filename] = lines
+
+        tree_builder = repo.TreeBuilder()
+        for filename, lines in files.items():
+            tree_builder.insert(filename, repo.create_blob("\n".join(lines) + "\n"), git.GIT_FILEMODE_BLOB)
+        timestamp += rnd.randint(60, 86400)
+        author = git.Signature(f"Author{i % 10}", f"author{i % 10}@example.com", timestamp, 0)
+        commit_id = repo.create_commit('HEAD', author, author, f"Commit {i}", tree_builder.write(), parents)
+        parents = [commit_id]
+    return repo
+
+
+def timed(func, *args):
+    ts = time.time()
+    result = func(*args)
+    return result, time.time() - ts
+
+
+def benchmark_diff_memo(repo: git.Repository):
+    """
+    Compares whole and linear history fetch with a diff stats fetcher per history vs a fetcher shared by both
+    """
+    def fetch_histories(is_fetcher_shared: bool):
+        scanner = CommitsScanner(repo)
+        fetchers = [DiffStatsFetcher(repo)]
+        fetchers.append(fetchers[0] if is_fetcher_shared else DiffStatsFetcher(repo))
+        histories = [WholeHistory(repo, scanner=scanner, diff_stats=fetchers[0]),
+                     LinearHistory(repo, scanner=scanner, diff_stats=fetchers[1])]
+        for history in histories:
+            history.as_dataframe()
+        return sum(fetcher.diffs_count for fetcher in set(fetchers))
+
+    separate_diffs_count, separate_time = timed(fetch_histories, False)
+    shared_diffs_count, shared_time = timed(fetch_histories, True)
+    return [
+        ("separate diff stats", separate_diffs_count, separate_time),
+        ("shared diff stats", shared_diffs_count, shared_time),
+    ]
+
+
+def benchmark_history_backends(repo: git.Repository):
+    """
+    Compares whole and linear history fetch by every history backend
+    """
+    def fetch_histories(backend_class):
+        backend = backend_class(repo)
+        histories = [WholeHistory(repo, scanner=backend.scanner, diff_stats=backend.diff_stats),
+                     LinearHistory(repo, scanner=backend.scanner, diff_stats=backend.diff_stats)]
+        return [history.as_dataframe() for history in histories], backend.diff_stats.diffs_count
+
+    results = []
+    reference_dfs = None
+    for name, backend_class in history_backends.items():
+        (dfs, diffs_count), elapsed = timed(fetch_histories, backend_class)
+        # commits order of whole history depends on backend
+        dfs[0] = dfs[0].sort_values(by='commit_id').reset_index(drop=True)
+        if reference_dfs is None:
+            reference_dfs = dfs
+        elif not all(df.astype(object).equals(reference_df.astype(object))
+                     for df, reference_df in zip(dfs, reference_dfs)):
+            print(f"WARNING: histories fetched by '{name}' backend differ from the ones of the first backend")
+        results.append((f"{name} backend", diffs_count, elapsed))
+    return results
+
+
+def print_results(results):
+    print(f"\n{'case':<30}{'diffs':>10}{'time, s':>12}")
+    for case, diffs_count, elapsed in results:
+        print(f"{case:<30}{diffs_count:>10}{elapsed:>12.2f}")
+
+
+if __name__ == "__main__":
+    benchmarks = {
+        "diff-memo": benchmark_diff_memo,
+        "history-backends": benchmark_history_backends,
+    }
+    parser = argparse.ArgumentParser(prog='benchmark', description="Benchmarks repostat's data fetching")
+    parser.add_argument('benchmark', choices=benchmarks.keys(), help="Benchmark to run")
+    parser.add_argument('--commits', type=int, default=2000, help="Commits count in synthetic repository")
+    parser.add_argument('--files', type=int, default=200, help="Files count in synthetic repository")
+    parser.add_argument('--repository', help="Path to existing repository to benchmark on instead of synthetic one")
+    args = parser.parse_args(sys.argv[1:])
+
+    if args.repository:
+        print_results(benchmarks[args.benchmark](git.Repository(args.repository)))
+        sys.exit(0)
+
+    repo_path = tempfile.mkdtemp(prefix="repostat_benchmark_")
+    try:
+        print(f"Creating synthetic repository with {args.commits} commits in {repo_path}")
+        synthetic_repo = create_linear_repository(repo_path, args.commits, args.files)
+        print_results(benchmarks[args.benchmark](synthetic_repo))
+    finally:
+        shutil.rmtree(repo_path)
@@ -32,7 +32,8 @@ if __name__ == "__main__":
         "files.html",
         "files.js",
         "general.html",
-        "tags.html"
+        "tags.html",
+        "tags.js"
     ]
 
     if parsed_args.has_index_page:
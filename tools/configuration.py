@@ -1,6 +1,9 @@
 import os
 import argparse
 import json
+import datetime
+
+from typing import Optional, Tuple
 
 here = os.path.dirname(os.path.abspath(__file__))
 
@@ -51,6 +54,28 @@ class ReadableFile(argparse.Action):
         setattr(namespace, self.dest, file_name)
 
 
+def timestamp(value: str) -> int:
+    """
+    Converts ISO 8601 date or date and time (local time unless timezone is given) into Unix timestamp
+    """
+    try:
+        return int(datetime.datetime.fromisoformat(value).timestamp())
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value} is not a date (expected format is YYYY-MM-DD[THH:MM[:SS]])")
+
+
+def positive_int(value: str) -> int:
+    if not value.isdigit() or int(value) == 0:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive integer")
+    return int(value)
+
+
+def non_negative_int(value: str) -> int:
+    if not value.isdigit():
+        raise argparse.ArgumentTypeError(f"{value} is not a non-negative integer")
+    return int(value)
+
+
 class Configuration(dict):
     release_data_dict = None
 
@@ -119,6 +144,71 @@ class Configuration(dict):
     def do_process_tags(self):
         return self["max_recent_tags"] > 0 if "max_recent_tags" in self else True
 
+    def get_cache_dir(self):
+        """
+        :return: directory where history data is persisted between runs or None if caching is disabled
+        """
+        if self.args.no_cache:
+            return None
+        if self.args.cache_dir:
+            return self.args.cache_dir
+        # pygit2 is imported here, so that the module (read by setup.py) does not depend on it
+        import pygit2 as git
+        # by default, cache is stored inside repository's git directory
+        return os.path.join(git.discover_repository(self.git_repository_path), 'repostat')
+
+    def get_jobs_count(self):
+        return self.args.jobs if self.args.jobs > 0 else os.cpu_count()
+
+    def get_history_backend(self):
+        return self.args.backend
+
+    def get_history_window(self) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+        """
+        :return: `since` and `until` timestamps and maximal commits count of analysed history, None if not bounded
+        """
+        return self.args.since, self.args.until, self.args.max_commits
+
+    def get_included_paths(self):
+        return self.get("include", []) + (self.args.include or [])
+
+    def get_excluded_paths(self):
+        return self.get("exclude", []) + (self.args.exclude or [])
+
+    def do_exclude_generated(self):
+        return self.args.exclude_generated or self.get("exclude_generated", False)
+
+    def get_max_diff_files(self):
+        return self.args.max_diff_files or self.get("max_diff_files")
+
+    def get_max_diff_bytes(self):
+        return self.args.max_diff_bytes or self.get("max_diff_bytes")
+
+    def get_blame_timeout(self):
+        return self.args.blame_timeout or self.get("blame_timeout")
+
+    def get_blame_window_months(self):
+        return self.args.blame_window or self.get("blame_window_months")
+
+    def get_blame_engine(self):
+        return self.args.blame_engine or self.get("blame_engine", "blame")
+
+    def get_ownership_tags_count(self):
+        return self.args.ownership_tags or self.get("ownership_tags_count")
+
+    def get_blame_sample_size(self):
+        return self.args.blame_sample or self.get("blame_sample_size")
+
+    def get_blame_sample_seed(self):
+        if self.args.blame_seed is not None:
+            return self.args.blame_seed
+        return self.get("blame_sample_seed", 0)
+
+    def get_directories_depth(self):
+        if self.args.directories_depth is not None:
+            return self.args.directories_depth
+        return self.get("directories_depth", 1)
+
     def get_time_sampling(self):
         return self["time_sampling"] if "time_sampling" in self else "W"
 
@@ -142,11 +232,74 @@ class Configuration(dict):
                                           "In next version will be deprecated"
                                           " and blame data will be fetched by default. Use --no-blame to disable blame "
                                           " data fetching.")
+        parser.add_argument('--blame-timeout', type=positive_int, metavar='SECONDS',
+                            help="Maximal time to blame a file, files taking longer are reported and not blamed")
+        parser.add_argument('--blame-window', type=positive_int, metavar='MONTHS',
+                            help="Blame lines of this number of recent months only (older lines are attributed in "
+                                 "bulk), which is enough for knowledge loss metrics and much faster on old repos")
+        parser.add_argument('--blame-engine', choices=['blame', 'survival'],
+                            help="How lines are attributed to authors: 'blame' (default) blames files, 'survival' "
+                                 "replays changes of HEAD's first-parent history (much faster, merged lines are "
+                                 "attributed to merge commits' authors) and adds line survival chart")
+        parser.add_argument('--ownership-tags', type=positive_int, metavar='N',
+                            help="Chart code ownership and age of code at N most recent tags (files are blamed at "
+                                 "every tag, unchanged files are not blamed again)")
+        parser.add_argument('--blame-sample', type=positive_int, metavar='FILES',
+                            help="Blame this number of files only (sampled by extension and size), blame metrics "
+                                 "are estimated from them and reported with confidence intervals")
+        parser.add_argument('--blame-seed', type=int, metavar='SEED',
+                            help="Seed of blamed files' sampling (0 by default), the same files are sampled for the "
+                                 "same seed")
+        parser.add_argument('--directories-depth', type=non_negative_int, metavar='DEPTH',
+                            help="Depth of directories which ownership and bus factor are reported on \"Files\" "
+                                 "page (1 by default, i.e. top-level directories; 0 reports the whole repository)")
         parser.add_argument('--copy-assets', action="store_true",
                             help="Copy assets (images, css, etc.) into report folder (report becomes relocatable)")
         parser.add_argument('--with-index-page', action="store_true",
                             help="Generate 'index.html' (a copy of 'general.html')")
 
+        parser.add_argument('-j', '--jobs', type=int, default=1,
+                            help="Number of processes to fetch history and blame data in "
+                                 "(0 means all available CPUs)")
+        parser.add_argument('--backend', choices=['pygit2', 'git'], default='pygit2',
+                            help="Tool to walk and diff commits with: pygit2 library (default) or git command-line "
+                                 "client, which is faster on some repositories (e.g. with commit-graph file)")
+        window_arg_group = parser.add_argument_group('history window',
+                                                     "Only a part of HEAD's history is analysed, so that time and "
+                                                     "memory spent depend on the window's size only")
+        window_arg_group.add_argument('--since', type=timestamp, metavar='DATE',
+                                      help="Analyse commits committed since the date (YYYY-MM-DD[THH:MM[:SS]]), "
+                                           "ancestors of older commits are not analysed")
+        window_arg_group.add_argument('--until', type=timestamp, metavar='DATE',
+                                      help="Analyse commits committed until the date (YYYY-MM-DD[THH:MM[:SS]])")
+        window_arg_group.add_argument('--max-commits', type=positive_int, metavar='COUNT',
+                                      help="Analyse at most this number of the most recent commits")
+        paths_arg_group = parser.add_argument_group('files filter',
+                                                    "Excluded files are neither diffed nor blamed nor counted "
+                                                    "(filters are added to the ones given in configuration file)")
+        paths_arg_group.add_argument('--include', action='append', metavar='PATHSPEC',
+                                     help="Analyse only files matching the pathspec (git-like, e.g. 'src' or "
+                                          "'*.py'), may be given several times")
+        paths_arg_group.add_argument('--exclude', action='append', metavar='PATHSPEC',
+                                     help="Do not analyse files matching the pathspec, may be given several times")
+        paths_arg_group.add_argument('--exclude-generated', action='store_true',
+                                     help="Do not analyse files marked as 'linguist-generated' or "
+                                          "'linguist-vendored' in .gitattributes")
+        guard_arg_group = parser.add_argument_group('giant commits',
+                                                    "Changes of commits exceeding any of the limits are estimated "
+                                                    "from changed files' lines counts instead of diffing them")
+        guard_arg_group.add_argument('--max-diff-files', type=positive_int, metavar='COUNT',
+                                     help="Maximal number of files changed by a diffed commit")
+        guard_arg_group.add_argument('--max-diff-bytes', type=positive_int, metavar='SIZE',
+                                     help="Maximal total size (in bytes) of changed files' versions before and after "
+                                          "a diffed commit")
+        cache_arg_group = parser.add_mutually_exclusive_group()
+        cache_arg_group.add_argument('--cache-dir', action=WritableDir,
+                                     help="Directory to cache history data between runs "
+                                          "(default: 'repostat' folder in repository's git directory)")
+        cache_arg_group.add_argument('--no-cache', action="store_true",
+                                     help="Do not read or write cached history data")
+
         parser.add_argument('git_repo', type=str, action=ReadableDir, help="Path to git repository")
         parser.add_argument('output_path', type=str, action=WritableDir, help="Path to an output directory")
 